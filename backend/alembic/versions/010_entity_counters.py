@@ -0,0 +1,128 @@
+"""
+010_entity_counters
+
+Incrementally maintained counters of entities per (job_id, entity_type, status).
+ - entity_counters: job_id = 0 stands for global rows (entities.job_id IS NULL)
+ - statement-level triggers on entities apply aggregated deltas for INSERT/UPDATE/DELETE,
+   so bulk statements cost one upsert per (job, type, status) group, not per row
+ - deltas are applied in a stable key order to avoid deadlocks between concurrent writers
+ - initial backfill from entities
+"""
+
+from alembic import op
+
+revision = "010_entity_counters"
+down_revision = "009_merge_stub_into_head"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS entity_counters (
+            job_id BIGINT NOT NULL DEFAULT 0,
+            entity_type TEXT NOT NULL,
+            status mapping_status NOT NULL,
+            count BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (job_id, entity_type, status)
+        );
+
+        CREATE OR REPLACE FUNCTION entity_counters_on_insert() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO entity_counters AS c (job_id, entity_type, status, count)
+            SELECT COALESCE(job_id, 0), entity_type, status, count(*)
+            FROM new_rows
+            GROUP BY 1, 2, 3
+            ORDER BY 1, 2, 3
+            ON CONFLICT (job_id, entity_type, status)
+            DO UPDATE SET count = c.count + EXCLUDED.count;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION entity_counters_on_delete() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO entity_counters AS c (job_id, entity_type, status, count)
+            SELECT COALESCE(job_id, 0), entity_type, status, -count(*)
+            FROM old_rows
+            GROUP BY 1, 2, 3
+            ORDER BY 1, 2, 3
+            ON CONFLICT (job_id, entity_type, status)
+            DO UPDATE SET count = c.count + EXCLUDED.count;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION entity_counters_on_update() RETURNS trigger AS $$
+        BEGIN
+            WITH changed AS (
+                SELECT o.job_id AS old_job, o.entity_type AS old_type, o.status AS old_status,
+                       n.job_id AS new_job, n.entity_type AS new_type, n.status AS new_status
+                FROM old_rows o
+                JOIN new_rows n ON n.id = o.id
+                WHERE o.status IS DISTINCT FROM n.status
+                   OR o.entity_type IS DISTINCT FROM n.entity_type
+                   OR o.job_id IS DISTINCT FROM n.job_id
+            ),
+            delta AS (
+                SELECT COALESCE(old_job, 0) AS job_id, old_type AS entity_type,
+                       old_status AS status, -1 AS d
+                FROM changed
+                UNION ALL
+                SELECT COALESCE(new_job, 0), new_type, new_status, 1
+                FROM changed
+            )
+            INSERT INTO entity_counters AS c (job_id, entity_type, status, count)
+            SELECT job_id, entity_type, status, sum(d)
+            FROM delta
+            GROUP BY 1, 2, 3
+            HAVING sum(d) <> 0
+            ORDER BY 1, 2, 3
+            ON CONFLICT (job_id, entity_type, status)
+            DO UPDATE SET count = c.count + EXCLUDED.count;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_entity_counters_ins ON entities;
+        CREATE TRIGGER trg_entity_counters_ins
+        AFTER INSERT ON entities
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION entity_counters_on_insert();
+
+        DROP TRIGGER IF EXISTS trg_entity_counters_del ON entities;
+        CREATE TRIGGER trg_entity_counters_del
+        AFTER DELETE ON entities
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION entity_counters_on_delete();
+
+        DROP TRIGGER IF EXISTS trg_entity_counters_upd ON entities;
+        CREATE TRIGGER trg_entity_counters_upd
+        AFTER UPDATE ON entities
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION entity_counters_on_update();
+
+        -- Initial backfill
+        INSERT INTO entity_counters AS c (job_id, entity_type, status, count)
+        SELECT COALESCE(job_id, 0), entity_type, status, count(*)
+        FROM entities
+        GROUP BY 1, 2, 3
+        ON CONFLICT (job_id, entity_type, status)
+        DO UPDATE SET count = EXCLUDED.count;
+        """
+    )
+
+
+def downgrade():
+    op.execute(
+        """
+        DROP TRIGGER IF EXISTS trg_entity_counters_upd ON entities;
+        DROP TRIGGER IF EXISTS trg_entity_counters_del ON entities;
+        DROP TRIGGER IF EXISTS trg_entity_counters_ins ON entities;
+        DROP FUNCTION IF EXISTS entity_counters_on_update();
+        DROP FUNCTION IF EXISTS entity_counters_on_delete();
+        DROP FUNCTION IF EXISTS entity_counters_on_insert();
+        DROP TABLE IF EXISTS entity_counters;
+        """
+    )
@@ -0,0 +1,52 @@
+"""
+011_id_map
+
+Narrow Slack -> Mattermost id map used by exporters to resolve cross-references
+without reading wide entities rows (raw_data).
+ - id_map(entity_type, job_id, slack_id, mm_id); job_id = 0 for global types
+   (user, channel, custom_emoji) and for legacy rows without job
+ - written by ExporterBase.set_status on successful export
+ - backfill from entities that already have mattermost_id
+"""
+
+from alembic import op
+
+revision = "011_id_map"
+down_revision = "010_entity_counters"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS id_map (
+            entity_type TEXT NOT NULL,
+            job_id BIGINT NOT NULL DEFAULT 0,
+            slack_id TEXT NOT NULL,
+            mm_id TEXT NOT NULL,
+            PRIMARY KEY (entity_type, job_id, slack_id)
+        );
+
+        INSERT INTO id_map (entity_type, job_id, slack_id, mm_id)
+        SELECT DISTINCT ON (entity_type, job_key, slack_id)
+               entity_type, job_key, slack_id, mattermost_id
+        FROM (
+            SELECT id, entity_type, slack_id, mattermost_id,
+                   CASE
+                       WHEN entity_type IN ('message', 'reaction', 'attachment')
+                       THEN COALESCE(job_id, 0)
+                       ELSE 0
+                   END AS job_key
+            FROM entities
+            WHERE mattermost_id IS NOT NULL AND mattermost_id <> ''
+        ) src
+        ORDER BY entity_type, job_key, slack_id, id DESC
+        ON CONFLICT (entity_type, job_id, slack_id)
+        DO UPDATE SET mm_id = EXCLUDED.mm_id;
+        """
+    )
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS id_map;")
@@ -0,0 +1,35 @@
+"""
+012_rendered_messages
+
+Side table with message Markdown pre-rendered during import (rendering stage),
+so export only assembles payloads:
+ - rendered_messages(entity_id PK → entities.id, job_id, text, props)
+ - rows are replaced when a job is rendered again
+"""
+
+from alembic import op
+
+revision = "012_rendered_messages"
+down_revision = "011_id_map"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS rendered_messages (
+            entity_id BIGINT PRIMARY KEY REFERENCES entities(id) ON DELETE CASCADE,
+            job_id BIGINT REFERENCES import_jobs(id) ON DELETE CASCADE,
+            text TEXT NOT NULL,
+            props JSONB,
+            rendered_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        CREATE INDEX IF NOT EXISTS ix_rendered_messages_job_id
+            ON rendered_messages (job_id);
+        """
+    )
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS rendered_messages;")
@@ -0,0 +1,79 @@
+"""
+013_error_signature
+
+Normalized failure reason on entities for grouping failures (GET /jobs/{id}/failures):
+ - entities.error_signature: error_message with ids, numbers and URLs replaced by
+   placeholders (app.utils.errors.error_signature), written together with error_message
+ - partial index over failed/skipped rows: (job_id, status, entity_type, error_signature)
+ - backfill: signatures are computed in Python once per distinct error_message and
+   applied with a single UPDATE ... FROM join
+"""
+
+from alembic import op
+from sqlalchemy import text
+
+from app.utils.errors import error_signature
+
+revision = "013_error_signature"
+down_revision = "012_rendered_messages"
+branch_labels = None
+depends_on = None
+
+_BATCH = 5000
+
+
+def upgrade():
+    op.execute(
+        """
+        ALTER TABLE entities ADD COLUMN IF NOT EXISTS error_signature TEXT;
+        CREATE INDEX IF NOT EXISTS ix_entities_failures
+            ON entities (job_id, status, entity_type, error_signature)
+            WHERE status IN ('failed', 'skipped');
+        """
+    )
+
+    bind = op.get_bind()
+    bind.execute(
+        text(
+            "CREATE TEMP TABLE error_signatures (msg TEXT PRIMARY KEY, sig TEXT) ON COMMIT DROP"
+        )
+    )
+    rows = bind.execute(
+        text(
+            """
+            SELECT DISTINCT error_message FROM entities
+            WHERE status IN ('failed', 'skipped') AND error_message IS NOT NULL
+            """
+        )
+    )
+    batch = []
+    for (msg,) in rows:
+        batch.append({"msg": msg, "sig": error_signature(msg)})
+        if len(batch) >= _BATCH:
+            bind.execute(
+                text("INSERT INTO error_signatures (msg, sig) VALUES (:msg, :sig)"),
+                batch,
+            )
+            batch = []
+    if batch:
+        bind.execute(
+            text("INSERT INTO error_signatures (msg, sig) VALUES (:msg, :sig)"), batch
+        )
+    bind.execute(
+        text(
+            """
+            UPDATE entities e SET error_signature = s.sig
+            FROM error_signatures s
+            WHERE e.error_message = s.msg AND e.status IN ('failed', 'skipped')
+            """
+        )
+    )
+
+
+def downgrade():
+    op.execute(
+        """
+        DROP INDEX IF EXISTS ix_entities_failures;
+        ALTER TABLE entities DROP COLUMN IF EXISTS error_signature;
+        """
+    )
@@ -0,0 +1,104 @@
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.models.base import pool_stats
+from app.services.monitoring import profiler, query_stats, tracing
+from app.services.export.markdown_renderer import render_cache
+
+router = APIRouter()
+
+
+@router.get("/debug/pools")
+async def get_pool_stats():
+    """Usage of the named DB pools (pipeline/api/control)."""
+    return pool_stats()
+
+
+@router.get("/debug/query-stats")
+async def get_query_stats(job_id: Optional[int] = None, top: int = 20):
+    """Per-stage SQL fingerprints (count/total/p95/rows) and N+1 suspects."""
+    return query_stats.snapshot(job_id=job_id, top=top)
+
+
+@router.post("/debug/query-stats/reset")
+async def reset_query_stats():
+    query_stats.reset()
+    return {"status": "ok"}
+
+
+@router.get("/debug/render-cache")
+async def get_render_cache_stats():
+    """Markdown render cache: size, hits/misses, evictions, hit rate (this process)."""
+    return render_cache.stats()
+
+
+@router.post("/debug/render-cache/reset")
+async def reset_render_cache():
+    render_cache.clear()
+    return {"status": "ok"}
+
+
+@router.post("/debug/profiler/start")
+async def start_profiler(
+    duration: float = 60.0,
+    interval: Optional[float] = None,
+    job_id: Optional[int] = None,
+):
+    """Sample all thread stacks for `duration` seconds (capped by PROFILER_MAX_SECONDS);
+    with `job_id` only while the job is inside one of its stages."""
+    try:
+        session = profiler.start(duration=duration, interval=interval, job_id=job_id)
+    except profiler.ProfilerBusy as e:
+        return JSONResponse(status_code=409, content={"error": str(e)})
+    return session.status()
+
+
+@router.post("/debug/profiler/stop")
+async def stop_profiler():
+    session = profiler.stop()
+    if session is None:
+        return JSONResponse(status_code=404, content={"error": "no profiler session"})
+    return session.status()
+
+
+@router.get("/debug/profiler")
+async def get_profiler_status():
+    session = profiler.current()
+    if session is None:
+        return {"running": False}
+    return session.status()
+
+
+@router.get("/debug/profiler/collapsed")
+async def download_profile():
+    """Collapsed stacks of the last (or running) session, for flamegraph.pl/speedscope."""
+    session = profiler.current()
+    if session is None:
+        return JSONResponse(status_code=404, content={"error": "no profiler session"})
+    ts = datetime.fromtimestamp(session.started_at).strftime("%Y%m%d-%H%M%S")
+    scope = f"-job{session.job_id}" if session.job_id is not None else ""
+    return PlainTextResponse(
+        session.collapsed(),
+        headers={
+            "Content-Disposition": f'attachment; filename="profile{scope}-{ts}.collapsed.txt"'
+        },
+    )
+
+
+@router.get("/debug/traces")
+async def get_trace_summary():
+    """Phase latencies of sampled traces per root (export.<type>, import.<type>)."""
+    return tracing.summary()
+
+
+@router.post("/debug/traces/sample-rate")
+async def set_trace_sample_rate(rate: float):
+    tracing.set_sample_rate(rate)
+    return {"sample_rate": tracing.sample_rate()}
+
+
+@router.post("/debug/traces/reset")
+async def reset_traces():
+    tracing.reset()
+    return {"status": "ok"}
@@ -1,5 +1,7 @@
+from typing import Optional
 from fastapi import APIRouter, BackgroundTasks
 from app.services.export.orchestrator import orchestrate_mm_export
+from app.services.export.bulk_import import build_bulk_import, default_bulk_path
 from app.logging_config import backend_logger
 
 router = APIRouter()
@@ -10,3 +12,18 @@ async def start_export(background_tasks: BackgroundTasks):
     backend_logger.info("Запуск экспорта в Mattermost")
     background_tasks.add_task(orchestrate_mm_export)
     return {"status": "export_started", "message": "Экспорт запущен в фоновом режиме"}
+
+
+@router.post("/export/bulk")
+async def start_bulk_export(
+    background_tasks: BackgroundTasks,
+    job_id: Optional[int] = None,
+    include_files: bool = True,
+):
+    """Offline export: Mattermost bulk import archive (JSONL + data/) for mmctl import."""
+    path = default_bulk_path(job_id)
+    backend_logger.info(f"Запуск bulk-экспорта в {path}")
+    background_tasks.add_task(
+        build_bulk_import, path, job_id=job_id, include_files=include_files
+    )
+    return {"status": "bulk_export_started", "path": path}
@@ -1,15 +1,59 @@
-from fastapi import APIRouter
-from sqlalchemy import select, func
-from app.models.base import SessionLocal
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, BackgroundTasks, Header, Query, Response
+from fastapi.responses import JSONResponse
+from sqlalchemy import select
+from app.logging_config import backend_logger
+from app.models.base import ApiSessionLocal, SessionLocal
 from app.models.import_job import ImportJob
-from app.models.entity import Entity
+from app.models.job_status_enum import JobStatus
 from app.models.status_enum import MappingStatus
-import os
-import glob
-import zipfile
+from app.services.export.orchestrator import (
+    EXPORT_ORDER,
+    export_requeued,
+    get_mm_user_id,
+)
+from app.services.export.requeue import requeue_entities
+from app.services.stats import eta
+from app.services.stats.counters import fetch_job_counts
+from app.services.stats.failures import fetch_failure_groups
 
 router = APIRouter()
 
+IMPORT_STAGES = {
+    "extracting",
+    "users",
+    "channels",
+    "messages",
+    "emojis",
+    "reactions",
+    "attachments",
+    "rendering",
+}
+
+# limit → (computed_at, body, etag): polls within JOBS_CACHE_TTL share one computation
+_cache: Dict[int, Tuple[float, bytes, str]] = {}
+
+
+def _cache_ttl() -> float:
+    return float(os.getenv("JOBS_CACHE_TTL", "1.0"))
+
+
+# meta sections served only by per-job endpoints (/jobs/{id}/query-stats,
+# /jobs/{id}/timeline): rewritten at every stage end and growing with the stage
+# count, they would bloat /jobs polls and SSE snapshots
+DETAIL_META_KEYS = ("query_stats", "timeline")
+
+
+def public_meta(meta: Optional[dict]) -> dict:
+    """Job meta for lists and progress snapshots, without DETAIL_META_KEYS."""
+    return {k: v for k, v in (meta or {}).items() if k not in DETAIL_META_KEYS}
+
 
 def _serialize_job(row: ImportJob) -> dict:
     created_at = getattr(row, "created_at", None)
@@ -18,197 +62,239 @@ def _serialize_job(row: ImportJob) -> dict:
         "id": row.id,
         "status": getattr(row.status, "value", row.status),
         "current_stage": row.current_stage,
-        "meta": row.meta or {},
+        "meta": public_meta(row.meta),
         "error_message": row.error_message,
         "created_at": created_at.isoformat() if created_at else None,
         "updated_at": updated_at.isoformat() if updated_at else None,
     }
 
 
-@router.get("/jobs")
-async def list_jobs(limit: int = 50):
-    async with SessionLocal() as session:
+async def _job_summaries(limit: int) -> list[dict]:
+    """Jobs with progress from persisted meta and entity_counters only:
+    file totals are written by the pipeline at extract time, so no filesystem
+    or zip access happens here.
+    """
+    async with ApiSessionLocal() as session:
         res = await session.execute(
             select(ImportJob).order_by(ImportJob.id.desc()).limit(limit)
         )
         rows = res.scalars().all()
+        # Per-job counters for all listed jobs in one query (entity_counters, no entities scan)
+        # job_id 0 — global types (users, channels, emoji) for the export ETA
+        job_counts = await fetch_job_counts(
+            session, [int(r.id) for r in rows if r.id is not None] + [0]
+        )
 
+    jobs_out = []
+    for row in rows:
+        data = _serialize_job(row)
+        meta = data.get("meta") or {}
         # Derive per-job totals for job-scoped types if meta.totals absent/empty
-        jobs_out = []
-        for row in rows:
-            data = _serialize_job(row)
-            meta = data.get("meta") or {}
-            # Backfill file-based import progress if available and missing
-            if (
-                (
-                    not meta.get("json_files_total")
-                    or not isinstance(meta.get("json_files_total"), int)
+        totals = meta.get("totals") or {}
+        needs_totals = not totals or all(
+            (totals.get(k, 0) == 0) for k in ("messages", "reactions", "attachments")
+        )
+        counts = job_counts.get(int(row.id), {}) if row.id is not None else {}
+        if needs_totals and row.id is not None:
+            derived = {et: sum(by_st.values()) for et, by_st in counts.items()}
+            totals = {
+                "messages": int(derived.get("message", 0)),
+                "reactions": int(derived.get("reaction", 0)),
+                "attachments": int(derived.get("attachment", 0)),
+                # emojis left as-is (global)
+                **(
+                    {"emojis": totals.get("emojis", 0)}
+                    if isinstance(totals, dict)
+                    else {}
+                ),
+            }
+            meta["totals"] = totals
+            data["meta"] = meta
+        # Derive processed counters:
+        #  - During import stages: keep max(meta vs derived) so UI doesn't regress.
+        #  - During exporting/done: use derived (non-pending) only, so progress resets to 0 at export start.
+        if row.id is not None:
+            nonpend = {
+                et: sum(
+                    cnt
+                    for st, cnt in by_st.items()
+                    if st != MappingStatus.pending.value
                 )
-                and bool(meta.get("extract_dir"))
-                and data.get("current_stage")
-                in {
-                    "extracting",
-                    "users",
-                    "channels",
-                    "messages",
-                    "emojis",
-                    "reactions",
-                    "attachments",
-                }
-            ):
-                base_dir = str(meta.get("extract_dir") or "")
-                try:
-                    total = 0
-                    if not base_dir or not os.path.isdir(base_dir):
-                        raise RuntimeError("extract_dir not available")
-                    # top-level files
-                    for fname in (
-                        "users.json",
-                        "channels.json",
-                        "groups.json",
-                        "dms.json",
-                        "mpims.json",
-                    ):
-                        if os.path.exists(os.path.join(base_dir, fname)):
-                            total += 1
-                    # daily message JSONs per channel
-                    for entry in os.listdir(base_dir):
-                        p = os.path.join(base_dir, entry)
-                        if os.path.isdir(p):
-                            total += len(glob.glob(os.path.join(p, "*.json")))
-                    meta["json_files_total"] = int(total)
-                    # processed remains whatever orchestrator has set; don't derive here to avoid expensive/fragile scans
-                    data["meta"] = meta
-                except Exception:
-                    pass
-            # If still no total, try to derive it directly from the uploaded zip archive
-            if (
-                (
-                    not meta.get("json_files_total")
-                    or not isinstance(meta.get("json_files_total"), int)
+                for et, by_st in counts.items()
+            }
+            if data.get("current_stage") in IMPORT_STAGES:
+                meta["messages_processed"] = max(
+                    int(meta.get("messages_processed") or 0),
+                    nonpend.get("message", 0),
                 )
-                and bool(meta.get("zip_path"))
-                and data.get("current_stage")
-                in {
-                    "extracting",
-                    "users",
-                    "channels",
-                    "messages",
-                    "emojis",
-                    "reactions",
-                    "attachments",
-                }
-            ):
-                zpath = str(meta.get("zip_path") or "")
-                try:
-                    if zpath and os.path.exists(zpath):
-                        total = 0
-                        top_present = {
-                            "users.json": False,
-                            "channels.json": False,
-                            "groups.json": False,
-                            "dms.json": False,
-                            "mpims.json": False,
-                        }
-                        with zipfile.ZipFile(zpath, "r") as zf:
-                            names = zf.namelist()
-                            # Normalize separators and filter directories
-                            top_allowed = {
-                                "users.json",
-                                "channels.json",
-                                "groups.json",
-                                "dms.json",
-                                "mpims.json",
-                            }
-                            for name in names:
-                                if name.endswith("/"):
-                                    continue
-                                # Remove any leading prefix folders (Slack zips often wrap everything in one folder)
-                                parts = [p for p in name.split("/") if p]
-                                if not parts:
-                                    continue
-                                fname = parts[-1]
-                                if len(parts) == 1:
-                                    # top-level file
-                                    if fname in top_allowed:
-                                        top_present[fname] = True
-                                        total += 1
-                                else:
-                                    # per-channel daily JSON: any *.json placed under some folder (channel/chat)
-                                    if fname.lower().endswith(".json"):
-                                        total += 1
-                        if total > 0:
-                            meta["json_files_total"] = int(total)
-                            # Do not synthesize processed here; let the orchestrator update the DB value in real time
-                            data["meta"] = meta
-                except Exception:
-                    # Non-fatal: silently ignore if zip cannot be read
-                    pass
-            totals = meta.get("totals") or {}
-            needs_totals = not totals or all(
-                (totals.get(k, 0) == 0)
-                for k in ("messages", "reactions", "attachments")
-            )
-            if needs_totals and row.id is not None:
-                q = await session.execute(
-                    select(Entity.entity_type, func.count())
-                    .where(Entity.job_id == row.id)
-                    .group_by(Entity.entity_type)
+                meta["reactions_processed"] = max(
+                    int(meta.get("reactions_processed") or 0),
+                    nonpend.get("reaction", 0),
                 )
-                derived = {et: cnt for et, cnt in q.all()}
-                totals = {
-                    "messages": int(derived.get("message", 0)),
-                    "reactions": int(derived.get("reaction", 0)),
-                    "attachments": int(derived.get("attachment", 0)),
-                    # emojis left as-is (global)
-                    **(
-                        {"emojis": totals.get("emojis", 0)}
-                        if isinstance(totals, dict)
-                        else {}
-                    ),
-                }
-                meta["totals"] = totals
-                data["meta"] = meta
-            # Derive processed counters:
-            #  - During import stages: keep max(meta vs derived) so UI doesn't regress.
-            #  - During exporting/done: use derived (non-pending) only, so progress resets to 0 at export start.
-            if row.id is not None:
-                q2 = await session.execute(
-                    select(Entity.entity_type, func.count())
-                    .where(
-                        (Entity.job_id == row.id)
-                        & (Entity.status != MappingStatus.pending)
-                    )
-                    .group_by(Entity.entity_type)
+                meta["attachments_processed"] = max(
+                    int(meta.get("attachments_processed") or 0),
+                    nonpend.get("attachment", 0),
                 )
-                nonpend = {et: int(cnt) for et, cnt in q2.all()}
-                in_import_stage = data.get("current_stage") in {
-                    "extracting",
-                    "users",
-                    "channels",
-                    "messages",
-                    "emojis",
-                    "reactions",
-                    "attachments",
-                }
-                if in_import_stage:
-                    meta["messages_processed"] = max(
-                        int(meta.get("messages_processed") or 0),
-                        nonpend.get("message", 0),
-                    )
-                    meta["reactions_processed"] = max(
-                        int(meta.get("reactions_processed") or 0),
-                        nonpend.get("reaction", 0),
-                    )
-                    meta["attachments_processed"] = max(
-                        int(meta.get("attachments_processed") or 0),
-                        nonpend.get("attachment", 0),
-                    )
-                else:
-                    # Export/done: reflect actual exported items only
-                    meta["messages_processed"] = int(nonpend.get("message", 0))
-                    meta["reactions_processed"] = int(nonpend.get("reaction", 0))
-                    meta["attachments_processed"] = int(nonpend.get("attachment", 0))
-                data["meta"] = meta
-            jobs_out.append(data)
-    return {"jobs": jobs_out}
+            else:
+                # Export/done: reflect actual exported items only
+                meta["messages_processed"] = int(nonpend.get("message", 0))
+                meta["reactions_processed"] = int(nonpend.get("reaction", 0))
+                meta["attachments_processed"] = int(nonpend.get("attachment", 0))
+            data["meta"] = meta
+        data["eta"] = (
+            eta.estimate(counts, job_counts.get(0, {}), eta.export_type())
+            if data.get("current_stage") == "exporting"
+            else None
+        )
+        jobs_out.append(data)
+    return jobs_out
+
+
+async def _jobs_body(limit: int) -> Tuple[bytes, str]:
+    now = time.monotonic()
+    hit = _cache.get(limit)
+    if hit and now - hit[0] < _cache_ttl():
+        return hit[1], hit[2]
+    body = json.dumps(
+        {"jobs": await _job_summaries(limit)}, ensure_ascii=False, default=str
+    ).encode("utf-8")
+    etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+    _cache.clear()  # one entry is enough: the UI always asks with the same limit
+    _cache[limit] = (now, body, etag)
+    return body, etag
+
+
+@router.get("/jobs")
+async def list_jobs(limit: int = 50, if_none_match: Optional[str] = Header(None)):
+    """Job list with progress. ETag is a hash of the body: polls with a matching
+    If-None-Match get 304 without a body.
+    """
+    body, etag = await _jobs_body(limit)
+    # Browsers revalidate on every request and reuse the cached body on 304
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match and etag in [t.strip() for t in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.get("/jobs/{job_id}/timeline")
+async def job_timeline(job_id: int):
+    """Stage ledger of a job (import stages and export types) in start order:
+    start/end, wall time, entities, entities/s, peak export queue depth.
+    """
+    async with ApiSessionLocal() as session:
+        job = await session.get(ImportJob, job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "job not found"})
+    ledger = (job.meta or {}).get("timeline") or {}
+    stages = sorted(
+        ({"stage": name, **entry} for name, entry in ledger.items()),
+        key=lambda e: e.get("started_at") or "",
+    )
+    return {
+        "job_id": job_id,
+        "status": getattr(job.status, "value", job.status),
+        "stages": stages,
+        "stages_wall_s": round(sum(e.get("wall_s") or 0 for e in stages), 3),
+    }
+
+
+@router.get("/jobs/{job_id}/query-stats")
+async def job_query_stats(job_id: int):
+    """SQL summaries of the job's finished stages as stored at stage end
+    (top fingerprints and N+1 suspects; live stages: /debug/query-stats).
+    """
+    async with ApiSessionLocal() as session:
+        job = await session.get(ImportJob, job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "job not found"})
+    return {"job_id": job_id, "stages": (job.meta or {}).get("query_stats") or {}}
+
+
+@router.get("/jobs/{job_id}/failures")
+async def job_failures(job_id: int, include_skipped: bool = False, samples: int = 5):
+    """Failed (optionally skipped) entities of a job's export grouped by entity
+    type and error signature, largest groups first, with sample entity ids.
+    """
+    statuses = [MappingStatus.failed]
+    if include_skipped:
+        statuses.append(MappingStatus.skipped)
+    async with ApiSessionLocal() as session:
+        job = await session.get(ImportJob, job_id)
+        if job is None:
+            return JSONResponse(status_code=404, content={"error": "job not found"})
+        groups = await fetch_failure_groups(
+            session, job_id, statuses, samples=max(0, min(samples, 100))
+        )
+    return {
+        "job_id": job_id,
+        "statuses": [s.value for s in statuses],
+        "total": sum(g["count"] for g in groups),
+        "groups": groups,
+    }
+
+
+@router.post("/jobs/{job_id}/requeue")
+async def job_requeue(
+    job_id: int,
+    background_tasks: BackgroundTasks,
+    entity_type: Optional[List[str]] = Query(None),
+    signature: Optional[str] = None,
+    channel: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    include_skipped: bool = False,
+    dry_run: bool = False,
+):
+    """Reset failed (and, with include_skipped, skipped) entities of a job to
+    pending, filtered by type, error signature (as in /failures), Slack channel
+    id and updated_at range, then re-export only the affected types.
+    dry_run returns the counts without changing anything.
+    """
+    known = [t for t, _ in EXPORT_ORDER]
+    unknown = sorted(set(entity_type or []) - set(known))
+    if unknown:
+        return JSONResponse(
+            status_code=400,
+            content={"error": f"unknown entity_type: {', '.join(unknown)}"},
+        )
+    async with ApiSessionLocal() as session:
+        job = await session.get(ImportJob, job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "job not found"})
+    if job.status == JobStatus.running and job.current_stage in IMPORT_STAGES:
+        return JSONResponse(
+            status_code=409, content={"error": "job is still importing"}
+        )
+    # Nothing is reset when the re-export could not start anyway
+    if not dry_run and not await get_mm_user_id():
+        return JSONResponse(
+            status_code=503, content={"error": "Mattermost is not reachable"}
+        )
+    async with SessionLocal() as session:
+        counts = await requeue_entities(
+            session,
+            job_id,
+            dry_run=dry_run,
+            entity_types=entity_type,
+            signature=signature,
+            channel=channel,
+            since=since,
+            until=until,
+            include_skipped=include_skipped,
+        )
+    types = [t for t in known if counts.get(t)]
+    started = bool(types) and not dry_run
+    if started:
+        backend_logger.info(
+            f"Requeue job_id={job_id}: {sum(counts.values())} сущностей ({', '.join(types)})"
+        )
+        background_tasks.add_task(export_requeued, job_id, types)
+    return {
+        "job_id": job_id,
+        "dry_run": dry_run,
+        "requeued": counts,
+        "total": sum(counts.values()),
+        "export_types": types,
+        "export_started": started,
+    }
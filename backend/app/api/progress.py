@@ -1,44 +1,55 @@
-import asyncio
-import json
 from fastapi import APIRouter
 from fastapi.responses import StreamingResponse
+from app.api.jobs import public_meta
 from app.api.stats import get_mapping_stats
-from app.models.base import SessionLocal
+from app.models.base import ApiSessionLocal
 from app.models.import_job import ImportJob
+from app.services.stats import eta
+from app.services.stats.broadcaster import ProgressBroadcaster
+from app.services.stats.counters import fetch_job_counts
 from sqlalchemy import select
 
 router = APIRouter()
 
 
+async def progress_snapshot() -> dict:
+    stats = await get_mapping_stats()
+    # Add latest job info
+    job_info = None
+    async with ApiSessionLocal() as session:
+        res = await session.execute(
+            select(ImportJob).order_by(ImportJob.id.desc()).limit(1)
+        )
+        row = res.scalar_one_or_none()
+        job_eta = None
+        if row and row.current_stage == "exporting":
+            counts = await fetch_job_counts(session, [int(row.id), 0])
+            job_eta = eta.estimate(counts[int(row.id)], counts[0], eta.export_type())
+    if row:
+        job_info = {
+            "id": row.id,
+            "status": getattr(row.status, "value", row.status),
+            "current_stage": row.current_stage,
+            "meta": public_meta(row.meta),
+            "eta": job_eta,
+        }
+    return {**stats, "job": job_info}
+
+
+# One producer per process, shared by all open streams
+broadcaster = ProgressBroadcaster(progress_snapshot)
+
+
 @router.get("/progress/stream")
 async def progress_stream(interval: float = 2.0):
+    """`stats` event with the full snapshot, then `delta` events with changed fields only."""
+
     async def event_generator():
         # Initial lines to help proxies start streaming immediately
         yield ": init\n\n"
         yield "retry: 2000\n\n"
-        while True:
-            try:
-                stats = await get_mapping_stats()
-                # Add latest job info
-                job_info = None
-                async with SessionLocal() as session:
-                    res = await session.execute(
-                        select(ImportJob).order_by(ImportJob.id.desc()).limit(1)
-                    )
-                    row = res.scalar_one_or_none()
-                if row:
-                    job_info = {
-                        "id": row.id,
-                        "status": getattr(row.status, "value", row.status),
-                        "current_stage": row.current_stage,
-                        "meta": row.meta or {},
-                    }
-                payload = json.dumps({**stats, "job": job_info}, ensure_ascii=False)
-                yield f"event: stats\ndata: {payload}\n\n"
-            except Exception as e:
-                # Emit an error event but keep the stream alive
-                yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
-            await asyncio.sleep(max(0.25, float(interval)))
+        async for chunk in broadcaster.stream(interval):
+            yield chunk
 
     headers = {
         "Cache-Control": "no-cache, no-store, must-revalidate",
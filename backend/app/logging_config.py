@@ -1,11 +1,16 @@
+import atexit
 import logging
-import sys
+import logging.handlers
 import os
+import queue
+import sys
 
 LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(filename)s:%(lineno)d %(funcName)s: %(message)s"
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 UVICORN_LOG_LEVEL = os.getenv("UVICORN_LOG_LEVEL", "INFO").upper()
 HTTPX_LOG_LEVEL = os.getenv("HTTPX_LOG_LEVEL", "WARNING").upper()
+# Write records to stdout from a background thread (LOG_QUEUE=0 — synchronously)
+LOG_QUEUE = os.getenv("LOG_QUEUE", "1").lower() in ("1", "true", "yes")
 
 # Преобразуем строки в уровни логирования
 LOG_LEVEL_NUM = getattr(logging, LOG_LEVEL, logging.INFO)
@@ -19,21 +24,61 @@ logging.basicConfig(level=LOG_LEVEL_NUM, format=LOG_FORMAT)
 backend_logger = logging.getLogger("backend")
 backend_logger.setLevel(LOG_LEVEL_NUM)
 
-# Добавляем собственный stdout-хендлер, чтобы uvicorn не глушил наши логи
-backend_stream_handler = logging.StreamHandler(sys.stdout)
-backend_stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
-backend_logger.handlers = [backend_stream_handler]
-backend_logger.propagate = False
 
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
+
+    The stock `prepare` runs the full formatter (asctime, format string) in the
+    caller; here only `%`-args are merged and a traceback is rendered, which
+    must happen before the record leaves the thread (args may be mutated,
+    traceback objects reference live frames). The record is changed in place
+    (no copy): the queue handler is the only handler of its loggers.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _stdout_handler() -> logging.Handler:
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    return handler
+
+
+# Собственный stdout-хендлер, чтобы uvicorn не глушил наши логи
+backend_stream_handler = _stdout_handler()
 # Кастомный хендлер для uvicorn
-uvicorn_handler = logging.StreamHandler(sys.stdout)
-uvicorn_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+uvicorn_handler = _stdout_handler()
+
+log_listener = None
+if LOG_QUEUE:
+    # Event loop only enqueues records; formatting and stdout writes happen
+    # on the listener thread. Unbounded queue: a slow stdout never blocks the loop.
+    _log_queue = queue.SimpleQueue()
+    backend_handler = LazyQueueHandler(_log_queue)
+    uvicorn_queue_handler = LazyQueueHandler(_log_queue)
+    # One stdout handler is enough: backend and uvicorn share the format
+    log_listener = logging.handlers.QueueListener(_log_queue, backend_stream_handler)
+    log_listener.start()
+    # Flush whatever is still queued on interpreter exit
+    atexit.register(log_listener.stop)
+else:
+    backend_handler = backend_stream_handler
+    uvicorn_queue_handler = uvicorn_handler
+
+backend_logger.handlers = [backend_handler]
+backend_logger.propagate = False
 
 # Настройка логгеров uvicorn
 for uvicorn_logger_name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
     uvicorn_logger = logging.getLogger(uvicorn_logger_name)
     uvicorn_logger.handlers = []  # Убираем дефолтные хендлеры Uvicorn
-    uvicorn_logger.addHandler(uvicorn_handler)
+    uvicorn_logger.addHandler(uvicorn_queue_handler)
     uvicorn_logger.propagate = False
     uvicorn_logger.setLevel(UVICORN_LOG_LEVEL_NUM)
 
@@ -15,14 +15,20 @@ from app.api.export import router as export_router
 from app.api.plugin import router as plugin_router
 from app.api.stats import router as stats_router
 from app.api.progress import router as progress_router
+from app.api.metrics import router as metrics_router
 from app.api.jobs import router as jobs_router
+from app.api.debug import router as debug_router
 from app.api import plugin as plugin_api
-from app.models.base import SessionLocal
+from app.models.base import ControlSessionLocal, ENGINES
+from app.services.monitoring import query_stats
 from sqlalchemy import select
 from app.models.import_job import ImportJob
 from app.models.job_status_enum import JobStatus
 from app.services.export.orchestrator import orchestrate_mm_export
 
+# SQL instrumentation (fingerprints per job/stage, N+1 detection)
+query_stats.install(ENGINES.values())
+
 BACKEND_HOST = os.getenv("BACKEND_HOST", "localhost")
 BACKEND_PORT = int(os.getenv("BACKEND_PORT", "8000"))
 ALEMBIC_INI = os.getenv("ALEMBIC_INI", "/alembic.ini")
@@ -70,7 +76,7 @@ async def lifespan(app: FastAPI):
     # Auto-resume export of unfinished jobs (FIFO) on startup
     if os.getenv("PYTEST_RUN", "0") not in ("1", "true", "TRUE"):
         try:
-            async with SessionLocal() as session:
+            async with ControlSessionLocal() as session:
                 q = await session.execute(
                     select(ImportJob).where(
                         (ImportJob.status == JobStatus.running)
@@ -109,6 +115,8 @@ app.include_router(plugin_router)
 app.include_router(stats_router)
 app.include_router(progress_router)
 app.include_router(jobs_router)
+app.include_router(debug_router)
+app.include_router(metrics_router)
 
 
 @app.get("/healthcheck")
@@ -6,6 +6,8 @@ import os
 
 # Choose DATABASE_URL; default to in-memory SQLite (async) for tests when not provided
 DATABASE_URL = os.getenv("DATABASE_URL") or "sqlite+aiosqlite:///:memory:"
+# Optional read replica for API reads (/jobs, /stats, SSE); falls back to DATABASE_URL
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL") or DATABASE_URL
 
 # Tune DB pool for high concurrency; overridable via env
 POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
@@ -13,28 +15,87 @@ MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "40"))
 POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "60"))
 
 url = make_url(DATABASE_URL)
-engine_kwargs: dict = {
-    "echo": False,
-    "future": True,
-    "pool_pre_ping": True,
-}
 
-# SQLite (aiosqlite) requires special pooling and no size/overflow params
-if url.drivername.startswith("sqlite+"):
-    engine_kwargs.update(
-        {
-            "poolclass": StaticPool,
+
+def _engine_kwargs(prefix: str, pool_size, max_overflow, pool_timeout, stmt_timeout):
+    """Engine options for a named pool. Env overrides: {prefix}_POOL_SIZE,
+    {prefix}_MAX_OVERFLOW, {prefix}_POOL_TIMEOUT, {prefix}_STATEMENT_TIMEOUT_MS
+    (0 — no server-side statement timeout).
+    """
+    kwargs: dict = {
+        "echo": False,
+        "future": True,
+        "pool_pre_ping": True,
+        "pool_size": int(os.getenv(f"{prefix}_POOL_SIZE", str(pool_size))),
+        "max_overflow": int(os.getenv(f"{prefix}_MAX_OVERFLOW", str(max_overflow))),
+        "pool_timeout": int(os.getenv(f"{prefix}_POOL_TIMEOUT", str(pool_timeout))),
+    }
+    timeout_ms = int(os.getenv(f"{prefix}_STATEMENT_TIMEOUT_MS", str(stmt_timeout)))
+    if timeout_ms > 0 and url.drivername == "postgresql+asyncpg":
+        kwargs["connect_args"] = {
+            "server_settings": {"statement_timeout": str(timeout_ms)}
         }
+    return kwargs
+
+
+# SQLite (aiosqlite) requires special pooling and no size/overflow params;
+# the in-memory database lives in a single connection, so all names share one engine
+if url.drivername.startswith("sqlite+"):
+    engine = create_async_engine(
+        DATABASE_URL,
+        echo=False,
+        future=True,
+        pool_pre_ping=True,
+        poolclass=StaticPool,
     )
+    api_engine = engine
+    control_engine = engine
 else:
-    engine_kwargs.update(
-        {
-            "pool_size": POOL_SIZE,
-            "max_overflow": MAX_OVERFLOW,
-            "pool_timeout": POOL_TIMEOUT,
-        }
+    # Pipeline: ingestion and export workers (bulk of the load)
+    engine = create_async_engine(
+        DATABASE_URL,
+        **_engine_kwargs("DB", POOL_SIZE, MAX_OVERFLOW, POOL_TIMEOUT, 0),
+    )
+    # API reads: small pool with short timeouts so the UI fails fast instead of hanging
+    api_engine = create_async_engine(
+        DATABASE_READ_URL, **_engine_kwargs("DB_API", 5, 5, 10, 15000)
+    )
+    # Control: job state/progress updates, never starved by export workers
+    control_engine = create_async_engine(
+        DATABASE_URL, **_engine_kwargs("DB_CONTROL", 2, 3, 10, 5000)
     )
 
-engine = create_async_engine(DATABASE_URL, **engine_kwargs)
 SessionLocal = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+ApiSessionLocal = async_sessionmaker(
+    api_engine, expire_on_commit=False, class_=AsyncSession
+)
+ControlSessionLocal = async_sessionmaker(
+    control_engine, expire_on_commit=False, class_=AsyncSession
+)
 Base = declarative_base()
+
+ENGINES = {"pipeline": engine, "api": api_engine, "control": control_engine}
+
+
+def pool_stats() -> dict:
+    """Current usage of each named pool (size/checked_out/overflow/checked_in)."""
+    out: dict = {}
+    for name, eng in ENGINES.items():
+        pool = eng.sync_engine.pool
+        stats: dict = {"pool": type(pool).__name__}
+        for key, attr in (
+            ("size", "size"),
+            ("checked_out", "checkedout"),
+            ("checked_in", "checkedin"),
+            ("overflow", "overflow"),
+        ):
+            fn = getattr(pool, attr, None)
+            if callable(fn):
+                try:
+                    stats[key] = int(fn())
+                except Exception:
+                    pass
+        if name != "pipeline":
+            stats["shared_with_pipeline"] = eng is engine
+        out[name] = stats
+    return out
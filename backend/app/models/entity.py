@@ -35,6 +35,8 @@ class Entity(Base):
         default=MappingStatus.pending,
     )
     error_message = Column(Text)
+    # Normalized error_message (ids/numbers/URLs stripped) for grouping failures
+    error_signature = Column(Text)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
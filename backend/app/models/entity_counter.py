@@ -0,0 +1,18 @@
+from sqlalchemy import Column, BigInteger, Text, Enum as SAEnum
+from .base import Base
+from .status_enum import MappingStatus
+
+
+class EntityCounter(Base):
+    """
+    Счётчики сущностей по (job_id, entity_type, status).
+    Поддерживаются триггерами на таблице entities (см. миграцию 010_entity_counters),
+    поэтому код приложения сюда не пишет — только читает.
+      - job_id = 0: глобальные строки (entities.job_id IS NULL)
+    """
+
+    __tablename__ = "entity_counters"
+    job_id = Column(BigInteger, primary_key=True, default=0)
+    entity_type = Column(Text, primary_key=True)
+    status = Column(SAEnum(MappingStatus, name="mapping_status"), primary_key=True)
+    count = Column(BigInteger, nullable=False, default=0)
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, BigInteger, Text
+from .base import Base
+
+
+class IdMap(Base):
+    """
+    Узкая таблица соответствия Slack ID -> Mattermost ID для резолва ссылок при экспорте.
+    Пишется при успешном экспорте (ExporterBase.set_status).
+      - job_id = 0: глобальные типы (user, channel, custom_emoji) и legacy-строки без задачи
+    """
+
+    __tablename__ = "id_map"
+    entity_type = Column(Text, primary_key=True)
+    job_id = Column(BigInteger, primary_key=True, default=0)
+    slack_id = Column(Text, primary_key=True)
+    mm_id = Column(Text, nullable=False)
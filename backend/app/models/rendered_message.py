@@ -0,0 +1,19 @@
+from sqlalchemy import Column, BigInteger, Text, JSON, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from .base import Base
+
+
+class RenderedMessage(Base):
+    """
+    Markdown сообщения, отрендеренный на стадии импорта rendering.
+    Экспорт берёт text/props отсюда вместо рендеринга raw_data.
+    """
+
+    __tablename__ = "rendered_messages"
+    entity_id = Column(
+        BigInteger, ForeignKey("entities.id", ondelete="CASCADE"), primary_key=True
+    )
+    job_id = Column(BigInteger, ForeignKey("import_jobs.id", ondelete="CASCADE"))
+    text = Column(Text, nullable=False)
+    props = Column(JSON)
+    rendered_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -1,5 +1,6 @@
 from app.services.entities.attachment import Attachment
 from app.logging_config import backend_logger
+from app.services.monitoring import tracing
 import os
 import glob
 import ijson
@@ -71,9 +72,19 @@ async def parse_attachments_from_export(
                                 auto_save=False,
                                 job_id=job_id,
                             )
-                            ent = await attachment.save_to_db()
+                            with tracing.trace(
+                                "import.attachment",
+                                slack_id=str(slack_id),
+                                job_id=job_id or 0,
+                            ):
+                                with tracing.span("save"):
+                                    ent = await attachment.save_to_db()
+                                if ent is not None:
+                                    with tracing.span("relation.attached_to"):
+                                        await attachment.create_attached_to_relation(
+                                            message_ts
+                                        )
                             if ent is not None:
-                                await attachment.create_attached_to_relation(message_ts)
                                 total += 1
                                 if progress:
                                     await progress(1)
@@ -3,6 +3,7 @@ import glob
 import ijson
 from app.services.entities.message import Message
 from app.logging_config import backend_logger
+from app.services.monitoring import tracing
 from typing import Awaitable, Callable, Optional
 
 
@@ -48,14 +49,24 @@ async def parse_channel_messages(
                                 auto_save=False,
                                 job_id=job_id,
                             )
-                            # Save and link immediately to avoid memory growth
-                            await message_entity.save_to_db(channel_id)
-                            if getattr(message_entity, "id", None) is not None:
-                                await message_entity.create_posted_in_relation(
-                                    channel_id
-                                )
-                                await message_entity.create_posted_by_relation()
-                                await message_entity.create_thread_relation()
+                            with tracing.trace(
+                                "import.message",
+                                slack_id=str(slack_id),
+                                job_id=job_id or 0,
+                                file=f"{folder}/{os.path.basename(msg_file)}",
+                            ):
+                                # Save and link immediately to avoid memory growth
+                                with tracing.span("save"):
+                                    await message_entity.save_to_db(channel_id)
+                                if getattr(message_entity, "id", None) is not None:
+                                    with tracing.span("relation.posted_in"):
+                                        await message_entity.create_posted_in_relation(
+                                            channel_id
+                                        )
+                                    with tracing.span("relation.posted_by"):
+                                        await message_entity.create_posted_by_relation()
+                                    with tracing.span("relation.thread"):
+                                        await message_entity.create_thread_relation()
                             saved_count += 1
                             if saved_count % batch_size == 0:
                                 backend_logger.debug(
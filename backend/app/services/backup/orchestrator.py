@@ -8,11 +8,13 @@ from .channels_import import parse_channels_and_chats, find_channel_for_folder
 from .messages_import import parse_channel_messages
 from .attachments_import import parse_attachments_from_export
 from .reactions_import import parse_reactions_from_export
+from .prerender import prerender_enabled, prerender_job_messages
 from app.services.export.orchestrator import orchestrate_mm_export
-from app.models.base import SessionLocal
+from app.models.base import ControlSessionLocal
 from app.models.import_job import ImportJob
 from app.models.job_status_enum import JobStatus
 from app.services.entities.custom_emoji import get_slack_emoji_list
+from app.services.monitoring.query_stats import add_entities, job_stage
 import os
 import glob
 import ijson
@@ -21,22 +23,31 @@ from .custom_emojis_import import parse_custom_emojis_from_export
 
 
 async def orchestrate_slack_import(zip_path):
-    # Create job entry
+    # Create job entry; the file total is known from the zip directory right away,
+    # so /jobs shows progress during extraction without touching the filesystem
+    from app.services.backup.zip_utils import count_json_files
+
+    meta: Dict[str, Any] = {"zip_path": zip_path}
+    try:
+        meta["json_files_total"] = await count_json_files(zip_path)
+        meta["json_files_processed"] = 0
+    except Exception as e:
+        backend_logger.warning(f"Не удалось прочитать оглавление {zip_path}: {e}")
     job_id = None
-    async with SessionLocal() as session:
+    async with ControlSessionLocal() as session:
         job = ImportJob(
             status=JobStatus.running,
             current_stage="extracting",
-            meta={"zip_path": zip_path},
+            meta=meta,
         )
         session.add(job)
         await session.commit()
         await session.refresh(job)
         job_id = job.id
     extract_dir = tempfile.mkdtemp(prefix="slack-extract-")
-    # Persist extract_dir for compatibility (e.g., /jobs can derive file totals while import runs)
+    # Persist extract_dir (cleanup and diagnostics)
     try:
-        async with SessionLocal() as session:
+        async with ControlSessionLocal() as session:
             job = await session.get(ImportJob, job_id)
             if job:
                 meta = cast(Dict[str, Any], (job.meta or {}))
@@ -49,7 +60,10 @@ async def orchestrate_slack_import(zip_path):
         backend_logger.info(f"Распаковываю архив {zip_path} в {extract_dir}")
         from app.services.backup.zip_utils import extract_zip
 
-        await extract_zip(zip_path, extract_dir)
+        async with job_stage(
+            job_id, "extracting", entities=meta.get("json_files_total") or 0
+        ):
+            await extract_zip(zip_path, extract_dir)
 
         # Получаем список эмодзи из Slack API один раз
         emoji_list = await get_slack_emoji_list()
@@ -79,7 +93,7 @@ async def orchestrate_slack_import(zip_path):
             return total, presence
 
         json_total, json_presence = _json_files_count(extract_dir)
-        async with SessionLocal() as session:
+        async with ControlSessionLocal() as session:
             job = await session.get(ImportJob, job_id)
             if job:
                 meta = cast(Dict[str, Any], (job.meta or {}))
@@ -91,19 +105,21 @@ async def orchestrate_slack_import(zip_path):
                 await session.commit()
 
         # users
-        async with SessionLocal() as session:
+        async with ControlSessionLocal() as session:
             job = await session.get(ImportJob, job_id)
             if job:
                 setattr(job, "current_stage", "users")
                 await session.commit()
         backend_logger.info("Архив распакован. Начинаю парсинг пользователей…")
-        users = await parse_users(extract_dir, job_id=None)
+        async with job_stage(job_id, "users"):
+            users = await parse_users(extract_dir, job_id=None)
+            add_entities(len(users))
         backend_logger.info(
             f"Импорт пользователей завершён. Всего обработано: {len(users)}"
         )
         # Отметить users.json как обработанный, если он присутствует
         if json_presence.get("users.json"):
-            async with SessionLocal() as session:
+            async with ControlSessionLocal() as session:
                 job = await session.get(ImportJob, job_id)
                 if job:
                     meta = cast(Dict[str, Any], (job.meta or {}))
@@ -114,12 +130,14 @@ async def orchestrate_slack_import(zip_path):
                     await session.commit()
 
         # channels
-        async with SessionLocal() as session:
+        async with ControlSessionLocal() as session:
             job = await session.get(ImportJob, job_id)
             if job:
                 setattr(job, "current_stage", "channels")
                 await session.commit()
-        channels = await parse_channels_and_chats(extract_dir, job_id=None)
+        async with job_stage(job_id, "channels"):
+            channels = await parse_channels_and_chats(extract_dir, job_id=None)
+            add_entities(len(channels))
         backend_logger.info(
             f"Импорт каналов завершён. Всего обработано: {len(channels)}"
         )
@@ -127,7 +145,7 @@ async def orchestrate_slack_import(zip_path):
         top_channel_files = ["channels.json", "groups.json", "dms.json", "mpims.json"]
         add = sum(1 for f in top_channel_files if json_presence.get(f))
         if add:
-            async with SessionLocal() as session:
+            async with ControlSessionLocal() as session:
                 job = await session.get(ImportJob, job_id)
                 if job:
                     meta = cast(Dict[str, Any], (job.meta or {}))
@@ -213,7 +231,7 @@ async def orchestrate_slack_import(zip_path):
                 valid_emoji += 1
         counts["emojis"] = valid_emoji
 
-        async with SessionLocal() as session:
+        async with ControlSessionLocal() as session:
             job = await session.get(ImportJob, job_id)
             if job:
                 meta = cast(Dict[str, Any], (job.meta or {}))
@@ -226,6 +244,7 @@ async def orchestrate_slack_import(zip_path):
                     "emojis",
                     "reactions",
                     "attachments",
+                    "rendering",
                     "exporting",
                     "done",
                 ]
@@ -233,7 +252,7 @@ async def orchestrate_slack_import(zip_path):
                 await session.commit()
 
         # messages
-        async with SessionLocal() as session:
+        async with ControlSessionLocal() as session:
             job = await session.get(ImportJob, job_id)
             if job:
                 setattr(job, "current_stage", "messages")
@@ -244,7 +263,7 @@ async def orchestrate_slack_import(zip_path):
                 # Atomic merge to avoid lost updates from concurrent callbacks
                 from sqlalchemy import text
 
-                async with SessionLocal() as s:
+                async with ControlSessionLocal() as s:
                     await s.execute(
                         text(
                             """
@@ -266,7 +285,7 @@ async def orchestrate_slack_import(zip_path):
                 # Atomic merge to avoid lost updates from concurrent callbacks
                 from sqlalchemy import text
 
-                async with SessionLocal() as s:
+                async with ControlSessionLocal() as s:
                     await s.execute(
                         text(
                             """
@@ -284,24 +303,25 @@ async def orchestrate_slack_import(zip_path):
                     await s.commit()
 
             jid = cast(int | None, job_id)
-            _ = await parse_channel_messages(
-                extract_dir,
-                folder_channel_map,
-                batch_size=200,
-                progress=_progress_messages,
-                file_progress=_progress_msg_files,
-                job_id=jid,
-            )
+            async with job_stage(job_id, "messages", entities=counts["messages"]):
+                _ = await parse_channel_messages(
+                    extract_dir,
+                    folder_channel_map,
+                    batch_size=200,
+                    progress=_progress_messages,
+                    file_progress=_progress_msg_files,
+                    job_id=jid,
+                )
 
         # emojis
-        async with SessionLocal() as session:
+        async with ControlSessionLocal() as session:
             job = await session.get(ImportJob, job_id)
             if job:
                 setattr(job, "current_stage", "emojis")
                 await session.commit()
 
             async def _progress_emojis(delta: int):
-                async with SessionLocal() as s:
+                async with ControlSessionLocal() as s:
                     job = await s.get(ImportJob, job_id)
                     if job:
                         meta = cast(Dict[str, Any], (job.meta or {}))
@@ -311,22 +331,23 @@ async def orchestrate_slack_import(zip_path):
                         setattr(job, "meta", meta)  # type: ignore[attr-defined]
                         await s.commit()
 
-            await parse_custom_emojis_from_export(
-                extract_dir,
-                folder_channel_map,
-                emoji_list,
-                progress=_progress_emojis,
-            )
+            async with job_stage(job_id, "emojis", entities=counts["emojis"]):
+                await parse_custom_emojis_from_export(
+                    extract_dir,
+                    folder_channel_map,
+                    emoji_list,
+                    progress=_progress_emojis,
+                )
 
         # reactions
-        async with SessionLocal() as session:
+        async with ControlSessionLocal() as session:
             job = await session.get(ImportJob, job_id)
             if job:
                 setattr(job, "current_stage", "reactions")
                 await session.commit()
 
             async def _progress_reactions(delta: int):
-                async with SessionLocal() as s:
+                async with ControlSessionLocal() as s:
                     job = await s.get(ImportJob, job_id)
                     if job:
                         meta = cast(Dict[str, Any], (job.meta or {}))
@@ -336,23 +357,24 @@ async def orchestrate_slack_import(zip_path):
                         setattr(job, "meta", meta)  # type: ignore[attr-defined]
                         await s.commit()
 
-            await parse_reactions_from_export(
-                extract_dir,
-                folder_channel_map,
-                emoji_list,
-                progress=_progress_reactions,
-                job_id=jid,
-            )
+            async with job_stage(job_id, "reactions", entities=counts["reactions"]):
+                await parse_reactions_from_export(
+                    extract_dir,
+                    folder_channel_map,
+                    emoji_list,
+                    progress=_progress_reactions,
+                    job_id=jid,
+                )
 
         # attachments
-        async with SessionLocal() as session:
+        async with ControlSessionLocal() as session:
             job = await session.get(ImportJob, job_id)
             if job:
                 setattr(job, "current_stage", "attachments")
                 await session.commit()
 
             async def _progress_attachments(delta: int):
-                async with SessionLocal() as s:
+                async with ControlSessionLocal() as s:
                     job = await s.get(ImportJob, job_id)
                     if job:
                         meta = cast(Dict[str, Any], (job.meta or {}))
@@ -362,15 +384,50 @@ async def orchestrate_slack_import(zip_path):
                         setattr(job, "meta", meta)  # type: ignore[attr-defined]
                         await s.commit()
 
-            await parse_attachments_from_export(
-                extract_dir,
-                folder_channel_map,
-                progress=_progress_attachments,
-                job_id=jid,
-            )
+            async with job_stage(job_id, "attachments", entities=counts["attachments"]):
+                await parse_attachments_from_export(
+                    extract_dir,
+                    folder_channel_map,
+                    progress=_progress_attachments,
+                    job_id=jid,
+                )
+
+        # rendering: pre-render message markdown now that users/channels are known
+        if prerender_enabled():
+            async with ControlSessionLocal() as session:
+                job = await session.get(ImportJob, job_id)
+                if job:
+                    setattr(job, "current_stage", "rendering")
+                    await session.commit()
+
+            async def _progress_rendered(delta: int):
+                from sqlalchemy import text
+
+                async with ControlSessionLocal() as s:
+                    await s.execute(
+                        text(
+                            """
+                            UPDATE import_jobs
+                            SET meta = COALESCE(meta, '{}'::jsonb)
+                                || jsonb_build_object(
+                                    'messages_rendered',
+                                    COALESCE((meta->>'messages_rendered')::int, 0) + :delta
+                                )
+                            WHERE id = :job_id
+                            """
+                        ),
+                        {"delta": int(delta or 0), "job_id": job_id},
+                    )
+                    await s.commit()
+
+            async with job_stage(job_id, "rendering"):
+                rendered = await prerender_job_messages(
+                    cast(int, job_id), progress=_progress_rendered
+                )
+                add_entities(rendered)
 
         # export
-        async with SessionLocal() as session:
+        async with ControlSessionLocal() as session:
             job = await session.get(ImportJob, job_id)
             if job:
                 setattr(job, "current_stage", "exporting")
@@ -378,7 +435,7 @@ async def orchestrate_slack_import(zip_path):
         await orchestrate_mm_export(job_id=job_id)
 
         # done
-        async with SessionLocal() as session:
+        async with ControlSessionLocal() as session:
             from sqlalchemy import update
 
             await session.execute(
@@ -389,7 +446,7 @@ async def orchestrate_slack_import(zip_path):
             await session.commit()
     except Exception as e:
         backend_logger.error(f"Оркестратор импорта завершился с ошибкой: {e}")
-        async with SessionLocal() as session:
+        async with ControlSessionLocal() as session:
             from sqlalchemy import update
 
             await session.execute(
@@ -409,7 +466,7 @@ async def orchestrate_slack_import(zip_path):
             )
         # Cleanup extract_dir from job.meta to avoid leaking temp paths
         try:
-            async with SessionLocal() as session:
+            async with ControlSessionLocal() as session:
                 job = await session.get(ImportJob, job_id)
                 if job:
                     meta = cast(Dict[str, Any], (job.meta or {}))
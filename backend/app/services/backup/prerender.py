@@ -0,0 +1,211 @@
+"""Rendering stage: pre-render a job's messages to Markdown before export.
+
+Runs after users and channels are imported. The name table (user/channel names)
+is loaded once and shipped to a process pool; message pages are rendered there
+and stored in rendered_messages, so MessageExporter only assembles payloads and
+retries do not render again.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.logging_config import backend_logger
+from app.models.base import SessionLocal
+from app.models.entity import Entity
+from app.models.rendered_message import RenderedMessage
+from app.services.export import markdown_renderer
+
+
+def prerender_enabled() -> bool:
+    return os.getenv("PRERENDER_MESSAGES", "1").lower() in ("1", "true", "yes")
+
+
+def _page_size() -> int:
+    return max(1, int(os.getenv("PRERENDER_PAGE_SIZE", "1000")))
+
+
+def _workers() -> int:
+    return max(1, int(os.getenv("PRERENDER_WORKERS", str(os.cpu_count() or 1))))
+
+
+# Per-process name table, set by the pool initializer (or directly for inline rendering)
+_names: markdown_renderer.NameTable = markdown_renderer.EMPTY_NAMES
+
+
+def _init_worker(users: dict, channels: dict) -> None:
+    global _names
+    _names = markdown_renderer.NameTable(users=users, channels=channels)
+
+
+def render_rows(rows: list[tuple[int, dict]]) -> list[tuple[int, str, dict]]:
+    """(entity_id, raw_data) → (entity_id, text, props) with the process name table."""
+    out = []
+    for entity_id, raw in rows:
+        raw = raw or {}
+        try:
+            text, props = markdown_renderer.render_cached(raw, _names)
+        except Exception as e:  # noqa: BLE001
+            # Leave the message to be rendered at export time
+            backend_logger.debug("Prerender failed for entity %s: %s", entity_id, e)
+            continue
+        out.append((entity_id, text, props))
+    return out
+
+
+async def load_name_table() -> markdown_renderer.NameTable:
+    """All known user and channel names, as MessageExporter would resolve them."""
+    users: dict[str, str] = {}
+    channels: dict[str, str] = {}
+    async with SessionLocal() as session:
+        res = await session.execute(
+            select(Entity.entity_type, Entity.slack_id, Entity.raw_data).where(
+                Entity.entity_type.in_(("user", "channel"))
+            )
+        )
+        for etype, slack_id, raw in res.all():
+            name = (raw or {}).get("name")
+            if etype == "user":
+                users[str(slack_id)] = name or str(slack_id)
+            elif name:
+                channels[str(slack_id)] = name
+    return markdown_renderer.NameTable(users=users, channels=channels)
+
+
+async def _store(rows: list[tuple[int, str, dict]], job_id: int) -> None:
+    if not rows:
+        return
+    stmt = pg_insert(RenderedMessage).values(
+        [
+            {"entity_id": eid, "job_id": job_id, "text": text, "props": props or None}
+            for eid, text, props in rows
+        ]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[RenderedMessage.entity_id],
+        set_={
+            "text": stmt.excluded.text,
+            "props": stmt.excluded.props,
+            "rendered_at": stmt.excluded.rendered_at,
+        },
+    )
+    async with SessionLocal() as session:
+        await session.execute(stmt)
+        await session.commit()
+
+
+async def _pages(job_id: int, page_size: int):
+    last_id = 0
+    while True:
+        async with SessionLocal() as session:
+            res = await session.execute(
+                select(Entity.id, Entity.raw_data)
+                .where(
+                    (Entity.entity_type == "message")
+                    & (Entity.job_id == job_id)
+                    & (Entity.id > last_id)
+                )
+                .order_by(Entity.id.asc())
+                .limit(page_size)
+            )
+            rows = [(int(i), raw) for i, raw in res.all()]
+        if not rows:
+            return
+        yield rows
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1][0]
+
+
+async def prerender_job_messages(
+    job_id: int,
+    progress: Optional[Callable[[int], Awaitable[None]]] = None,
+) -> int:
+    """Render all messages of the job and store them; returns the number rendered.
+    Rendering is an optimisation (the exporter renders messages without a row),
+    so a failure here is logged and ends the stage with what was stored so far.
+    """
+    workers = _workers()
+    loop = asyncio.get_running_loop()
+    pool: Optional[Executor] = None
+    total = 0
+    in_flight: set[asyncio.Future] = set()
+
+    async def _drain(wait_all: bool) -> None:
+        nonlocal total, in_flight
+        if not in_flight:
+            return
+        done, pending = await asyncio.wait(
+            in_flight,
+            return_when=(
+                asyncio.ALL_COMPLETED if wait_all else asyncio.FIRST_COMPLETED
+            ),
+        )
+        in_flight = set(pending)
+        for fut in done:
+            rendered = fut.result()
+            await _store(rendered, job_id)
+            total += len(rendered)
+            if progress:
+                await progress(len(rendered))
+
+    try:
+        names = await load_name_table()
+        if workers > 1:
+            # spawn: forking would copy the running event loop and the log queue /
+            # profiler / trace writer threads (child log records would go nowhere)
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(dict(names.users), dict(names.channels)),
+            )
+        else:
+            _init_worker(dict(names.users), dict(names.channels))
+        async for rows in _pages(job_id, _page_size()):
+            if pool is None:
+                in_flight.add(asyncio.ensure_future(_render_inline(rows)))
+            else:
+                in_flight.add(loop.run_in_executor(pool, render_rows, rows))
+            # Bound memory: at most two pages per worker are rendering/waiting
+            while len(in_flight) >= workers * 2:
+                await _drain(wait_all=False)
+        await _drain(wait_all=True)
+    except Exception as e:  # noqa: BLE001
+        for fut in in_flight:
+            fut.cancel()
+        backend_logger.error(
+            f"Предрендеринг сообщений прерван (job_id={job_id}), "
+            f"остальные будут отрендерены при экспорте: {e}"
+        )
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+    backend_logger.info(
+        f"Предрендеринг сообщений завершён (job_id={job_id}): {total}, процессов: {workers}"
+    )
+    return total
+
+
+async def _render_inline(rows):
+    return render_rows(rows)
+
+
+async def load_prerendered(entity_ids: list[int]) -> dict[int, tuple[str, dict]]:
+    """Pre-rendered (text, props) for a page of message entities."""
+    if not entity_ids or not prerender_enabled():
+        return {}
+    async with SessionLocal() as session:
+        res = await session.execute(
+            select(
+                RenderedMessage.entity_id, RenderedMessage.text, RenderedMessage.props
+            ).where(RenderedMessage.entity_id.in_(entity_ids))
+        )
+        return {int(eid): (text, props or {}) for eid, text, props in res.all()}
@@ -6,6 +6,7 @@ import ijson
 from typing import Callable, Awaitable, Optional
 from app.services.entities.custom_emoji import CustomEmoji
 from app.logging_config import backend_logger
+from app.services.monitoring import tracing
 from app.models.base import SessionLocal
 
 
@@ -154,10 +155,19 @@ async def parse_reactions_from_export(
                                     auto_save=False,
                                     job_id=job_id,
                                 )
-                                ent = await reaction_entity.save_to_db()
+                                with tracing.trace(
+                                    "import.reaction",
+                                    slack_id=reaction_entity.slack_id,
+                                    job_id=job_id or 0,
+                                ):
+                                    with tracing.span("save"):
+                                        ent = await reaction_entity.save_to_db()
+                                    if ent is not None:
+                                        with tracing.span("relation.reacted_by"):
+                                            await reaction_entity.create_reacted_by_relation()
+                                        with tracing.span("relation.reacted_to"):
+                                            await reaction_entity.create_reacted_to_relation()
                                 if ent is not None:
-                                    await reaction_entity.create_reacted_by_relation()
-                                    await reaction_entity.create_reacted_to_relation()
                                     total += 1
                                     if progress:
                                         await progress(1)
@@ -4,6 +4,7 @@
 import asyncio
 import subprocess
 import os
+import zipfile
 from app.logging_config import backend_logger
 
 
@@ -30,3 +31,35 @@ async def extract_zip(path_to_zip, extract_to):
             raise
 
     await loop.run_in_executor(None, _extract)
+
+
+# Верхнеуровневые JSON Slack-экспорта, учитываемые в прогрессе импорта по файлам
+TOP_LEVEL_JSON = (
+    "users.json",
+    "channels.json",
+    "groups.json",
+    "dms.json",
+    "mpims.json",
+)
+
+
+def _count_json_files(path_to_zip) -> int:
+    total = 0
+    with zipfile.ZipFile(path_to_zip, "r") as zf:
+        for name in zf.namelist():
+            parts = [p for p in name.split("/") if p]
+            if not parts or name.endswith("/"):
+                continue
+            fname = parts[-1]
+            if len(parts) == 1:
+                total += fname in TOP_LEVEL_JSON
+            elif fname.lower().endswith(".json"):
+                # дневные JSON сообщений в папке канала/чата
+                total += 1
+    return total
+
+
+async def count_json_files(path_to_zip) -> int:
+    """Число JSON-файлов экспорта по оглавлению zip (без распаковки)."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, _count_json_files, path_to_zip)
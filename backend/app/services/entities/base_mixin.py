@@ -5,6 +5,7 @@ import asyncio
 from app.models.entity import Entity
 from app.models.base import SessionLocal
 from app.models.status_enum import MappingStatus
+from app.utils.errors import error_signature
 from sqlalchemy.exc import IntegrityError
 from app.logging_config import backend_logger
 from sqlalchemy import select
@@ -28,7 +29,11 @@ class BaseMapping:
         self.status = status
         self.job_id = job_id
         backend_logger.debug(
-            f"Инициализация маппинга: {self.entity_type}, slack_id={self.slack_id}, mattermost_id={self.mattermost_id}, status={self.status}"
+            "Инициализация маппинга: %s, slack_id=%s, mattermost_id=%s, status=%s",
+            self.entity_type,
+            self.slack_id,
+            self.mattermost_id,
+            self.status,
         )
         if auto_save:
             asyncio.create_task(self.save_to_db())
@@ -56,7 +61,7 @@ class BaseMapping:
             if existing:
                 self.id = existing.id
                 backend_logger.debug(
-                    f"{self.entity_type} already exists: slack_id={self.slack_id}"
+                    "%s already exists: slack_id=%s", self.entity_type, self.slack_id
                 )
                 return existing
             entity = Entity(
@@ -71,7 +76,11 @@ class BaseMapping:
             try:
                 await session.commit()
                 backend_logger.debug(
-                    f"Сохранен маппинг: {self.entity_type}, slack_id={self.slack_id}, mattermost_id={self.mattermost_id}, status={self.status}"
+                    "Сохранен маппинг: %s, slack_id=%s, mattermost_id=%s, status=%s",
+                    self.entity_type,
+                    self.slack_id,
+                    self.mattermost_id,
+                    self.status,
                 )
                 self.id = entity.id
                 return entity
@@ -141,6 +150,7 @@ class BaseMapping:
                 .values(
                     status=MappingStatus(new_status),
                     error_message=str(error) if error else None,
+                    error_signature=error_signature(str(error)) if error else None,
                 )
             )
             result = await session.execute(stmt)
@@ -148,7 +158,10 @@ class BaseMapping:
 
             if result.rowcount > 0:
                 backend_logger.debug(
-                    f"Обновлен статус {self.entity_type} {self.slack_id}: {new_status}"
+                    "Обновлен статус %s %s: %s",
+                    self.entity_type,
+                    self.slack_id,
+                    new_status,
                 )
             else:
                 backend_logger.error(
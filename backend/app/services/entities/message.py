@@ -79,7 +79,7 @@ class Message(BaseMapping):
                 and user_id
                 and (user_id.startswith("B") or user_id == "USLACKBOT")
             ):
-                backend_logger.debug(f"Создание user-entity для бота: {user_id}")
+                backend_logger.debug("Создание user-entity для бота: %s", user_id)
                 from app.services.entities.user import User
 
                 username = self.raw_data.get("username") if self.raw_data else None
@@ -93,7 +93,9 @@ class Message(BaseMapping):
                 user_entity = await bot_user.save_to_db()
                 if user_entity:
                     backend_logger.debug(
-                        f"user-entity для бота создан: id={user_entity.id}, slack_id={user_id}"
+                        "user-entity для бота создан: id=%s, slack_id=%s",
+                        user_entity.id,
+                        user_id,
                     )
                 else:
                     backend_logger.error(
@@ -102,7 +104,9 @@ class Message(BaseMapping):
             if user_entity:
                 try:
                     backend_logger.debug(
-                        f"Пробую создать связь posted_by: from_entity_id={user_entity.id}, to_entity_id={self.id}"
+                        "Пробую создать связь posted_by: from_entity_id=%s, to_entity_id=%s",
+                        user_entity.id,
+                        self.id,
                     )
                     # Skip if relation already exists
                     existing_rel = await session.execute(
@@ -123,7 +127,9 @@ class Message(BaseMapping):
                         session.add(relation)
                         await session.commit()
                     backend_logger.debug(
-                        f"Связь posted_by создана: from_entity_id={user_entity.id}, to_entity_id={self.id}"
+                        "Связь posted_by создана: from_entity_id=%s, to_entity_id=%s",
+                        user_entity.id,
+                        self.id,
                     )
                 except Exception as e:
                     backend_logger.error(
@@ -8,9 +8,12 @@ import asyncio
 from .base_exporter import ExporterBase, LoggingMixin
 from .mm_api_mixin import MMApiMixin
 from app.logging_config import backend_logger
+from app.services.monitoring import tracing
 from sqlalchemy import select
+from sqlalchemy.orm import aliased
 from app.models.base import SessionLocal
 from app.models.entity import Entity
+from .id_map import lookup_mm_id
 
 
 class AttachmentExporter(ExporterBase, LoggingMixin, MMApiMixin):
@@ -52,7 +55,8 @@ class AttachmentExporter(ExporterBase, LoggingMixin, MMApiMixin):
             pass
 
         # Determine channel_id where to upload: prefer message relation, fallback to raw_data.channel_id
-        channel_id = await self._resolve_mm_channel_id_for_attachment()
+        with tracing.span("resolve_channel"):
+            channel_id = await self._resolve_mm_channel_id_for_attachment()
         if not channel_id:
             await self.set_status("failed", error="No target channel for attachment")
             return
@@ -93,7 +97,8 @@ class AttachmentExporter(ExporterBase, LoggingMixin, MMApiMixin):
             )
             headers = {"Authorization": f"Bearer {slack_token}"} if slack_token else {}
             try:
-                resp = await _retry_download(url, headers=headers)
+                with tracing.span("download", bytes=int(raw.get("size") or 0)):
+                    resp = await _retry_download(url, headers=headers)
             except Exception as e:  # noqa: BLE001
                 await self.set_status(
                     "failed", error=f"Failed to download from Slack: {e}"
@@ -124,11 +129,12 @@ class AttachmentExporter(ExporterBase, LoggingMixin, MMApiMixin):
                                 "application/octet-stream",
                             )
                         }
-                        resp2 = await self.mm_api_post_files(
-                            "/plugins/mm-importer/api/v1/attachment_multipart",
-                            fields,
-                            files,
-                        )
+                        with tracing.span("plugin_upload", multipart=True):
+                            resp2 = await self.mm_api_post_files(
+                                "/plugins/mm-importer/api/v1/attachment_multipart",
+                                fields,
+                                files,
+                            )
                     finally:
                         try:
                             if files is not None:
@@ -161,7 +167,7 @@ class AttachmentExporter(ExporterBase, LoggingMixin, MMApiMixin):
                     return
                 self.entity.mattermost_id = file_id
                 await self.set_status("success")
-                backend_logger.debug(f"Attachment uploaded, file_id={file_id}")
+                backend_logger.debug("Attachment uploaded, file_id=%s", file_id)
                 return
             else:
                 content = resp.content  # httpx.Response
@@ -194,7 +200,8 @@ class AttachmentExporter(ExporterBase, LoggingMixin, MMApiMixin):
             raise Exception(last_err or "plugin post failed")
 
         try:
-            resp = await _retry_plugin_post()
+            with tracing.span("plugin_upload", multipart=False):
+                resp = await _retry_plugin_post()
             if resp.status_code not in (200, 201):
                 # Try to parse error
                 try:
@@ -215,65 +222,46 @@ class AttachmentExporter(ExporterBase, LoggingMixin, MMApiMixin):
                 return
             self.entity.mattermost_id = file_id
             await self.set_status("success")
-            backend_logger.debug(f"Attachment uploaded, file_id={file_id}")
+            backend_logger.debug("Attachment uploaded, file_id=%s", file_id)
         except Exception as e:  # noqa: BLE001
             await self.set_status("failed", error=str(e))
 
     async def _resolve_mm_channel_id_for_attachment(self) -> Optional[str]:
         """Find the MM channel id where this attachment should be uploaded.
         Strategy:
-        - If raw_data has channel_id and we can map it to entity.channel mapping, use that
+        - If raw_data has channel_id, resolve it via id_map
         - Else: traverse relation attached_to -> message -> posted_in -> channel and get its mattermost_id
         """
         # 1) Try raw_data.channel_id path
         raw = self.entity.raw_data or {}
         ch_slack_id = raw.get("channel_id")
-        async with SessionLocal() as session:
-            if ch_slack_id:
-                q = await session.execute(
-                    select(Entity).where(
-                        (Entity.entity_type == "channel")
-                        & (Entity.slack_id == ch_slack_id)
-                    )
-                )
-                ch_entity = q.scalar_one_or_none()
-                if ch_entity is not None:
-                    mmid = getattr(ch_entity, "mattermost_id", None)
-                    if isinstance(mmid, str) and mmid:
-                        return mmid
+        if ch_slack_id:
+            mmid = await lookup_mm_id("channel", ch_slack_id)
+            if mmid:
+                return mmid
 
-            # 2) Walk relations: this attachment is from_entity in entity_relations to message, then message posted_in channel
-            # Find message entity via attached_to relation
-            from app.models.entity_relation import (
-                EntityRelation,
-            )  # local import to avoid cycles
+        # 2) Walk relations in one narrow query: attachment -attached_to-> message -posted_in-> channel
+        from app.models.entity_relation import (
+            EntityRelation,
+        )  # local import to avoid cycles
 
-            q_att = await session.execute(
-                select(EntityRelation, Entity)
-                .join(Entity, Entity.id == EntityRelation.to_entity_id)
+        att_rel = aliased(EntityRelation)
+        post_rel = aliased(EntityRelation)
+        async with SessionLocal() as session:
+            q = await session.execute(
+                select(Entity.mattermost_id)
+                .select_from(att_rel)
+                .join(post_rel, post_rel.from_entity_id == att_rel.to_entity_id)
+                .join(Entity, Entity.id == post_rel.to_entity_id)
                 .where(
-                    (EntityRelation.from_entity_id == self.entity.id)
-                    & (EntityRelation.relation_type == "attached_to")
+                    (att_rel.from_entity_id == self.entity.id)
+                    & (att_rel.relation_type == "attached_to")
+                    & (post_rel.relation_type == "posted_in")
                 )
+                .limit(1)
             )
-            row = q_att.first()
-            if row:
-                _, msg_entity = row
-                # Now find channel via posted_in relation
-                q_ch = await session.execute(
-                    select(EntityRelation, Entity)
-                    .join(Entity, Entity.id == EntityRelation.to_entity_id)
-                    .where(
-                        (EntityRelation.from_entity_id == msg_entity.id)
-                        & (EntityRelation.relation_type == "posted_in")
-                    )
-                )
-                ch_row = q_ch.first()
-                if ch_row:
-                    _, ch_entity2 = ch_row
-                    if ch_entity2 is not None:
-                        mmid2 = getattr(ch_entity2, "mattermost_id", None)
-                        if isinstance(mmid2, str) and mmid2:
-                            return mmid2
+            mmid2 = q.scalar_one_or_none()
+            if isinstance(mmid2, str) and mmid2:
+                return mmid2
 
         return None
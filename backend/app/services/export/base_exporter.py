@@ -5,7 +5,11 @@ from app.models.base import SessionLocal
 from app.models.status_enum import MappingStatus
 from app.models.entity import Entity
 from sqlalchemy import update
+from app.utils.errors import error_signature
 from app.utils.filters import job_scoped_condition
+from app.services.monitoring import metrics, tracing
+from app.services.stats import eta
+from .id_map import record_mm_id, remember_mm_id
 
 
 class ExporterBase(ABC):
@@ -19,6 +23,10 @@ class ExporterBase(ABC):
         pass
 
     async def set_status(self, status, error=None):
+        with tracing.span("set_status", status=str(status)):
+            await self._write_status(status, error)
+
+    async def _write_status(self, status, error=None):
         self.entity.status = status
         if error:
             self.entity.error_message = str(error)
@@ -28,6 +36,7 @@ class ExporterBase(ABC):
             update_values = {
                 "status": MappingStatus(status),
                 "error_message": str(error) if error else None,
+                "error_signature": error_signature(str(error)) if error else None,
             }
 
             # Если есть mattermost_id, добавляем его в обновление
@@ -46,11 +55,35 @@ class ExporterBase(ABC):
             stmt = update(Entity).where(where_cond).values(**update_values)
 
             result = await session.execute(stmt)
+            # Keep the narrow Slack -> MM id map in sync with successful exports
+            mm_id = update_values.get("mattermost_id")
+            if status == "success" and mm_id and result.rowcount > 0:
+                await record_mm_id(
+                    session,
+                    self.entity.entity_type,
+                    self.entity.slack_id,
+                    mm_id,
+                    getattr(self.entity, "job_id", None),
+                )
             await session.commit()
+            if status == "success" and mm_id and result.rowcount > 0:
+                remember_mm_id(
+                    self.entity.entity_type,
+                    self.entity.slack_id,
+                    mm_id,
+                    getattr(self.entity, "job_id", None),
+                )
 
             if result.rowcount > 0:
+                metrics.entities_processed.inc(
+                    self.entity.entity_type, MappingStatus(status).value
+                )
+                eta.record(self.entity.entity_type)
                 backend_logger.debug(
-                    f"Set status {status} for {self.entity.entity_type} {self.entity.slack_id}"
+                    "Set status %s for %s %s",
+                    status,
+                    self.entity.entity_type,
+                    self.entity.slack_id,
                 )
             else:
                 backend_logger.error(
@@ -61,7 +94,7 @@ class ExporterBase(ABC):
 # Пример миксина для логирования
 class LoggingMixin:
     def log_export(self, msg):
-        backend_logger.debug(f"[EXPORT] {msg}")
+        backend_logger.debug("[EXPORT] %s", msg)
 
 
 # Пример миксина для работы с Mattermost API
@@ -0,0 +1,608 @@
+"""
+Offline export to the Mattermost bulk import format (JSONL + data/ in one zip,
+loaded with `mmctl import upload` / `mmctl import process`). Walks the same
+entities/entity_relations tables as the online exporters and reuses their payload
+builders and markdown rendering, but never calls Mattermost.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import json
+import os
+import re
+import tempfile
+import time
+import zipfile
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+
+from app.logging_config import backend_logger
+from app.models.base import SessionLocal
+from app.models.entity import Entity
+from app.models.entity_relation import EntityRelation
+from app.models.status_enum import MappingStatus
+from app.utils.filters import job_scoped_condition
+
+from .channel_exporter import ChannelExporter
+from .custom_emoji_exporter import transliterate_cyrillic
+from .message_exporter import MessageCaches, MessageExporter, prefetch_mention_names
+from .mm_api_mixin import MMApiMixin
+from .orchestrator import iter_entities_keyset
+from .queries import relation_exists
+from .reaction_exporter import ReactionExporter
+from .user_exporter import UserExporter
+
+BULK_IMPORT_VERSION = 1
+
+_RE_CHANNEL_NAME = re.compile(r"[^a-z0-9_-]+")
+_RE_FILENAME = re.compile(r"[^\w.\-]+")
+
+# Image formats Mattermost accepts for custom emoji: magic bytes → extension
+_EMOJI_MAGIC = ((b"\x89PNG", "png"), (b"GIF8", "gif"), (b"\xff\xd8\xff", "jpg"))
+_EMOJI_EXTS = {"png", "gif", "jpg", "jpeg"}
+
+
+def _page_size() -> int:
+    return max(1, int(os.getenv("BULK_EXPORT_PAGE_SIZE", "500")))
+
+
+def normalize_channel_name(name: Optional[str], fallback: str) -> str:
+    """MM channel name: lowercase [a-z0-9_-], 2..64 chars (mirrors plugin normalization)."""
+    val = _RE_CHANNEL_NAME.sub("-", (name or "").lower()).strip("-")
+    if len(val) < 2:
+        val = _RE_CHANNEL_NAME.sub("-", fallback.lower()).strip("-") or "channel"
+    return val[:64]
+
+
+def _exportable(entity_type: str, job_id: Optional[int]):
+    # Everything except entities explicitly marked as not to be exported
+    cond = (Entity.entity_type == entity_type) & (
+        Entity.status != MappingStatus.skipped
+    )
+    return job_scoped_condition(cond, entity_type, job_id)
+
+
+def _orphan_replies(job_id: Optional[int]):
+    """Thread replies whose root is missing or not exported: written as top-level posts."""
+    rel = aliased(EntityRelation)
+    root = aliased(Entity)
+    has_root = (
+        select(rel.id)
+        .join(root, root.id == rel.to_entity_id)
+        .where(
+            (rel.from_entity_id == Entity.id)
+            & (rel.relation_type == "thread_reply")
+            & (root.status != MappingStatus.skipped)
+        )
+        .exists()
+    )
+    return _exportable("message", job_id) & relation_exists("thread_reply") & ~has_root
+
+
+def emoji_extension(url: Optional[str], content: bytes) -> str:
+    """File extension for an emoji image: sniffed from the content, else the URL."""
+    for magic, ext in _EMOJI_MAGIC:
+        if content.startswith(magic):
+            return ext
+    tail = os.path.splitext((url or "").split("?", 1)[0])[1].lstrip(".").lower()
+    return tail if tail in _EMOJI_EXTS else "png"
+
+
+class _BulkWriter:
+    """JSONL lines go to a temp file, binary files straight into the zip.
+    The JSONL is appended to the zip on close, so nothing is buffered in memory.
+    Serialization, file writes and the final compression run in a worker thread
+    (the builder runs as a background task on the API event loop).
+    """
+
+    # Lines buffered before a batch is serialized and written
+    FLUSH_LINES = 1000
+
+    def __init__(self, out_path: str):
+        self.out_path = out_path
+        self.tmp_zip = f"{out_path}.part"
+        self.zf = zipfile.ZipFile(self.tmp_zip, "w", compression=zipfile.ZIP_STORED)
+        fd, self.jsonl_path = tempfile.mkstemp(prefix="mm-bulk-", suffix=".jsonl")
+        self.jsonl = os.fdopen(fd, "w", encoding="utf-8")
+        self.lines = 0
+        self.files = 0
+        self._zip_lock = asyncio.Lock()
+        self._pending: list[tuple[str, Any]] = []
+
+    async def line(self, obj_type: str, data: Any) -> None:
+        self._pending.append((obj_type, data))
+        self.lines += 1
+        if len(self._pending) >= self.FLUSH_LINES:
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        await asyncio.to_thread(self._write_lines, batch)
+
+    def _write_lines(self, batch: list[tuple[str, Any]]) -> None:
+        self.jsonl.write(
+            "".join(
+                json.dumps({"type": t, t: d}, ensure_ascii=False) + "\n"
+                for t, d in batch
+            )
+        )
+
+    async def add_file(self, path: str, content: bytes) -> None:
+        async with self._zip_lock:
+            await asyncio.to_thread(self.zf.writestr, f"data/{path}", content)
+            self.files += 1
+
+    async def close(self) -> None:
+        await self.flush()
+        await asyncio.to_thread(self._close)
+
+    async def abort(self) -> None:
+        self._pending = []
+        await asyncio.to_thread(self._abort)
+
+    def _close(self) -> None:
+        self.jsonl.close()
+        try:
+            self.zf.write(
+                self.jsonl_path, "import.jsonl", compress_type=zipfile.ZIP_DEFLATED
+            )
+            self.zf.close()
+            os.replace(self.tmp_zip, self.out_path)
+        finally:
+            try:
+                os.remove(self.jsonl_path)
+            except OSError:
+                pass
+
+    def _abort(self) -> None:
+        for closer in (self.jsonl.close, self.zf.close):
+            try:
+                closer()
+            except Exception:
+                pass
+        for p in (self.jsonl_path, self.tmp_zip):
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+
+
+class BulkImportBuilder:
+    def __init__(
+        self,
+        out_path: str,
+        job_id: Optional[int] = None,
+        include_files: bool = True,
+        team: Optional[str] = None,
+        fallback_username: Optional[str] = None,
+    ):
+        self.out_path = out_path
+        self.job_id = job_id
+        self.include_files = include_files
+        self.team = team or os.environ.get("MM_TEAM", "test")
+        self.fallback_username = fallback_username or os.environ.get(
+            "BULK_EXPORT_FALLBACK_USER"
+        )
+        self.page_size = _page_size()
+        self.download_concurrency = max(1, int(os.getenv("BULK_EXPORT_DOWNLOADS", "4")))
+        # Small global lookups: Slack user id -> username, channel entity id -> target
+        self.usernames: Dict[str, str] = {}
+        self.channel_names: Dict[str, str] = {}
+        self.regular_channels: Dict[int, str] = {}
+        self.direct_channels: Dict[int, List[str]] = {}
+        self.members_by_user: Dict[str, List[str]] = {}
+        self.custom_emoji: set[str] = set()
+        # Custom emoji that got an `emoji` line; reactions with the others are dropped
+        self.written_emoji: set[str] = set()
+        self.caches: MessageCaches = {
+            "channel_name_by_slack_id": self.channel_names,
+            "username_by_slack_id": self.usernames,
+        }
+        self.stats: Dict[str, int] = {
+            "channels": 0,
+            "direct_channels": 0,
+            "users": 0,
+            "emoji": 0,
+            "posts": 0,
+            "replies": 0,
+            # Replies written as top-level posts: root without a user or not exported
+            "replies_standalone": 0,
+            "reactions": 0,
+            "attachments": 0,
+            "attachments_failed": 0,
+            "skipped_no_user": 0,
+            "reactions_missing_emoji": 0,
+        }
+        self._mixin = MMApiMixin()
+        self._reaction_helper = ReactionExporter(None)
+
+    async def build(self) -> dict:
+        t0 = time.monotonic()
+        w = _BulkWriter(self.out_path)
+        try:
+            await w.line("version", BULK_IMPORT_VERSION)
+            await self._write_emoji(w)
+            await w.line(
+                "team",
+                {"name": self.team, "display_name": self.team, "type": "O"},
+            )
+            await self._write_channels(w)
+            await self._write_users(w)
+            for ch_id, name in self.regular_channels.items():
+                await self._write_channel_posts(w, ch_id, channel=name)
+            for members in self.direct_channels.values():
+                names = self._member_usernames(members)
+                if len(names) >= 2:
+                    await w.line("direct_channel", {"members": names})
+            for ch_id, members in self.direct_channels.items():
+                names = self._member_usernames(members)
+                if len(names) >= 2:
+                    await self._write_channel_posts(w, ch_id, direct_members=names)
+            await w.close()
+        except Exception:
+            await w.abort()
+            raise
+        self.stats["lines"] = w.lines
+        self.stats["files"] = w.files
+        backend_logger.info(
+            f"Bulk import архив готов: {self.out_path} ({w.lines} строк, {w.files} файлов) "
+            f"за {time.monotonic() - t0:.1f}s"
+        )
+        return {"path": self.out_path, **self.stats}
+
+    def _member_usernames(self, slack_ids: List[str]) -> List[str]:
+        return [self.usernames[s] for s in slack_ids if s in self.usernames]
+
+    async def _write_emoji(self, w: _BulkWriter) -> None:
+        async for e in iter_entities_keyset(
+            _exportable("custom_emoji", None), self.page_size
+        ):
+            name = transliterate_cyrillic(e.slack_id)
+            self.custom_emoji.add(str(e.slack_id))
+            if not self.include_files:
+                continue
+            url = (e.raw_data or {}).get("url")
+            content = await self._download(url) if url else None
+            if content is None:
+                continue
+            path = f"emoji/{name}.{emoji_extension(url, content)}"
+            await w.add_file(path, content)
+            await w.line("emoji", {"name": name, "image": path})
+            self.written_emoji.add(str(e.slack_id))
+            self.stats["emoji"] += 1
+
+    async def _write_channels(self, w: _BulkWriter) -> None:
+        async for e in iter_entities_keyset(
+            _exportable("channel", None), self.page_size
+        ):
+            raw = e.raw_data or {}
+            helper = ChannelExporter(e)
+            members = [str(m) for m in (raw.get("members") or [])]
+            if helper._is_dm_channel(raw) or helper._is_group_dm_channel(raw):
+                self.direct_channels[int(e.id)] = members
+                self.stats["direct_channels"] += 1
+                continue
+            raw_name = helper._get_channel_name(raw)
+            name = normalize_channel_name(raw_name, str(e.slack_id))
+            data: Dict[str, Any] = {
+                "team": self.team,
+                "name": name,
+                "display_name": helper._sanitize_display_name(
+                    helper._get_channel_display_name(raw),
+                    (raw_name or name).replace("-", " "),
+                ),
+                "type": "P" if helper._is_private_channel(raw) else "O",
+            }
+            purpose = helper._get_channel_purpose(raw)
+            if purpose:
+                data["purpose"] = purpose
+            header = helper._get_channel_header(raw)
+            if header:
+                data["header"] = header
+            await w.line("channel", data)
+            self.regular_channels[int(e.id)] = name
+            self.channel_names[str(e.slack_id)] = name
+            for m in members:
+                self.members_by_user.setdefault(m, []).append(name)
+            self.stats["channels"] += 1
+
+    async def _write_users(self, w: _BulkWriter) -> None:
+        async for e in iter_entities_keyset(_exportable("user", None), self.page_size):
+            payload = UserExporter(e)._build_mm_payload()
+            username = payload["username"]
+            self.usernames[str(e.slack_id)] = username
+            data: Dict[str, Any] = {
+                "username": username,
+                "email": payload["email"],
+                "auth_service": payload["auth_service"],
+                "auth_data": payload["auth_data"],
+                "first_name": payload["first_name"],
+                "last_name": payload["last_name"],
+                "position": payload["position"],
+                "notify_props": payload["notify_props"],
+                "teams": [
+                    {
+                        "name": self.team,
+                        "roles": "team_user",
+                        "channels": [
+                            {"name": ch, "roles": "channel_user"}
+                            for ch in self.members_by_user.get(str(e.slack_id), [])
+                        ],
+                    }
+                ],
+            }
+            if payload.get("locale"):
+                data["locale"] = payload["locale"]
+            await w.line("user", data)
+            self.stats["users"] += 1
+        # Membership lists are only needed for user lines
+        self.members_by_user.clear()
+
+    async def _write_channel_posts(
+        self,
+        w: _BulkWriter,
+        channel_entity_id: int,
+        channel: Optional[str] = None,
+        direct_members: Optional[List[str]] = None,
+    ) -> None:
+        """Roots of one channel by keyset pages; replies, reactions and attachments
+        of each page are fetched with IN queries and nested into the root post.
+        """
+        roots_cond = _exportable("message", self.job_id) & ~relation_exists(
+            "thread_reply"
+        )
+        page: list[Entity] = []
+        async for e in iter_entities_keyset(
+            roots_cond, self.page_size, channel_id=channel_entity_id
+        ):
+            page.append(e)
+            if len(page) >= self.page_size:
+                await self._write_page(w, page, channel, direct_members)
+                page = []
+        if page:
+            await self._write_page(w, page, channel, direct_members)
+        page = []
+        async for e in iter_entities_keyset(
+            _orphan_replies(self.job_id), self.page_size, channel_id=channel_entity_id
+        ):
+            page.append(e)
+            if len(page) >= self.page_size:
+                await self._write_page(w, page, channel, direct_members, orphans=True)
+                page = []
+        if page:
+            await self._write_page(w, page, channel, direct_members, orphans=True)
+
+    async def _write_page(
+        self,
+        w: _BulkWriter,
+        roots: list[Entity],
+        channel: Optional[str],
+        direct_members: Optional[List[str]],
+        orphans: bool = False,
+    ) -> None:
+        root_ids = [int(r.id) for r in roots]
+        replies_by_root: Dict[int, list[Entity]] = {}
+        async with SessionLocal() as session:
+            rows = await session.execute(
+                select(EntityRelation.to_entity_id, Entity)
+                .join(Entity, Entity.id == EntityRelation.from_entity_id)
+                .where(
+                    (EntityRelation.relation_type == "thread_reply")
+                    & EntityRelation.to_entity_id.in_(root_ids)
+                    & _exportable("message", self.job_id)
+                )
+                .order_by(Entity.slack_id.asc(), Entity.id.asc())
+            )
+            for root_id, reply in rows.all():
+                replies_by_root.setdefault(int(root_id), []).append(reply)
+            msg_ids = root_ids + [
+                int(r.id) for lst in replies_by_root.values() for r in lst
+            ]
+            reactions = await self._children(session, msg_ids, "reacted_to")
+            attachments = await self._children(session, msg_ids, "attached_to")
+
+        # Mentioned ids missing from the name tables: one IN query per type
+        await prefetch_mention_names(
+            [m.raw_data for m in roots]
+            + [r.raw_data for lst in replies_by_root.values() for r in lst],
+            self.caches,
+        )
+        att_paths = await self._store_attachments(w, attachments)
+        for root in roots:
+            post = await self._build_post(root, reactions, attachments, att_paths)
+            if orphans and post is not None:
+                self.stats["replies_standalone"] += 1
+            replies = []
+            for reply in replies_by_root.get(int(root.id), []):
+                rp = await self._build_post(reply, reactions, attachments, att_paths)
+                if rp is not None:
+                    replies.append(rp)
+            if post is None:
+                # No root to nest under: keep the replies as top-level posts
+                for rp in replies:
+                    await self._write_post(w, rp, channel, direct_members)
+                self.stats["replies_standalone"] += len(replies)
+                continue
+            if replies:
+                post["replies"] = replies
+                self.stats["replies"] += len(replies)
+            await self._write_post(w, post, channel, direct_members)
+
+    async def _write_post(
+        self,
+        w: _BulkWriter,
+        post: dict,
+        channel: Optional[str],
+        direct_members: Optional[List[str]],
+    ) -> None:
+        if direct_members is not None:
+            post["channel_members"] = direct_members
+            await w.line("direct_post", post)
+        else:
+            post["team"] = self.team
+            post["channel"] = channel
+            await w.line("post", post)
+        self.stats["posts"] += 1
+
+    async def _children(
+        self, session, msg_ids: list[int], relation_type: str
+    ) -> Dict[int, list[Entity]]:
+        """Entities pointing at the given messages (reaction -> reacted_to, attachment -> attached_to)."""
+        out: Dict[int, list[Entity]] = {}
+        if not msg_ids:
+            return out
+        etype = "reaction" if relation_type == "reacted_to" else "attachment"
+        rows = await session.execute(
+            select(EntityRelation.to_entity_id, Entity)
+            .join(Entity, Entity.id == EntityRelation.from_entity_id)
+            .where(
+                (EntityRelation.relation_type == relation_type)
+                & EntityRelation.to_entity_id.in_(msg_ids)
+                & _exportable(etype, self.job_id)
+            )
+            .order_by(Entity.slack_id.asc(), Entity.id.asc())
+        )
+        for msg_id, ent in rows.all():
+            out.setdefault(int(msg_id), []).append(ent)
+        return out
+
+    async def _store_attachments(
+        self, w: _BulkWriter, attachments: Dict[int, list[Entity]]
+    ) -> Dict[int, str]:
+        """Put attachment files of a page into data/ (bounded concurrent downloads)."""
+        paths: Dict[int, str] = {}
+        if not self.include_files:
+            return paths
+        sem = asyncio.Semaphore(self.download_concurrency)
+
+        async def _one(att: Entity):
+            raw = att.raw_data or {}
+            filename = (
+                raw.get("name") or raw.get("title") or raw.get("filename") or "file.bin"
+            )
+            path = f"attachments/{att.slack_id}/{_RE_FILENAME.sub('_', str(filename))}"
+            async with sem:
+                content = None
+                b64 = raw.get("content_base64")
+                if b64:
+                    try:
+                        content = base64.b64decode(b64)
+                    except Exception:
+                        content = None
+                else:
+                    url = raw.get("url_private") or raw.get("url_private_download")
+                    token = os.environ.get("SLACK_BOT_TOKEN") or os.environ.get(
+                        "SLACK_TOKEN"
+                    )
+                    headers = {"Authorization": f"Bearer {token}"} if token else {}
+                    if url:
+                        content = await self._download(url, headers)
+                if content is None:
+                    self.stats["attachments_failed"] += 1
+                    return
+                await w.add_file(path, content)
+                paths[int(att.id)] = path
+                self.stats["attachments"] += 1
+
+        await asyncio.gather(*(_one(a) for lst in attachments.values() for a in lst))
+        return paths
+
+    async def _download(self, url: str, headers: Optional[dict] = None):
+        try:
+            resp = await self._mixin.download_file(url, headers=headers)
+            if resp.status_code == 200:
+                return resp.content
+            backend_logger.warning(f"Bulk export: {url} -> HTTP {resp.status_code}")
+        except Exception as e:  # noqa: BLE001
+            backend_logger.warning(f"Bulk export: не удалось скачать {url}: {e}")
+        return None
+
+    async def _build_post(
+        self,
+        msg: Entity,
+        reactions: Dict[int, list[Entity]],
+        attachments: Dict[int, list[Entity]],
+        att_paths: Dict[int, str],
+    ) -> Optional[dict]:
+        raw = msg.raw_data or {}
+        slack_uid = raw.get("user") or raw.get("bot_id")
+        username = self.usernames.get(str(slack_uid)) if slack_uid else None
+        username = username or self.fallback_username
+        if not username:
+            self.stats["skipped_no_user"] += 1
+            return None
+        renderer = MessageExporter(msg, caches=self.caches)
+        text, props = await renderer._render(raw)
+        create_at = renderer._parse_ts_ms(raw.get("ts")) or renderer._parse_ts_ms(
+            str(msg.slack_id)
+        )
+        files = [
+            {"path": att_paths[int(a.id)]}
+            for a in attachments.get(int(msg.id), [])
+            if int(a.id) in att_paths
+        ]
+        if not (text and text.strip()):
+            text = " " if files else "-"
+        post: Dict[str, Any] = {
+            "user": username,
+            "message": text,
+            "create_at": create_at or 0,
+        }
+        if props:
+            post["props"] = props
+        if files:
+            post["attachments"] = files
+        post_reactions = []
+        for r in reactions.get(int(msg.id), []):
+            rr = self._build_reaction(r, create_at or 0)
+            if rr is not None:
+                post_reactions.append(rr)
+        if post_reactions:
+            post["reactions"] = post_reactions
+            self.stats["reactions"] += len(post_reactions)
+        return post
+
+    def _build_reaction(self, r: Entity, post_create_at: int) -> Optional[dict]:
+        raw = r.raw_data or {}
+        username = self.usernames.get(str(raw.get("user") or ""))
+        name = (raw.get("name") or raw.get("emoji") or "").strip()
+        if not username or not name:
+            return None
+        if name in self.custom_emoji:
+            if name not in self.written_emoji:
+                # Not in the archive (include_files=False or download failed)
+                self.stats["reactions_missing_emoji"] += 1
+                return None
+            emoji_name = transliterate_cyrillic(name)
+        else:
+            # Last candidate is the classic alias (+1/-1) known to MM; others have one
+            emoji_name = self._reaction_helper._emoji_candidates(name)[-1]
+        create_at = self._reaction_helper._parse_ts_ms(raw.get("ts")) or post_create_at
+        return {"user": username, "emoji_name": emoji_name, "create_at": create_at}
+
+
+def default_bulk_path(job_id: Optional[int] = None) -> str:
+    out_dir = os.getenv("BULK_EXPORT_DIR") or os.path.join(
+        tempfile.gettempdir(), "mm-bulk"
+    )
+    os.makedirs(out_dir, exist_ok=True)
+    suffix = f"job{job_id}" if job_id is not None else "all"
+    return os.path.join(out_dir, f"mm-bulk-{suffix}-{int(time.time())}.zip")
+
+
+async def build_bulk_import(
+    out_path: Optional[str] = None,
+    job_id: Optional[int] = None,
+    include_files: bool = True,
+) -> dict:
+    """Write a Mattermost bulk import archive for all data (or one job's messages)."""
+    path = out_path or default_bulk_path(job_id)
+    return await BulkImportBuilder(
+        path, job_id=job_id, include_files=include_files
+    ).build()
@@ -3,6 +3,7 @@ import json
 from app.logging_config import backend_logger
 from .base_exporter import ExporterBase, LoggingMixin
 from .mm_api_mixin import MMApiMixin
+from .id_map import lookup_mm_ids
 
 
 class ChannelExporter(ExporterBase, LoggingMixin, MMApiMixin):
@@ -278,26 +279,15 @@ class ChannelExporter(ExporterBase, LoggingMixin, MMApiMixin):
             await self.set_status("failed", error=str(e))
 
     async def _resolve_mm_user_ids(self, slack_user_ids):
-        """Получить Mattermost ID для списка Slack user ids из таблицы Entity."""
-        from app.models.base import SessionLocal
-        from sqlalchemy import select
-        from app.models.entity import Entity
-
+        """Получить Mattermost ID для списка Slack user ids (одним запросом через id_map)."""
+        resolved = await lookup_mm_ids("user", slack_user_ids)
         mm_ids = []
-        async with SessionLocal() as session:
-            for sid in slack_user_ids:
-                q = await session.execute(
-                    select(Entity).where(
-                        (Entity.entity_type == "user") & (Entity.slack_id == sid)
-                    )
-                )
-                ent = q.scalar_one_or_none()
-                if ent is not None:
-                    mm_id = getattr(ent, "mattermost_id", None)
-                    if mm_id:
-                        mm_ids.append(mm_id)
-                else:
-                    backend_logger.warn(f"MM user id not found for Slack user {sid}")
+        for sid in slack_user_ids:
+            mm_id = resolved.get(str(sid))
+            if mm_id:
+                mm_ids.append(mm_id)
+            else:
+                backend_logger.warn(f"MM user id not found for Slack user {sid}")
         return mm_ids
 
     async def _get_mm_team_id(self):
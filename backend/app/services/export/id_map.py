@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import os
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.models.base import SessionLocal
+from app.models.id_map import IdMap
+from app.utils.filters import JOB_SCOPED_TYPES
+
+CacheKey = Tuple[str, int, str]
+
+
+def job_key(entity_type: str, job_id) -> int:
+    """id_map.job_id value for an entity: 0 for global types and rows without job."""
+    if entity_type in JOB_SCOPED_TYPES and job_id is not None:
+        return int(job_id)
+    return 0
+
+
+class IdMapCache:
+    """In-process read-through LRU over id_map. Only positive hits are cached:
+    a missing id may appear later in the same export run.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = max(0, int(maxsize))
+        self._data: "OrderedDict[CacheKey, str]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: CacheKey) -> Optional[str]:
+        val = self._data.get(key)
+        if val is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return val
+
+    def put(self, key: CacheKey, mm_id: str) -> None:
+        if self.maxsize <= 0 or not mm_id:
+            return
+        self._data[key] = mm_id
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+id_map_cache = IdMapCache(int(os.getenv("ID_MAP_CACHE_SIZE", "200000")))
+
+
+def remember_mm_id(entity_type: str, slack_id, mm_id, job_id=None) -> None:
+    if slack_id is None or not mm_id:
+        return
+    id_map_cache.put((entity_type, job_key(entity_type, job_id), str(slack_id)), mm_id)
+
+
+async def record_mm_id(session, entity_type: str, slack_id, mm_id, job_id=None):
+    """Upsert an id_map row within the caller's session/transaction (commit is up to the caller)."""
+    stmt = pg_insert(IdMap).values(
+        entity_type=entity_type,
+        job_id=job_key(entity_type, job_id),
+        slack_id=str(slack_id),
+        mm_id=mm_id,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[IdMap.entity_type, IdMap.job_id, IdMap.slack_id],
+        set_={"mm_id": stmt.excluded.mm_id},
+    )
+    await session.execute(stmt)
+
+
+async def lookup_mm_id(entity_type: str, slack_id, job_id=None) -> Optional[str]:
+    """Resolve a single Slack id to its Mattermost id (None if not exported yet)."""
+    if not slack_id:
+        return None
+    jk = job_key(entity_type, job_id)
+    key = (entity_type, jk, str(slack_id))
+    cached = id_map_cache.get(key)
+    if cached is not None:
+        return cached
+    async with SessionLocal() as session:
+        q = await session.execute(
+            select(IdMap.mm_id).where(
+                (IdMap.entity_type == entity_type)
+                & (IdMap.job_id == jk)
+                & (IdMap.slack_id == str(slack_id))
+            )
+        )
+        mm_id = q.scalar_one_or_none()
+    if mm_id:
+        id_map_cache.put(key, mm_id)
+    return mm_id or None
+
+
+async def lookup_mm_ids(
+    entity_type: str, slack_ids: Iterable, job_id=None
+) -> Dict[str, str]:
+    """Resolve many Slack ids at once: LRU first, then one IN query for the rest."""
+    jk = job_key(entity_type, job_id)
+    out: Dict[str, str] = {}
+    missing: list[str] = []
+    for sid in dict.fromkeys(str(s) for s in slack_ids if s):
+        cached = id_map_cache.get((entity_type, jk, sid))
+        if cached is not None:
+            out[sid] = cached
+        else:
+            missing.append(sid)
+    if missing:
+        async with SessionLocal() as session:
+            q = await session.execute(
+                select(IdMap.slack_id, IdMap.mm_id).where(
+                    (IdMap.entity_type == entity_type)
+                    & (IdMap.job_id == jk)
+                    & (IdMap.slack_id.in_(missing))
+                )
+            )
+            for sid, mm_id in q.all():
+                if mm_id:
+                    out[sid] = mm_id
+                    id_map_cache.put((entity_type, jk, sid), mm_id)
+    return out
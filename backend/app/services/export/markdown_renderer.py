@@ -0,0 +1,486 @@
+"""Slack → Mattermost Markdown renderer.
+
+Pure, synchronous functions: all names are taken from a pre-resolved `NameTable`
+(ids missing from it are rendered as @U…/~C…), so rendering never touches the DB
+or the event loop. Patterns are compiled once; Slack text markup is converted in
+a single tokenizing pass. For well-formed Slack markup (the cases recorded in
+tests/unit/data/markdown_golden.json: mentions, links, subteams, rich text,
+blocks and attachments) the output matches the former async renderer in
+MessageExporter; malformed or nested `<…|…>` tokens may render differently.
+"""
+
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+import os
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Iterable, Mapping, Optional, Tuple
+
+from app.logging_config import backend_logger
+
+# One alternation per Slack markup token; the first matching branch wins
+_TEXT_TOKEN = re.compile(
+    r"<!(?P<special>here|channel|everyone)>"
+    r"|<!subteam\^[A-Z0-9]+\|(?P<handle>@[^>]+)>"
+    r"|<(?P<lurl>(?:https?|mailto):[^>|]+)\|(?P<label>[^>]+)>"
+    r"|<(?P<url>(?:https?|mailto):[^>]+)>"
+    r"|<@(?P<uid>[A-Z0-9]+)(?:\|[^>]+)?>"
+    r"|<#(?P<cid>[A-Z0-9]+)(?:\|[^>]+)?>"
+)
+_SPECIALS = {"here": "@here", "channel": "@channel", "everyone": "@all"}
+_USER_TOKEN = re.compile(r"<@([A-Z0-9]+)(?:\|[^>]+)?>")
+_CHANNEL_TOKEN = re.compile(r"<#([A-Z0-9]+)(?:\|[^>]+)?>")
+_SUBTEAM_TOKEN = re.compile(r"<!subteam\^([A-Z0-9]+)\|(@[^>]+)>")
+# Stricter handle charset used for post props (kept as in the original exporter)
+_SUBTEAM_PROPS_TOKEN = re.compile(r"<!subteam\^([A-Z0-9]+)\|(@[\w.-]+)>")
+_SUBTEAM_ID = re.compile(r"@S[0-9A-Z]+")
+_HANDLE_MENTION = re.compile(r"(^|\s)@([\w.-]{2,})\b")
+
+
+@dataclass(frozen=True)
+class NameTable:
+    """Slack id → display name. Users: Slack username; channels: channel name."""
+
+    users: Mapping[str, str] = field(default_factory=dict)
+    channels: Mapping[str, str] = field(default_factory=dict)
+
+    @cached_property
+    def version(self) -> str:
+        """Content hash: render cache entries are only valid for the same names."""
+        h = hashlib.blake2b(digest_size=8)
+        for prefix, table in ((b"u", self.users), (b"c", self.channels)):
+            for k in sorted(table):
+                h.update(prefix + k.encode() + b"\0" + str(table[k]).encode() + b"\0")
+        return h.hexdigest()
+
+
+EMPTY_NAMES = NameTable()
+
+
+def slack_text_to_markdown(txt: Optional[str], names: NameTable = EMPTY_NAMES) -> str:
+    """Convert Slack mrkdwn tokens (<!here>, <!subteam^…>, <url|label>, <@U>, <#C>)."""
+    if not txt:
+        return ""
+    if "<" not in txt:
+        return txt
+    users, channels = names.users, names.channels
+
+    def repl(m: re.Match) -> str:
+        kind = m.lastgroup
+        if kind == "special":
+            return _SPECIALS[m.group("special")]
+        if kind == "handle":
+            return m.group("handle")
+        if kind == "label":
+            return f"[{m.group('label')}]({m.group('lurl')})"
+        if kind == "url":
+            return m.group("url")
+        if kind == "uid":
+            uid = m.group("uid")
+            return f"@{users.get(uid) or uid}"
+        cid = m.group("cid")
+        return f"~{channels.get(cid) or cid}"
+
+    return _TEXT_TOKEN.sub(repl, txt)
+
+
+class _BlockRenderer:
+    """Renders Block Kit / rich_text for one message (usergroup handles come from its text)."""
+
+    __slots__ = ("users", "channels", "names", "usergroups")
+
+    def __init__(self, names: NameTable, usergroups: Mapping[str, str]):
+        self.names = names
+        self.users = names.users
+        self.channels = names.channels
+        self.usergroups = usergroups
+
+    def blocks(self, blocks: list) -> str:
+        lines: list[str] = []
+        for b in blocks:
+            btype = b.get("type")
+            if btype == "rich_text":
+                for el in b.get("elements", []) or []:
+                    s = self.element(el)
+                    if s:
+                        lines.append(s)
+            elif btype == "section":
+                # section.text {type: mrkdwn|plain_text, text: ...} OR fields
+                txt_obj = b.get("text")
+                if isinstance(txt_obj, dict):
+                    lines.append(self._text_obj(txt_obj))
+                else:
+                    for f in b.get("fields") or []:
+                        if isinstance(f, dict):
+                            lines.append(self._text_obj(f))
+            elif btype == "header":
+                txt_obj = b.get("text")
+                txt = txt_obj.get("text", "") if isinstance(txt_obj, dict) else ""
+                if txt:
+                    lines.append(f"# {txt}")
+            elif btype == "divider":
+                lines.append("---")
+            elif btype == "context":
+                items = []
+                for el in b.get("elements", []) or []:
+                    if el.get("type") in ("plain_text", "mrkdwn"):
+                        items.append(self._text_obj(el))
+                    else:
+                        s = self.element(el)
+                        if s:
+                            items.append(s)
+                if items:
+                    lines.append(" ".join([i for i in items if i]))
+            elif btype == "image":
+                url = b.get("image_url") or ""
+                alt = b.get("alt_text") or ""
+                if url:
+                    lines.append(f"![{alt}]({url})" if alt else url)
+        return "\n".join(lines)
+
+    def _text_obj(self, obj: dict) -> str:
+        text = obj.get("text", "")
+        if obj.get("type") == "mrkdwn":
+            return slack_text_to_markdown(text, self.names)
+        return text
+
+    def _children(self, elements) -> str:
+        parts: list[str] = []
+        for e in elements or []:
+            s = self.element(e)
+            if s:
+                parts.append(s)
+        return "".join(parts)
+
+    def element(self, el: dict) -> str:
+        t = el.get("type")
+        if t == "text":
+            text = el.get("text", "")
+            style = el.get("style") or {}
+            if style.get("code"):
+                return f"`{text}`"
+            if style.get("bold"):
+                text = f"**{text}**"
+            if style.get("italic"):
+                text = f"_{text}_"
+            if style.get("strike"):
+                text = f"~~{text}~~"
+            return text
+        if t == "rich_text_section":
+            return self._children(el.get("elements", []))
+        if t == "user":
+            uid = el.get("user_id")
+            if not uid:
+                return ""
+            return f"@{self.users.get(uid) or uid}"
+        if t == "channel":
+            cid = el.get("channel_id")
+            if not cid:
+                return ""
+            return f"~{self.channels.get(cid) or cid}"
+        if t == "emoji":
+            name = el.get("name") or ""
+            return f":{name}:" if name else ""
+        if t == "link":
+            url = el.get("url", "")
+            text = el.get("text") or url
+            return f"[{text}]({url})" if url else text
+        if t == "rich_text_list":
+            bullet = "- " if (el.get("style") or "bullet") == "bullet" else "1. "
+            out: list[str] = []
+            for item in el.get("elements", []) or []:
+                text = self.element(item)
+                if text:
+                    for line in text.splitlines() or [text]:
+                        out.append(f"{bullet}{line}")
+            return "\n".join(out)
+        if t == "rich_text_quote":
+            content = self._children(el.get("elements", []))
+            return "\n".join([f"> {ln}" for ln in content.splitlines()])
+        if t == "rich_text_preformatted":
+            return f"```\n{self._children(el.get('elements', []))}\n```"
+        if t == "rich_text_line_break":
+            return "\n"
+        if t == "usergroup":
+            gid = el.get("usergroup_id")
+            if not gid:
+                return ""
+            return self.usergroups.get(gid) or f"@{gid}"
+        if t == "date":
+            # Example: {type:'date', timestamp: 1234567890, format:'date_short'}
+            ts = el.get("timestamp")
+            return f"{ts}" if ts else ""
+        # Fallback: try nested elements
+        return self._children(el.get("elements", []))
+
+
+def _subteam_pairs(text: str) -> list[tuple[str, str]]:
+    return [(m.group(1), m.group(2)) for m in _SUBTEAM_TOKEN.finditer(text or "")]
+
+
+def usergroup_handles(raw: dict) -> dict[str, str]:
+    """Subteam id → @handle from <!subteam^S…|@handle> tokens (first occurrence wins)."""
+    out: dict[str, str] = {}
+    for sid, handle in _subteam_pairs(raw.get("text") or ""):
+        if handle:
+            out.setdefault(sid, handle)
+    return out
+
+
+def blocks_to_markdown(
+    blocks: list, names: NameTable = EMPTY_NAMES, raw: Optional[dict] = None
+) -> str:
+    return _BlockRenderer(names, usergroup_handles(raw or {})).blocks(blocks)
+
+
+def rich_element_to_md(
+    el: dict, names: NameTable = EMPTY_NAMES, raw: Optional[dict] = None
+) -> str:
+    return _BlockRenderer(names, usergroup_handles(raw or {})).element(el)
+
+
+def attachments_to_markdown(attachments: list, names: NameTable = EMPTY_NAMES) -> str:
+    """Classic attachments (e.g. Alertmanager): pretext, title link, text, actions."""
+    parts: list[str] = []
+    for a in attachments:
+        lines: list[str] = []
+        pretext = a.get("pretext")
+        if pretext:
+            lines.append(slack_text_to_markdown(pretext, names))
+        title = a.get("title")
+        if title:
+            title_link = a.get("title_link")
+            lines.append(f"[{title}]({title_link})" if title_link else f"**{title}**")
+        text = a.get("text")
+        if text:
+            lines.append(slack_text_to_markdown(text, names))
+        # Actions rendered as inline links
+        action_links: list[str] = []
+        for act in a.get("actions") or []:
+            t = act.get("text") or ""
+            url = act.get("url") or ""
+            if t and url:
+                action_links.append(f"[{t}]({url})")
+            elif t:
+                action_links.append(t)
+        if action_links:
+            lines.append(" ".join(action_links))
+        if not lines:
+            fallback = a.get("fallback")
+            if fallback:
+                lines.append(slack_text_to_markdown(fallback, names))
+        if lines:
+            parts.append("\n".join(lines))
+    return "\n\n---\n\n".join(parts)
+
+
+def build_message_text(raw: dict, names: NameTable = EMPTY_NAMES) -> str:
+    """Slack message → Markdown: rich blocks first, then classic attachments,
+    otherwise the plain text markup.
+    """
+    blocks = raw.get("blocks") or []
+    if isinstance(blocks, list) and blocks:
+        try:
+            md = blocks_to_markdown(blocks, names, raw)
+            if md and md.strip():
+                return md
+            # If rich conversion produced nothing, fall back to plain text
+            backend_logger.debug(
+                "Rich blocks produced empty text, falling back to raw text conversion"
+            )
+        except Exception as e:  # noqa: BLE001
+            backend_logger.debug(
+                f"Rich blocks conversion failed, fallback to text: {e}"
+            )
+    atts = raw.get("attachments") or []
+    if isinstance(atts, list) and atts:
+        try:
+            md = attachments_to_markdown(atts, names)
+            if md and md.strip():
+                return md
+        except Exception as e:  # noqa: BLE001
+            backend_logger.debug(
+                f"Attachments conversion failed, fallback to text: {e}"
+            )
+    return slack_text_to_markdown(raw.get("text") or "", names)
+
+
+def rewrite_subteam_ids(raw: dict, text: str) -> str:
+    """Replace leftover @S… subteam ids with @handle from the original tokens."""
+    if not text or "@S" not in text:
+        return text
+    id_to_handle = dict(_subteam_pairs(raw.get("text") or ""))
+    if not id_to_handle:
+        return text
+    return _SUBTEAM_ID.sub(lambda m: id_to_handle.get(m.group(0)[1:], m.group(0)), text)
+
+
+def render_message(raw: dict, names: NameTable = EMPTY_NAMES) -> str:
+    """Final post text: Markdown with subteam ids rewritten to handles."""
+    return rewrite_subteam_ids(raw, build_message_text(raw, names))
+
+
+def build_post_props(raw: dict, rendered_text: str) -> dict:
+    """Post props for subteam-aware plugins:
+    props["subteams"] — [{id, handle?}] from <!subteam^…> tokens and rich usergroup elements,
+    props["mentions_subteams"] — @handles present in the rendered text.
+    """
+    props: dict = {}
+    try:
+        subteams: list[dict] = []
+        seen_ids: set[str] = set()
+        for m in _SUBTEAM_PROPS_TOKEN.finditer(raw.get("text") or ""):
+            sid, handle = m.group(1), m.group(2)
+            if sid not in seen_ids:
+                subteams.append({"id": sid, "handle": handle})
+                seen_ids.add(sid)
+        for b in raw.get("blocks") or []:
+            if b.get("type") == "rich_text":
+                for el in b.get("elements", []) or []:
+                    for e in el.get("elements", []) or []:
+                        if isinstance(e, dict) and e.get("type") == "usergroup":
+                            sid = e.get("usergroup_id")
+                            if sid and sid not in seen_ids:
+                                subteams.append({"id": sid})
+                                seen_ids.add(sid)
+        if subteams:
+            props["subteams"] = subteams
+        # Distinct (prefix, handle) pairs in order of appearance
+        pairs = dict.fromkeys(_HANDLE_MENTION.findall(rendered_text))
+        if pairs:
+            props["mentions_subteams"] = [handle for _, handle in pairs]
+    except Exception:  # noqa: BLE001
+        return props
+    return props
+
+
+def collect_mentions(raw: dict) -> tuple[set[str], set[str]]:
+    """User and channel ids referenced by a message (text, blocks, attachments)."""
+    users: set[str] = set()
+    channels: set[str] = set()
+
+    def scan_text(txt) -> None:
+        if isinstance(txt, str) and "<" in txt:
+            users.update(_USER_TOKEN.findall(txt))
+            channels.update(_CHANNEL_TOKEN.findall(txt))
+
+    def scan_elements(elements: Iterable) -> None:
+        for el in elements or []:
+            if not isinstance(el, dict):
+                continue
+            t = el.get("type")
+            if t == "user" and el.get("user_id"):
+                users.add(el["user_id"])
+            elif t == "channel" and el.get("channel_id"):
+                channels.add(el["channel_id"])
+            elif t == "mrkdwn":
+                scan_text(el.get("text"))
+            scan_elements(el.get("elements"))
+
+    scan_text(raw.get("text"))
+    blocks = raw.get("blocks")
+    if isinstance(blocks, list):
+        for b in blocks:
+            if not isinstance(b, dict):
+                continue
+            scan_elements(b.get("elements"))
+            txt_obj = b.get("text")
+            if isinstance(txt_obj, dict) and txt_obj.get("type") == "mrkdwn":
+                scan_text(txt_obj.get("text"))
+            for f in b.get("fields") or []:
+                if isinstance(f, dict) and f.get("type") == "mrkdwn":
+                    scan_text(f.get("text"))
+    atts = raw.get("attachments")
+    if isinstance(atts, list):
+        for a in atts:
+            if isinstance(a, dict):
+                for key in ("pretext", "text", "fallback"):
+                    scan_text(a.get(key))
+    return users, channels
+
+
+Rendered = Tuple[str, dict]
+
+
+class RenderCache:
+    """LRU of rendered (text, props) keyed by a hash of the message parts that
+    affect rendering (text, blocks, attachments) and the name-table version.
+    Bots and alerts repeat identical payloads, which then render once.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = max(0, int(maxsize))
+        self._data: "OrderedDict[bytes, Rendered]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: bytes) -> Optional[Rendered]:
+        val = self._data.get(key)
+        if val is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return val
+
+    def put(self, key: bytes, value: Rendered) -> None:
+        if self.maxsize <= 0:
+            return
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+render_cache = RenderCache(int(os.getenv("RENDER_CACHE_SIZE", "10000")))
+
+
+def render_key(raw: dict, names: NameTable = EMPTY_NAMES) -> bytes:
+    # No sort_keys: payloads come from the same export JSON, so key order is
+    # stable, and a reordered payload merely misses the cache
+    parts = json.dumps(
+        [raw.get("text"), raw.get("blocks"), raw.get("attachments")],
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=str,
+    )
+    h = hashlib.blake2b(parts.encode("utf-8"), digest_size=16)
+    h.update(names.version.encode())
+    return h.digest()
+
+
+def render_cached(raw: dict, names: NameTable = EMPTY_NAMES) -> Rendered:
+    """render_message + build_post_props through the process-wide render cache."""
+    if render_cache.maxsize <= 0:
+        text = render_message(raw, names)
+        return text, build_post_props(raw, text)
+    key = render_key(raw, names)
+    hit = render_cache.get(key)
+    if hit is None:
+        text = render_message(raw, names)
+        hit = (text, build_post_props(raw, text))
+        render_cache.put(key, hit)
+    # Deep copy: props hold lists (subteams, mentions_subteams) callers may extend
+    return hit[0], copy.deepcopy(hit[1])
@@ -1,16 +1,18 @@
 from __future__ import annotations
 
 import math
-from typing import List, Optional, Dict, Any, TypedDict, Set, Tuple, cast
+from typing import List, Optional, Dict, Any, Iterable, TypedDict, Set, Tuple, cast
 import asyncio
 
 from .base_exporter import ExporterBase, LoggingMixin
 from .mm_api_mixin import MMApiMixin
 from app.logging_config import backend_logger
+from app.services.monitoring import tracing
 from app.models.base import SessionLocal
 from app.models.entity import Entity
 from sqlalchemy import select
-from app.utils.filters import job_scoped_condition
+from .id_map import lookup_mm_id
+from . import markdown_renderer
 
 
 class MessageCaches(TypedDict, total=False):
@@ -19,6 +21,59 @@ class MessageCaches(TypedDict, total=False):
     user_mm_id_by_slack_id: Dict[str, str]
     username_by_slack_id: Dict[str, str]
     membership_seen: Set[Tuple[str, str]]
+    prerendered: Dict[int, Tuple[str, dict]]
+    unknown_user_ids: Set[str]
+    unknown_channel_ids: Set[str]
+
+
+def _name_caches(caches: MessageCaches) -> Tuple[dict, dict, set, set]:
+    return (
+        caches.setdefault("username_by_slack_id", {}),
+        caches.setdefault("channel_name_by_slack_id", {}),
+        caches.setdefault("unknown_user_ids", set()),
+        caches.setdefault("unknown_channel_ids", set()),
+    )
+
+
+async def prefetch_mention_names(raws: Iterable[dict], caches: MessageCaches) -> None:
+    """Resolve every user/channel mentioned by a batch of messages up front:
+    one IN query per type for ids not cached yet. Ids with no entity (deleted
+    users, foreign channels) are remembered as unknown, so MessageExporter
+    never queries them one by one.
+    """
+    users, channels, no_user, no_channel = _name_caches(caches)
+    want_users: Set[str] = set()
+    want_channels: Set[str] = set()
+    for raw in raws:
+        u, c = markdown_renderer.collect_mentions(raw or {})
+        want_users |= u
+        want_channels |= c
+    want_users -= users.keys() | no_user
+    want_channels -= channels.keys() | no_channel
+    if not want_users and not want_channels:
+        return
+    async with SessionLocal() as session:
+        if want_users:
+            q = await session.execute(
+                select(Entity.slack_id, Entity.raw_data).where(
+                    (Entity.entity_type == "user") & (Entity.slack_id.in_(want_users))
+                )
+            )
+            for sid, raw in q.all():
+                users[sid] = (raw or {}).get("name") or sid
+        if want_channels:
+            q = await session.execute(
+                select(Entity.slack_id, Entity.raw_data).where(
+                    (Entity.entity_type == "channel")
+                    & (Entity.slack_id.in_(want_channels))
+                )
+            )
+            for sid, raw in q.all():
+                name = (raw or {}).get("name")
+                if name:
+                    channels[sid] = name
+    no_user |= want_users - users.keys()
+    no_channel |= want_channels - channels.keys()
 
 
 class MessageExporter(ExporterBase, LoggingMixin, MMApiMixin):
@@ -30,6 +85,8 @@ class MessageExporter(ExporterBase, LoggingMixin, MMApiMixin):
         #  - user_mm_id_by_slack_id: dict[str, str]
         #  - username_by_slack_id: dict[str, str]
         #  - membership_seen: set[tuple[str,str]] of (channel_id, user_id)
+        #  - prerendered: dict[int, (text, props)] by entity id (rendering stage output)
+        #  - unknown_user_ids / unknown_channel_ids: set[str] of ids with no entity (negative cache)
         self.caches: MessageCaches = caches or {}
 
     """
@@ -44,24 +101,34 @@ class MessageExporter(ExporterBase, LoggingMixin, MMApiMixin):
         self.log_export(f"Экспорт сообщения {self.entity.slack_id}")
 
         raw = self.entity.raw_data or {}
+        # Pre-rendered markdown for this message, if the rendering stage produced it
+        prerendered = None
+        pre_cache = self.caches.get("prerendered")
+        if isinstance(pre_cache, dict) and getattr(self.entity, "id", None) is not None:
+            prerendered = pre_cache.pop(int(self.entity.id), None)
 
         # Resolve required IDs
-        channel_id = await self._resolve_mm_channel_id_for_message()
+        with tracing.span("resolve_channel"):
+            channel_id = await self._resolve_mm_channel_id_for_message()
         if not channel_id:
             await self.set_status("failed", error="No target channel for message")
             return
 
-        user_id = await self._resolve_mm_user_id_for_message()
+        with tracing.span("resolve_user"):
+            user_id = await self._resolve_mm_user_id_for_message()
         if not user_id:
             await self.set_status("failed", error="No author (user_id) for message")
             return
 
-        file_ids = await self._collect_file_ids()
+        with tracing.span("collect_files"):
+            file_ids = await self._collect_file_ids()
 
-        # Build message text with rich-text conversion when possible
-        text = await self._build_message_text(raw)
-        # Replace any @Sxxxx subteam IDs with @handle using original Slack tokens
-        text = await self._rewrite_subteam_ids_to_handles(raw, text)
+        if prerendered is not None:
+            text, props = prerendered
+        else:
+            # Markdown (subteam ids rewritten to handles) and props, via the render cache
+            with tracing.span("render"):
+                text, props = await self._render(raw)
         if not (text and text.strip()):
             # If attachments exist, a single space is enough; otherwise put a hyphen to make it visible
             text = " " if file_ids else "-"
@@ -71,16 +138,19 @@ class MessageExporter(ExporterBase, LoggingMixin, MMApiMixin):
 
         # Root/thread
         # Try to resolve thread root; if not present, briefly wait and retry to avoid detached replies
-        root_id = await self._resolve_root_post_id()
+        with tracing.span("resolve_root"):
+            root_id = await self._resolve_root_post_id()
         if (self.entity.raw_data or {}).get("thread_ts") and not root_id:
-            for i in range(3):
-                await asyncio.sleep(0.3 * (i + 1))
-                root_id = await self._resolve_root_post_id()
-                if root_id:
-                    break
+            with tracing.span("wait_root"):
+                for i in range(3):
+                    await asyncio.sleep(0.3 * (i + 1))
+                    root_id = await self._resolve_root_post_id()
+                    if root_id:
+                        break
         if (self.entity.raw_data or {}).get("thread_ts") and not root_id:
             backend_logger.debug(
-                f"Message {self.entity.slack_id} is a reply but root post_id not found yet; posting as top-level for now"
+                "Message %s is a reply but root post_id not found yet; posting as top-level for now",
+                self.entity.slack_id,
             )
 
         # Best-effort: ensure author is a channel member to prevent CreatePost failure
@@ -92,16 +162,16 @@ class MessageExporter(ExporterBase, LoggingMixin, MMApiMixin):
             )
             key = (channel_id, user_id)
             if mset is None or key not in mset:
-                _ = await self.mm_api_post(
-                    "/plugins/mm-importer/api/v1/channel/members",
-                    {"channel_id": channel_id, "user_ids": [user_id]},
-                )
+                with tracing.span("membership"):
+                    _ = await self.mm_api_post(
+                        "/plugins/mm-importer/api/v1/channel/members",
+                        {"channel_id": channel_id, "user_ids": [user_id]},
+                    )
                 if mset is not None:
                     mset.add(key)
         except Exception as e:  # noqa: BLE001
-            backend_logger.debug(f"Ensure channel membership failed (non-fatal): {e}")
+            backend_logger.debug("Ensure channel membership failed (non-fatal): %s", e)
 
-        props = await self._build_post_props(raw, text)
         payload = {
             "user_id": user_id,
             "channel_id": channel_id,
@@ -116,7 +186,10 @@ class MessageExporter(ExporterBase, LoggingMixin, MMApiMixin):
             payload["props"] = props
 
         try:
-            resp = await self.mm_api_post("/plugins/mm-importer/api/v1/import", payload)
+            with tracing.span("plugin_import"):
+                resp = await self.mm_api_post(
+                    "/plugins/mm-importer/api/v1/import", payload
+                )
             if resp.status_code not in (200, 201):
                 try:
                     data = resp.json()
@@ -136,426 +209,83 @@ class MessageExporter(ExporterBase, LoggingMixin, MMApiMixin):
                 return
             self.entity.mattermost_id = post_id
             await self.set_status("success")
-            backend_logger.debug(f"Message exported, post_id={post_id}")
+            backend_logger.debug("Message exported, post_id=%s", post_id)
         except Exception as e:  # noqa: BLE001
             await self.set_status("failed", error=str(e))
 
-    async def _build_post_props(self, raw: dict, rendered_text: str) -> dict:
-        """Prepare post props for future subteam plugin and enterprise groups compatibility.
-        - Capture Slack subteam tokens in source (from blocks or text) and resolved mentions
-        - Provide a structured list under props["subteams"] with fields id, handle, name, members (optional)
-        - Also include props["mentions_subteams"]: list of @handles present in final text
-        """
-        props: dict = {}
-        try:
-            import re
-
-            subteams: list[dict] = []
-            seen_ids: set[str] = set()
-            seen_handles: set[str] = set()
-            # From raw text tokens like <!subteam^S123|@group>
-            txt = raw.get("text") or ""
-            for m in re.finditer(r"<!subteam\^([A-Z0-9]+)\|(@[\w.-]+)>", txt):
-                sid, handle = m.group(1), m.group(2)
-                if sid not in seen_ids:
-                    subteams.append({"id": sid, "handle": handle})
-                    seen_ids.add(sid)
-            # From rich blocks usergroup elements
-            for b in raw.get("blocks") or []:
-                if b.get("type") == "rich_text":
-                    for el in b.get("elements", []) or []:
-                        for e in el.get("elements", []) or []:
-                            if isinstance(e, dict) and e.get("type") == "usergroup":
-                                sid = e.get("usergroup_id")
-                                if sid and sid not in seen_ids:
-                                    subteams.append({"id": sid})
-                                    seen_ids.add(sid)
-            if subteams:
-                props["subteams"] = subteams
-            # Mentions of @handles in final text (could be enterprise groups or our plugin groups)
-            handles = set(re.findall(r"(^|\s)@([\w.-]{2,})\b", rendered_text))
-            # re.findall returns tuples (prefix, handle), take handle
-            mention_handles = [h[1] for h in handles]
-            if mention_handles:
-                props["mentions_subteams"] = mention_handles
-        except Exception as _:
-            return props
-        return props
-
-    async def _rewrite_subteam_ids_to_handles(self, raw: dict, text: str) -> str:
-        """If final text still contains @S… subteam ids, replace them with @handle
-        using mappings found in original raw text tokens.
-        """
-        try:
-            import re
-
-            orig = raw.get("text") or ""
-            id_to_handle: dict[str, str] = {}
-            for m in re.finditer(r"<!subteam\^([A-Z0-9]+)\|(@[^>]+)>", orig):
-                sid, handle = m.group(1), m.group(2)
-                if sid and handle:
-                    id_to_handle[sid] = handle
-            if not id_to_handle:
-                return text
-
-            def sub(m):
-                full = m.group(0)  # like @S02AMBN3W1K
-                sid = full[1:]
-                handle = id_to_handle.get(sid)
-                return handle if handle is not None else full
-
-            # Replace occurrences of @SXXXX with mapped @handle
-            return re.sub(r"@S[0-9A-Z]+", sub, text)
-        except Exception:  # noqa: BLE001
-            return text
-
-    async def _build_message_text(self, raw: dict) -> str:
-        """Convert Slack message (text or blocks) to Mattermost-friendly Markdown.
-        - Prefer rich "blocks" if present
-        - Then render classic Slack attachments (title/text/actions)
-        - Otherwise, convert Slack plain text markup (<@U>, <#C>, <url|label>) to Markdown
-        """
-        blocks = raw.get("blocks") or []
-        if isinstance(blocks, list) and blocks:
-            try:
-                md = await self._blocks_to_markdown(blocks)
-                if md and md.strip():
-                    return md
-                # If rich conversion produced nothing, fall back to plain text
-                backend_logger.debug(
-                    "Rich blocks produced empty text, falling back to raw text conversion"
-                )
-            except Exception as e:  # noqa: BLE001
-                backend_logger.debug(
-                    f"Rich blocks conversion failed, fallback to text: {e}"
-                )
-        # Classic attachments (e.g., Alertmanager)
-        atts = raw.get("attachments") or []
-        if isinstance(atts, list) and atts:
-            try:
-                md = await self._attachments_to_markdown(atts)
-                if md and md.strip():
-                    return md
-            except Exception as e:  # noqa: BLE001
-                backend_logger.debug(
-                    f"Attachments conversion failed, fallback to text: {e}"
-                )
-        # Fallback to text conversion
-        txt = raw.get("text") or ""
-        return await self._slack_text_to_markdown(txt)
-
-    async def _attachments_to_markdown(self, attachments: list) -> str:
-        parts: list[str] = []
-        for a in attachments:
-            lines: list[str] = []
-            pretext = a.get("pretext")
-            if pretext:
-                lines.append(await self._slack_text_to_markdown(pretext))
-            title = a.get("title")
-            title_link = a.get("title_link")
-            if title:
-                if title_link:
-                    lines.append(f"[{title}]({title_link})")
-                else:
-                    lines.append(f"**{title}**")
-            text = a.get("text")
-            if text:
-                lines.append(await self._slack_text_to_markdown(text))
-            # Actions rendered as inline links
-            actions = a.get("actions") or []
-            action_links: list[str] = []
-            for act in actions:
-                t = act.get("text") or ""
-                url = act.get("url") or ""
-                if t and url:
-                    action_links.append(f"[{t}]({url})")
-                elif t:
-                    action_links.append(t)
-            if action_links:
-                lines.append(" ".join(action_links))
-            # Fallback if still empty
-            if not lines:
-                fallback = a.get("fallback")
-                if fallback:
-                    lines.append(await self._slack_text_to_markdown(fallback))
-            if lines:
-                parts.append("\n".join(lines))
-        return "\n\n---\n\n".join(parts)
-
-    async def _slack_text_to_markdown(self, txt: str) -> str:
-        import re
-
-        if not txt:
-            return ""
-
-        # Special mentions
-        txt = re.sub(r"<!here>", "@here", txt)
-        txt = re.sub(r"<!channel>", "@channel", txt)
-        txt = re.sub(r"<!everyone>", "@all", txt)
-
-        # Slack subteam tokens: <!subteam^S123|@handle> -> @handle
-        def repl_subteam(m):
-            handle = m.group(2)  # includes leading @ from Slack token
-            return handle
-
-        txt = re.sub(r"<!subteam\^([A-Z0-9]+)\|(@[^>]+)>", repl_subteam, txt)
-
-        # Links with labels: <url|label>
-        def repl_link(m):
-            url = m.group(1)
-            label = m.group(2)
-            return f"[{label}]({url})"
-
-        txt = re.sub(r"<((?:https?|mailto):[^>|]+)\|([^>]+)>", repl_link, txt)
-
-        # Naked angled links: <url>
-        txt = re.sub(r"<((?:https?|mailto):[^>]+)>", r"\1", txt)
-
-        # User mentions: <@U12345|optional>
-        async def repl_user(match):
-            sid = match.group(1)
-            username = await self._resolve_username_by_slack_id(sid)
-            return f"@{username or sid}"
-
-        # Channel mentions: <#C12345|optional>
-        async def repl_channel(match):
-            cid = match.group(1)
-            ch_name = await self._resolve_channel_name_by_slack_id(cid)
-            return f"~{ch_name or cid}"
-
-        # Apply async replacements sequentially
-        # Users
-        for m in list(re.finditer(r"<@([A-Z0-9]+)(?:\|[^>]+)?>", txt)):
-            sid = m.group(1)
-            username = await self._resolve_username_by_slack_id(sid)
-            if username:
-                txt = txt.replace(m.group(0), f"@{username}")
-            else:
-                txt = txt.replace(m.group(0), f"@{sid}")
-
-        # Channels
-        for m in list(re.finditer(r"<#([A-Z0-9]+)(?:\|[^>]+)?>", txt)):
-            cid = m.group(1)
-            ch_name = await self._resolve_channel_name_by_slack_id(cid)
-            if ch_name:
-                txt = txt.replace(m.group(0), f"~{ch_name}")
-            else:
-                txt = txt.replace(m.group(0), f"~{cid}")
-
-        return txt
-
-    async def _blocks_to_markdown(self, blocks: list) -> str:
-        lines: list[str] = []
-        for b in blocks:
-            btype = b.get("type")
-            if btype == "rich_text":
-                for el in b.get("elements", []) or []:
-                    s = await self._rich_element_to_md(el)
-                    if s:
-                        lines.append(s)
-                continue
-
-            if btype == "section":
-                # section.text {type: mrkdwn|plain_text, text: ...} OR fields
-                txt_obj = b.get("text")
-                if isinstance(txt_obj, dict):
-                    ttype = txt_obj.get("type")
-                    ttext = txt_obj.get("text", "")
-                    if ttype == "mrkdwn":
-                        lines.append(await self._slack_text_to_markdown(ttext))
-                    else:
-                        lines.append(ttext)
-                else:
-                    # fields: array of text objects
-                    fields = b.get("fields") or []
-                    for f in fields:
-                        if isinstance(f, dict):
-                            ttype = f.get("type")
-                            ttext = f.get("text", "")
-                            if ttype == "mrkdwn":
-                                lines.append(await self._slack_text_to_markdown(ttext))
-                            else:
-                                lines.append(ttext)
-                continue
-
-            if btype == "header":
-                txt_obj = b.get("text")
-                txt = txt_obj.get("text", "") if isinstance(txt_obj, dict) else ""
-                if txt:
-                    lines.append(f"# {txt}")
-                continue
-
-            if btype == "divider":
-                lines.append("---")
-                continue
-
-            if btype == "context":
-                items = []
-                for el in b.get("elements", []) or []:
-                    if el.get("type") in ("plain_text", "mrkdwn"):
-                        t = el.get("text", "")
-                        if el.get("type") == "mrkdwn":
-                            t = await self._slack_text_to_markdown(t)
-                        items.append(t)
-                    else:
-                        # Try rich element conversion as fallback
-                        s = await self._rich_element_to_md(el)
-                        if s:
-                            items.append(s)
-                if items:
-                    lines.append(" ".join([i for i in items if i]))
-                continue
-
-            if btype == "image":
-                url = b.get("image_url") or ""
-                alt = b.get("alt_text") or ""
-                if url:
-                    lines.append(f"![{alt}]({url})" if alt else url)
-                continue
-        return "\n".join(lines)
-
-    async def _rich_element_to_md(self, el: dict) -> str:
-        t = el.get("type")
-        if t == "rich_text_section":
-            parts: list[str] = []
-            for e in el.get("elements", []) or []:
-                s = await self._rich_element_to_md(e)
-                if s:
-                    parts.append(s)
-            # Join with nothing to preserve inline formatting; ensure not empty
-            return "".join(parts) or ""
-        if t == "rich_text_list":
-            style = el.get("style") or "bullet"
-            bullet = "- " if style == "bullet" else "1. "
-            out: list[str] = []
-            for item in el.get("elements", []) or []:
-                text = await self._rich_element_to_md(item)
-                if text:
-                    for line in text.splitlines() or [text]:
-                        out.append(f"{bullet}{line}")
-            return "\n".join(out)
-        if t == "rich_text_quote":
-            content = await self._rich_element_to_md(
-                {"type": "rich_text_section", "elements": el.get("elements", []) or []}
-            )
-            return "\n".join([f"> {ln}" for ln in content.splitlines()])
-        if t == "rich_text_preformatted":
-            content = await self._rich_element_to_md(
-                {"type": "rich_text_section", "elements": el.get("elements", []) or []}
-            )
-            return f"```\n{content}\n```"
-        if t == "rich_text_line_break":
-            return "\n"
-        if t == "text":
-            text = el.get("text", "")
-            style = el.get("style") or {}
-            if style.get("code"):
-                return f"`{text}`"
-            if style.get("bold"):
-                text = f"**{text}**"
-            if style.get("italic"):
-                text = f"_{text}_"
-            if style.get("strike"):
-                text = f"~~{text}~~"
-            return text
-        if t == "emoji":
-            name = el.get("name") or ""
-            return f":{name}:" if name else ""
-        if t == "user":
-            uid = el.get("user_id")
-            uname = await self._resolve_username_by_slack_id(uid) if uid else None
-            return f"@{uname}" if uname else (f"@{uid}" if uid else "")
-        if t == "usergroup":
-            # Try to resolve @handle from original text tokens; fallback to @ID
-            gid = el.get("usergroup_id")
-            if gid:
-                handle = await self._resolve_usergroup_handle_by_id(gid)
-                if handle:
-                    return handle
-                return f"@{gid}"
-            return ""
-        if t == "channel":
-            cid = el.get("channel_id")
-            ch_name = await self._resolve_channel_name_by_slack_id(cid) if cid else None
-            return f"~{ch_name}" if ch_name else (f"~{cid}" if cid else "")
-        if t == "link":
-            url = el.get("url", "")
-            text = el.get("text") or url
-            return f"[{text}]({url})" if url else text
-        if t == "date":
-            # Example: {type:'date', timestamp: 1234567890, format:'date_short'}
-            ts = el.get("timestamp")
-            # leave as plain text; improving to format can be future work
-            return f"{ts}" if ts else ""
-        # Fallback: try nested elements
-        parts: list[str] = []
-        for e in el.get("elements", []) or []:
-            s = await self._rich_element_to_md(e)
-            if s:
-                parts.append(s)
-        return "".join(parts)
+    async def _render(self, raw: dict) -> Tuple[str, dict]:
+        """Final post text and props; identical payloads are served from render_cache."""
+        names = await self._resolve_names(raw)
+        return markdown_renderer.render_cached(raw, names)
+
+    async def _resolve_names(self, raw: dict) -> markdown_renderer.NameTable:
+        """Lookup table with every user/channel mentioned by the message (unknown ids omitted)."""
+        user_ids, channel_ids = markdown_renderer.collect_mentions(raw)
+        users: Dict[str, str] = {}
+        for uid in user_ids:
+            name = await self._resolve_username_by_slack_id(uid)
+            if name:
+                users[uid] = name
+        channels: Dict[str, str] = {}
+        for cid in channel_ids:
+            name = await self._resolve_channel_name_by_slack_id(cid)
+            if name:
+                channels[cid] = name
+        return markdown_renderer.NameTable(users=users, channels=channels)
 
     async def _resolve_username_by_slack_id(
         self, slack_uid: Optional[str]
     ) -> Optional[str]:
         if not slack_uid:
             return None
-        # Cache first
-        cache_usernames = self.caches.get("username_by_slack_id")
-        if isinstance(cache_usernames, dict):
-            d = cast(Dict[str, str], cache_usernames)
-            val = d.get(slack_uid)
-            if val:
-                return val
+        usernames, _, unknown, _ = _name_caches(self.caches)
+        if slack_uid in usernames:
+            return usernames[slack_uid]
+        if slack_uid in unknown:
+            return None
         async with SessionLocal() as session:
             q = await session.execute(
-                select(Entity).where(
+                select(Entity.raw_data).where(
                     (Entity.entity_type == "user") & (Entity.slack_id == slack_uid)
                 )
             )
-            ent = q.scalar_one_or_none()
-            if ent is None:
-                return None
-            # Prefer Mattermost username via API only if needed; use Slack name from raw_data as our UserExporter mirrors it
-            raw = ent.raw_data or {}
-            name = raw.get("name") or slack_uid
-            cache_usernames2 = self.caches.get("username_by_slack_id")
-            if isinstance(cache_usernames2, dict):
-                d2 = cast(Dict[str, str], cache_usernames2)
-                d2[slack_uid] = name
-            return name
+            row = q.first()
+        if row is None:
+            unknown.add(slack_uid)
+            return None
+        # Slack name from raw_data: UserExporter mirrors it as the Mattermost username
+        name = (row[0] or {}).get("name") or slack_uid
+        usernames[slack_uid] = name
+        return name
 
     async def _resolve_channel_name_by_slack_id(
         self, slack_cid: Optional[str]
     ) -> Optional[str]:
         if not slack_cid:
             return None
-        cache_ch_names = self.caches.get("channel_name_by_slack_id")
-        if isinstance(cache_ch_names, dict):
-            d = cast(Dict[str, str], cache_ch_names)
-            v = d.get(slack_cid)
-            if v:
-                return v
+        _, ch_names, _, unknown = _name_caches(self.caches)
+        if slack_cid in ch_names:
+            return ch_names[slack_cid]
+        if slack_cid in unknown:
+            return None
         async with SessionLocal() as session:
             q = await session.execute(
-                select(Entity).where(
+                select(Entity.raw_data).where(
                     (Entity.entity_type == "channel") & (Entity.slack_id == slack_cid)
                 )
             )
-            ent = q.scalar_one_or_none()
-            if ent is None:
-                return None
-            raw = ent.raw_data or {}
-            # Slack channel names are usually compatible with MM; plugin also normalized names
-            name = raw.get("name")
-            if name and isinstance(cache_ch_names, dict):
-                d2 = cast(Dict[str, str], cache_ch_names)
-                d2[slack_cid] = name
-            return name
+            row = q.first()
+        # Slack channel names are usually compatible with MM; plugin also normalized names
+        name = (row[0] or {}).get("name") if row is not None else None
+        if name:
+            ch_names[slack_cid] = name
+        else:
+            unknown.add(slack_cid)
+        return name
 
     async def _resolve_mm_channel_id_for_message(self) -> Optional[str]:
-        """Find the Mattermost channel id where this message belongs (posted_in),
-        fallback to raw_data.channel_id mapping.
+        """Find the Mattermost channel id where this message belongs:
+        id_map by raw_data.channel_id first, fallback to the posted_in relation.
         """
         # Cache by raw slack channel id if present
         raw = self.entity.raw_data or {}
@@ -567,50 +297,37 @@ class MessageExporter(ExporterBase, LoggingMixin, MMApiMixin):
             if mmid:
                 return mmid
 
+        if ch_slack_id:
+            mmid2 = await lookup_mm_id("channel", ch_slack_id)
+            if mmid2:
+                if isinstance(cache_ch_mm, dict):
+                    d3 = cast(Dict[str, str], cache_ch_mm)
+                    d3[ch_slack_id] = mmid2
+                return mmid2
+
+        # Fallback: relation posted_in (narrow select, no raw_data)
         async with SessionLocal() as session:
             from app.models.entity_relation import EntityRelation
 
-            # Preferred: relation posted_in
             q = await session.execute(
-                select(EntityRelation, Entity)
-                .join(Entity, Entity.id == EntityRelation.to_entity_id)
+                select(Entity.mattermost_id)
+                .join(EntityRelation, Entity.id == EntityRelation.to_entity_id)
                 .where(
                     (EntityRelation.from_entity_id == self.entity.id)
                     & (EntityRelation.relation_type == "posted_in")
                 )
+                .limit(1)
             )
-            row = q.first()
-            if row:
-                _, ch_entity = row
-                mmid = getattr(ch_entity, "mattermost_id", None)
-                if isinstance(mmid, str) and mmid:
-                    return mmid
-
-            # Fallback: raw_data.channel_id -> channel entity -> mattermost_id
-            # raw already defined above
-            if ch_slack_id:
-                q2 = await session.execute(
-                    select(Entity).where(
-                        (Entity.entity_type == "channel")
-                        & (Entity.slack_id == ch_slack_id)
-                    )
-                )
-                ch_entity2 = q2.scalar_one_or_none()
-                if ch_entity2:
-                    mmid2 = getattr(ch_entity2, "mattermost_id", None)
-                    if isinstance(mmid2, str) and mmid2:
-                        if isinstance(cache_ch_mm, dict):
-                            d3 = cast(Dict[str, str], cache_ch_mm)
-                            d3[ch_slack_id] = mmid2
-                        return mmid2
+            mmid = q.scalar_one_or_none()
+            if isinstance(mmid, str) and mmid:
+                return mmid
         return None
 
     async def _resolve_mm_user_id_for_message(self) -> Optional[str]:
         """Find the Mattermost user id of the message author.
-        Prefer relation posted_by -> user.mattermost_id, fallback to user lookup by slack_id,
+        Prefer id_map by raw user/bot_id, fallback to relation posted_by -> user.mattermost_id,
         and finally fallback to the current token's user (admin) via /users/me.
         """
-        # 1) Via posted_by relation
         # Cache by slack user id if available
         raw = self.entity.raw_data or {}
         slack_uid = raw.get("user") or raw.get("bot_id")
@@ -621,42 +338,31 @@ class MessageExporter(ExporterBase, LoggingMixin, MMApiMixin):
             if mmid_cached:
                 return mmid_cached
 
-        # 1) Via posted_by relation
+        # 1) Lookup by slack user id in id_map
+        if slack_uid:
+            mmid2 = await lookup_mm_id("user", slack_uid)
+            if mmid2:
+                if isinstance(cache_user_mm, dict):
+                    d2 = cast(Dict[str, str], cache_user_mm)
+                    d2[slack_uid] = mmid2
+                return mmid2
+
+        # 2) Via posted_by relation (narrow select, no raw_data)
         async with SessionLocal() as session:
             from app.models.entity_relation import EntityRelation
 
             q = await session.execute(
-                select(EntityRelation, Entity)
-                .join(Entity, Entity.id == EntityRelation.from_entity_id)
+                select(Entity.mattermost_id)
+                .join(EntityRelation, Entity.id == EntityRelation.from_entity_id)
                 .where(
                     (EntityRelation.to_entity_id == self.entity.id)
                     & (EntityRelation.relation_type == "posted_by")
                 )
+                .limit(1)
             )
-            row = q.first()
-            if row:
-                _, user_entity = row
-                mmid = getattr(user_entity, "mattermost_id", None)
-                if isinstance(mmid, str) and mmid:
-                    return mmid
-
-        # 2) Lookup by slack user id in raw_data
-        # raw/slack_uid already computed above
-        if slack_uid:
-            async with SessionLocal() as session:
-                q2 = await session.execute(
-                    select(Entity).where(
-                        (Entity.entity_type == "user") & (Entity.slack_id == slack_uid)
-                    )
-                )
-                user_entity = q2.scalar_one_or_none()
-                if user_entity:
-                    mmid2 = getattr(user_entity, "mattermost_id", None)
-                    if isinstance(mmid2, str) and mmid2:
-                        if isinstance(cache_user_mm, dict):
-                            d2 = cast(Dict[str, str], cache_user_mm)
-                            d2[slack_uid] = mmid2
-                        return mmid2
+            mmid = q.scalar_one_or_none()
+            if isinstance(mmid, str) and mmid:
+                return mmid
 
         # 3) Fallback: current token user (admin)
         try:
@@ -677,16 +383,14 @@ class MessageExporter(ExporterBase, LoggingMixin, MMApiMixin):
             from app.models.entity_relation import EntityRelation
 
             q = await session.execute(
-                select(EntityRelation, Entity)
-                .join(Entity, Entity.id == EntityRelation.from_entity_id)
+                select(Entity.mattermost_id)
+                .join(EntityRelation, Entity.id == EntityRelation.from_entity_id)
                 .where(
                     (EntityRelation.to_entity_id == self.entity.id)
                     & (EntityRelation.relation_type == "attached_to")
                 )
             )
-            rows = q.fetchall()
-            for _, att_entity in rows:
-                mmid = getattr(att_entity, "mattermost_id", None)
+            for (mmid,) in q.all():
                 if isinstance(mmid, str) and mmid:
                     file_ids.append(mmid)
         return file_ids
@@ -698,19 +402,10 @@ class MessageExporter(ExporterBase, LoggingMixin, MMApiMixin):
         if not thread_ts or thread_ts == ts:
             return None
 
-        # Find parent message entity by slack thread_ts
-        async with SessionLocal() as session:
-            cond = (Entity.entity_type == "message") & (Entity.slack_id == thread_ts)
-            cond = job_scoped_condition(
-                cond, "message", getattr(self.entity, "job_id", None)
-            )
-            q = await session.execute(select(Entity).where(cond))
-            parent = q.scalar_one_or_none()
-            if parent:
-                mmid = getattr(parent, "mattermost_id", None)
-                if isinstance(mmid, str) and mmid:
-                    return mmid
-        return None
+        # Parent post id by slack thread_ts within the same job
+        return await lookup_mm_id(
+            "message", thread_ts, getattr(self.entity, "job_id", None)
+        )
 
     def _parse_ts_ms(self, ts_str: Optional[str]) -> Optional[int]:
         if not ts_str:
@@ -722,24 +417,3 @@ class MessageExporter(ExporterBase, LoggingMixin, MMApiMixin):
             return ms
         except Exception:  # noqa: BLE001
             return None
-
-    async def _resolve_usergroup_handle_by_id(
-        self, gid: Optional[str]
-    ) -> Optional[str]:
-        """Best-effort: find @handle for a Slack subteam id by scanning original text tokens
-        like <!subteam^S123|@handle> in raw_data.text. This avoids needing Slack API usergroups.
-        """
-        if not gid:
-            return None
-        try:
-            import re
-
-            raw = self.entity.raw_data or {}
-            txt = raw.get("text") or ""
-            for m in re.finditer(r"<!subteam\^([A-Z0-9]+)\|(@[^>]+)>", txt):
-                sid, handle = m.group(1), m.group(2)
-                if sid == gid and handle:
-                    return handle
-        except Exception:  # noqa: BLE001
-            return None
-        return None
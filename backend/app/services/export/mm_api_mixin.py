@@ -1,7 +1,11 @@
 from __future__ import annotations
+import itertools
+import logging
 import os
+import time
 import httpx
 from app.logging_config import backend_logger
+from app.services.monitoring import metrics, tracing
 
 # Shared async clients with connection pooling
 _mm_client: httpx.AsyncClient | None = None
@@ -56,6 +60,46 @@ async def close_clients():
         _generic_client = None
 
 
+# Debug logs show only a sample of response bodies, truncated
+LOG_BODY_MAX = int(os.getenv("LOG_BODY_MAX", "200"))
+LOG_BODY_SAMPLE = max(1, int(os.getenv("LOG_BODY_SAMPLE", "100")))
+_body_seq = itertools.count()
+
+
+def _body_preview(resp, force: bool = False) -> str:
+    """Truncated response body for logs: always with `force` (errors), otherwise
+    for one response in LOG_BODY_SAMPLE."""
+    if not force and next(_body_seq) % LOG_BODY_SAMPLE:
+        return "(not sampled)"
+    body = resp.text
+    if len(body) > LOG_BODY_MAX:
+        return f"{body[:LOG_BODY_MAX]}… ({len(body)} chars)"
+    return body
+
+
+def _debug() -> bool:
+    return backend_logger.isEnabledFor(logging.DEBUG)
+
+
+async def _timed(method: str, path: str, send):
+    """Run the request and record its latency by endpoint and status in /metrics
+    (and as a span when traced)."""
+    t0 = time.perf_counter()
+    status = "error"
+    endpoint = metrics.endpoint_label(path)
+    with tracing.span(f"mm {method} {endpoint}") as sp:
+        try:
+            resp = await send()
+            status = str(resp.status_code)
+            return resp
+        finally:
+            metrics.mm_api_request_seconds.observe(
+                method, endpoint, status, value=time.perf_counter() - t0
+            )
+            if sp is not None:
+                sp.set("http.status_code", status)
+
+
 class MMApiMixin:
     def _redact_payload(self, payload):
         """Return a payload copy safe for logging: mask large/sensitive fields."""
@@ -74,26 +118,39 @@ class MMApiMixin:
 
     async def mm_api_get(self, path: str):
         client = _get_mm_client()
-        backend_logger.debug(f"MM API GET {client.base_url}{path}")
-        resp = await client.get(path)
-        backend_logger.debug(
-            f"MM API GET {client.base_url}{path} status={resp.status_code} resp={resp.text}"
-        )
+        backend_logger.debug("MM API GET %s%s", client.base_url, path)
+        resp = await _timed("GET", path, lambda: client.get(path))
+        if _debug():
+            backend_logger.debug(
+                "MM API GET %s%s status=%s resp=%s",
+                client.base_url,
+                path,
+                resp.status_code,
+                _body_preview(resp),
+            )
         return resp
 
     async def mm_api_post(self, path: str, payload: dict):
         client = _get_mm_client()
-        backend_logger.debug(
-            f"MM API POST {client.base_url}{path} payload={self._redact_payload(payload)}"
-        )
-        resp = await client.post(path, json=payload)
+        if _debug():
+            backend_logger.debug(
+                "MM API POST %s%s payload=%s",
+                client.base_url,
+                path,
+                self._redact_payload(payload),
+            )
+        resp = await _timed("POST", path, lambda: client.post(path, json=payload))
         if resp.status_code >= 400:
             backend_logger.error(
-                f"MM API POST {client.base_url}{path} status={resp.status_code} body={resp.text[:200]}"
+                "MM API POST %s%s status=%s body=%s",
+                client.base_url,
+                path,
+                resp.status_code,
+                _body_preview(resp, force=True),
             )
         else:
             backend_logger.debug(
-                f"MM API POST {client.base_url}{path} status={resp.status_code}"
+                "MM API POST %s%s status=%s", client.base_url, path, resp.status_code
             )
         return resp
 
@@ -115,40 +172,77 @@ class MMApiMixin:
         except Exception:
             safe_files = {k: "(unknown)" for k in (files or {}).keys()}
         backend_logger.debug(
-            f"MM API POST(files) {client.base_url}{path} fields={list((data_fields or {}).keys())} files={safe_files}"
+            "MM API POST(files) %s%s fields=%s files=%s",
+            client.base_url,
+            path,
+            list((data_fields or {}).keys()),
+            safe_files,
         )
-        resp = await client.post(
-            path, data=data_fields or {}, files=files or {}, timeout=None
+        resp = await _timed(
+            "POST",
+            path,
+            lambda: client.post(
+                path, data=data_fields or {}, files=files or {}, timeout=None
+            ),
         )
         if resp.status_code >= 400:
             backend_logger.error(
-                f"MM API POST(files) {client.base_url}{path} status={resp.status_code} body={resp.text[:200]}"
+                "MM API POST(files) %s%s status=%s body=%s",
+                client.base_url,
+                path,
+                resp.status_code,
+                _body_preview(resp, force=True),
             )
         else:
             backend_logger.debug(
-                f"MM API POST(files) {client.base_url}{path} status={resp.status_code}"
+                "MM API POST(files) %s%s status=%s",
+                client.base_url,
+                path,
+                resp.status_code,
             )
         return resp
 
     async def mm_api_post_multipart(self, path: str, data, headers: dict):
         client = _get_mm_client()
-        backend_logger.debug(f"MM API POST multipart {client.base_url}{path}")
+        backend_logger.debug("MM API POST multipart %s%s", client.base_url, path)
         if hasattr(data, "content_type") and hasattr(data, "to_string"):
             headers["Content-Type"] = data.content_type
-            resp = await client.post(
-                path, content=data.to_string(), headers=headers, timeout=10
+            body = data.to_string()
+            resp = await _timed(
+                "POST",
+                path,
+                lambda: client.post(path, content=body, headers=headers, timeout=10),
             )
         else:
-            resp = await client.post(path, data=data, headers=headers, timeout=10)
-        backend_logger.debug(
-            f"MM API POST multipart {client.base_url}{path} status={resp.status_code} resp={resp.text}"
-        )
+            resp = await _timed(
+                "POST",
+                path,
+                lambda: client.post(path, data=data, headers=headers, timeout=10),
+            )
+        if _debug():
+            backend_logger.debug(
+                "MM API POST multipart %s%s status=%s resp=%s",
+                client.base_url,
+                path,
+                resp.status_code,
+                _body_preview(resp),
+            )
         return resp
 
     async def download_file(self, url: str, headers: dict | None = None):
         """Скачать файл по URL. Опционально с заголовками (например, Slack Bearer Token)."""
-        backend_logger.debug(f"Downloading file from {url}")
+        backend_logger.debug("Downloading file from %s", url)
         client = _get_generic_client()
-        resp = await client.get(url, headers=headers or {}, timeout=30)
-        backend_logger.debug(f"Download {url} status={resp.status_code}")
+        t0 = time.perf_counter()
+        status = "error"
+        try:
+            with tracing.span("http download"):
+                resp = await client.get(url, headers=headers or {}, timeout=30)
+            status = str(resp.status_code)
+        finally:
+            metrics.slack_download_seconds.observe(
+                status, value=time.perf_counter() - t0
+            )
+        metrics.slack_download_bytes.inc(value=len(resp.content))
+        backend_logger.debug("Download %s status=%s", url, resp.status_code)
         return resp
@@ -1,8 +1,8 @@
 import asyncio
 import os
 import httpx
-from app.models.base import SessionLocal
-from sqlalchemy import select
+from app.models.base import ControlSessionLocal, SessionLocal
+from sqlalchemy import select, tuple_
 from app.models.import_job import ImportJob
 from app.models.job_status_enum import JobStatus
 from typing import cast
@@ -18,8 +18,18 @@ from app.models.status_enum import MappingStatus
 from app.services.entities.user import User
 from app.services.entities.custom_emoji import CustomEmoji
 from app.services.entities.attachment import Attachment
-from app.utils.time import parse_slack_ts
-from app.utils.filters import job_scoped_condition
+from app.utils.errors import error_signature
+from app.utils.filters import JOB_SCOPED_TYPES, job_scoped_condition
+from app.services.monitoring import metrics, tracing
+from app.services.stats import eta
+from app.services.monitoring.query_stats import (
+    add_entities,
+    job_stage,
+    note_queue_depth,
+)
+from app.services.backup.prerender import load_prerendered
+from .planner import hydrate, plan_messages
+from .queries import candidate_condition, relation_exists
 
 EXPORT_ORDER = [
     ("user", UserExporter),
@@ -62,60 +72,117 @@ async def get_mm_user_id():
         return None
 
 
-async def get_entities_to_export(entity_type: str, job_id=None):
-    async with SessionLocal() as session:
-        cond = (Entity.entity_type == entity_type) & (
-            Entity.status.in_(
-                [MappingStatus.pending, MappingStatus.skipped, MappingStatus.failed]
-            )
-        )
-        cond = job_scoped_condition(cond, entity_type, job_id)
-
-        query = await session.execute(select(Entity).where(cond))
-        entities = query.scalars().all()
-        if entity_type == "user":
-            return [User.from_entity(e) for e in entities]
-        elif entity_type == "custom_emoji":
-            return [CustomEmoji.from_entity(e) for e in entities]
-        elif entity_type == "attachment":
-            # For attachments we can use BaseMapping as-is (no special from_entity)
-            return entities
-        elif entity_type == "message":
-            # Sort messages so that roots go before replies, and by timestamp ascending
-            try:
-                from app.models.entity_relation import EntityRelation
-
-                ids = [e.id for e in entities]
-                reply_set = set()
-                if ids:
-                    rel_rows = await session.execute(
-                        select(EntityRelation.from_entity_id).where(
-                            (EntityRelation.relation_type == "thread_reply")
-                            & (EntityRelation.from_entity_id.in_(ids))
-                        )
-                    )
-                    reply_set = {row[0] for row in rel_rows.all()}
+def _export_page_size() -> int:
+    return max(1, int(os.getenv("EXPORT_PAGE_SIZE", "500")))
 
-                def ts_key(ent):
-                    return parse_slack_ts(ent.slack_id)
 
-                entities_sorted = sorted(
-                    entities,
-                    key=lambda ent: (0 if ent.id not in reply_set else 1, ts_key(ent)),
-                )
-                return entities_sorted
-            except Exception as e:
-                backend_logger.error(
-                    f"Не удалось отсортировать сообщения для тредов: {e}"
-                )
-                return entities
-        elif entity_type == "reaction":
-            # Ensure reactions are processed after their target messages; simple ts sort as tie-breaker
-            def ts_key(ent):
-                return parse_slack_ts(ent.slack_id)
+def _export_queue_maxsize(workers: int) -> int:
+    """Bound for the worker queue: the producer waits instead of buffering a whole type."""
+    return max(1, int(os.getenv("EXPORT_QUEUE_MAXSIZE", str(max(1, workers) * 4))))
 
-            return sorted(entities, key=ts_key)
-        return entities
+
+def _exporter_view(entity_type: str, entity: Entity):
+    """Entity row as its exporter expects it (not planner.hydrate, which loads rows)."""
+    if entity_type == "user":
+        return User.from_entity(entity)
+    if entity_type == "custom_emoji":
+        return CustomEmoji.from_entity(entity)
+    # attachment/message/reaction/channel: BaseMapping as-is
+    return entity
+
+
+async def iter_entities_keyset(cond, page_size: int, channel_id: int | None = None):
+    """Page through entities ordered by (slack_id, id) using keyset pagination.
+    Each page is read in its own short session, so no long transaction/cursor is
+    held while entities are exported; rows that change status between pages do
+    not shift the window (unlike OFFSET).
+    For messages Slack ts is the slack_id, so this order is chronological.
+    If channel_id is given, only messages posted_in that channel entity are returned.
+    """
+    last: tuple[str, int] | None = None
+    while True:
+        q = select(Entity)
+        if channel_id is not None:
+            from app.models.entity_relation import EntityRelation
+
+            q = q.join(
+                EntityRelation,
+                (EntityRelation.from_entity_id == Entity.id)
+                & (EntityRelation.relation_type == "posted_in"),
+            ).where(EntityRelation.to_entity_id == channel_id)
+        q = q.where(cond)
+        if last is not None:
+            q = q.where(tuple_(Entity.slack_id, Entity.id) > tuple_(*last))
+        q = q.order_by(Entity.slack_id.asc(), Entity.id.asc()).limit(page_size)
+        async with SessionLocal() as session:
+            rows = list((await session.execute(q)).scalars().all())
+        if not rows:
+            return
+        for e in rows:
+            yield e
+        if len(rows) < page_size:
+            return
+        last = (cast(str, rows[-1].slack_id), cast(int, rows[-1].id))
+
+
+async def iter_entities_to_export(
+    entity_type: str,
+    job_id=None,
+    page_size: int | None = None,
+    channel_id: int | None = None,
+    statuses=None,
+):
+    """Stream export candidates of a type page by page instead of loading them all.
+    Messages: thread roots first, then replies, each in ts order (as before).
+    Reactions and the rest: ts/slack_id order.
+    statuses overrides EXPORT_CANDIDATE_STATUSES (targeted re-runs take pending only).
+    """
+    page_size = page_size or _export_page_size()
+    cond = candidate_condition(entity_type, job_id, statuses)
+    if entity_type == "message":
+        is_reply = relation_exists("thread_reply")
+        parts = [cond & ~is_reply, cond & is_reply]
+    else:
+        parts = [cond]
+    for part in parts:
+        async for e in iter_entities_keyset(part, page_size, channel_id=channel_id):
+            yield _exporter_view(entity_type, e)
+
+
+async def _export_stream(
+    entity_type: str, exporter_cls, job_id, workers_for_type, mm_user_id, statuses=None
+):
+    """Feed streamed candidates into a bounded queue served by export workers.
+    Workers start before the first page is read, so export begins immediately and
+    at most EXPORT_QUEUE_MAXSIZE entities (plus one page) are held in memory.
+    """
+    queue: asyncio.Queue = asyncio.Queue(
+        maxsize=_export_queue_maxsize(workers_for_type)
+    )
+    backend_logger.debug(
+        f"[EXPORT] starting {workers_for_type} workers for {entity_type} (job_id={job_id})"
+    )
+    workers = [
+        asyncio.create_task(export_worker(queue, mm_user_id))
+        for _ in range(workers_for_type)
+    ]
+    metrics.export_queues[entity_type] = queue
+    metrics.export_workers.set(entity_type, value=workers_for_type)
+    try:
+        async for entity in iter_entities_to_export(
+            entity_type, job_id=job_id, statuses=statuses
+        ):
+            backend_logger.debug("[EXPORT] enqueue %s %s", entity_type, entity.slack_id)
+            add_entities()
+            await queue.put((entity, exporter_cls))
+            note_queue_depth(queue.qsize())
+        await queue.join()
+    finally:
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+        metrics.export_queues.pop(entity_type, None)
+        metrics.export_workers.set(entity_type, value=0)
 
 
 async def export_worker(queue, mm_user_id):
@@ -133,7 +200,12 @@ async def export_worker(queue, mm_user_id):
                 exporter = exporter_cls(entity, mm_user_id=mm_user_id)
             else:
                 exporter = exporter_cls(entity)
-            await exporter.export_entity()
+            with tracing.trace(
+                f"export.{entity.entity_type}",
+                slack_id=str(entity.slack_id),
+                job_id=getattr(entity, "job_id", None) or 0,
+            ):
+                await exporter.export_entity()
         except Exception as e:
             backend_logger.error(
                 f"Ошибка экспорта {entity.entity_type} {entity.slack_id}: {e}"
@@ -159,7 +231,11 @@ async def export_worker(queue, mm_user_id):
                         await session.execute(
                             update(Entity)
                             .where(where_cond)
-                            .values(status="failed", error_message=str(e))
+                            .values(
+                                status="failed",
+                                error_message=str(e),
+                                error_signature=error_signature(str(e)),
+                            )
                         )
                         await session.commit()
             except Exception:
@@ -182,7 +258,7 @@ async def orchestrate_mm_export(job_id=None):
 
         # Optional anchor: if job_id is provided, only consider jobs uploaded up to that anchor.
         anchor_cutoff: tuple | None = None
-        async with SessionLocal() as session:
+        async with ControlSessionLocal() as session:
             if job_id is not None:
                 anc = await session.get(ImportJob, job_id)
                 if anc is not None:
@@ -191,7 +267,7 @@ async def orchestrate_mm_export(job_id=None):
         sleep_s = float(os.getenv("EXPORT_QUEUE_POLL", str(EXPORT_QUEUE_POLL_DEFAULT)))
 
         async def _fetch_exporting_jobs() -> list[ImportJob]:
-            async with SessionLocal() as s:
+            async with ControlSessionLocal() as s:
                 q = select(ImportJob).where(ImportJob.status == JobStatus.running)
                 if anchor_cutoff is not None:
                     q = q.where(
@@ -220,7 +296,7 @@ async def orchestrate_mm_export(job_id=None):
                 cond = (Entity.entity_type == entity_type) & (
                     Entity.status == MappingStatus.pending
                 )
-                if entity_type in ("message", "reaction", "attachment"):
+                if entity_type in JOB_SCOPED_TYPES:
                     ids = [int(cast(int, j.id)) for j in jobs]
                     if not ids:
                         return False
@@ -233,7 +309,7 @@ async def orchestrate_mm_export(job_id=None):
             jobs = await _fetch_exporting_jobs()
             if not jobs:
                 # If there are running jobs but not yet exporting, wait for earliest to reach exporting
-                async with SessionLocal() as s:
+                async with ControlSessionLocal() as s:
                     q2 = select(ImportJob).where(ImportJob.status == JobStatus.running)
                     if anchor_cutoff is not None:
                         q2 = q2.where(
@@ -263,6 +339,7 @@ async def orchestrate_mm_export(job_id=None):
                 f"Запуск экспорта с глобальным барьером типов для {len(jobs)} задач"
             )
             for entity_type, exporter_cls in EXPORT_ORDER:
+                eta.set_export_type(entity_type)
                 # Repeat the type until no exporting job has pending/skipped entities of this type
                 while True:
                     jobs = await _fetch_exporting_jobs()
@@ -271,29 +348,17 @@ async def orchestrate_mm_export(job_id=None):
                     backend_logger.info(
                         f"[TYPE] Начинаю экспорт типа {entity_type} для {len(jobs)} задач"
                     )
-                    if entity_type in ("user", "custom_emoji", "channel"):
+                    if entity_type not in JOB_SCOPED_TYPES:
                         # Global types: export once across all jobs
-                        queue = asyncio.Queue()
-                        entities = await get_entities_to_export(
-                            entity_type, job_id=None
-                        )
-                        for entity in entities:
-                            backend_logger.debug(
-                                f"[EXPORT] enqueue {entity_type} {entity.slack_id}"
+                        # Global types are tagged with the earliest exporting job
+                        async with job_stage(jobs[0].id, f"export:{entity_type}"):
+                            await _export_stream(
+                                entity_type,
+                                exporter_cls,
+                                None,
+                                workers_count,
+                                mm_user_id,
                             )
-                            await queue.put((entity, exporter_cls))
-                        workers_for_type = workers_count
-                        backend_logger.debug(
-                            f"[EXPORT] starting {workers_for_type} workers for global {entity_type}"
-                        )
-                        workers = [
-                            asyncio.create_task(export_worker(queue, mm_user_id))
-                            for _ in range(workers_for_type)
-                        ]
-                        await queue.join()
-                        for _ in workers:
-                            await queue.put(None)
-                        await asyncio.gather(*workers)
                         backend_logger.info(f"Экспорт {entity_type} завершён (global)")
                     else:
                         # Job-scoped types: export per job
@@ -304,42 +369,29 @@ async def orchestrate_mm_export(job_id=None):
                             if entity_type == "message":
                                 t0 = asyncio.get_event_loop().time()
                                 job_id_val: int = cast(int, j.id)
-                                await _export_messages_per_channel(
-                                    job_id=job_id_val, mm_user_id=mm_user_id
-                                )
+                                async with job_stage(j.id, "export:message"):
+                                    await _export_messages_per_channel(
+                                        job_id=job_id_val, mm_user_id=mm_user_id
+                                    )
                                 dt = asyncio.get_event_loop().time() - t0
                                 backend_logger.info(
                                     f"Экспорт сообщений завершён за {dt:.2f}s (job_id={j.id})"
                                 )
                             else:
-                                queue = asyncio.Queue()
-                                entities = await get_entities_to_export(
-                                    entity_type, job_id=j.id
-                                )
-                                for entity in entities:
-                                    backend_logger.debug(
-                                        f"[EXPORT] enqueue {entity_type} {entity.slack_id}"
-                                    )
-                                    await queue.put((entity, exporter_cls))
                                 if entity_type == "attachment":
                                     workers_for_type = int(
                                         os.getenv("ATTACHMENT_WORKERS", workers_count)
                                     )
                                 else:
                                     workers_for_type = workers_count
-                                backend_logger.debug(
-                                    f"[EXPORT] starting {workers_for_type} workers for {entity_type} (job_id={j.id})"
-                                )
-                                workers = [
-                                    asyncio.create_task(
-                                        export_worker(queue, mm_user_id)
+                                async with job_stage(j.id, f"export:{entity_type}"):
+                                    await _export_stream(
+                                        entity_type,
+                                        exporter_cls,
+                                        j.id,
+                                        workers_for_type,
+                                        mm_user_id,
                                     )
-                                    for _ in range(workers_for_type)
-                                ]
-                                await queue.join()
-                                for _ in workers:
-                                    await queue.put(None)
-                                await asyncio.gather(*workers)
                             backend_logger.info(
                                 f"Экспорт {entity_type} завершён (job_id={j.id})"
                             )
@@ -348,11 +400,12 @@ async def orchestrate_mm_export(job_id=None):
                     if not await _has_pending_for_type(entity_type, jobs):
                         break
 
+            eta.set_export_type(None)
             # After completing all types for these jobs, mark them done
             try:
                 from sqlalchemy import update
 
-                async with SessionLocal() as session:
+                async with ControlSessionLocal() as session:
                     for j in jobs:
                         await session.execute(
                             update(ImportJob)
@@ -374,73 +427,97 @@ async def orchestrate_mm_export(job_id=None):
                 break
 
 
-async def _export_messages_per_channel(job_id: int, mm_user_id: str) -> None:
-    """Export messages grouped by channel, processing each channel sequentially
-    while allowing multiple channels to run in parallel. Preserves thread and
-    chronological order within a channel by sorting roots first then ts.
+async def export_requeued(job_id: int, entity_types) -> None:
+    """Targeted re-run after requeue_entities: only the given types of one job,
+    only pending rows (failed/skipped ones left out of the requeue stay as they
+    are), no FIFO barrier over other jobs. The job is set back to exporting under
+    EXPORT_LOCK, so a full export finishing meanwhile cannot mark it done first.
+    Runs as a background task: any failure marks the job failed with the reason.
     """
-    from app.models.entity_relation import EntityRelation
-
-    # Concurrency controls
-    max_channels = int(
-        os.getenv("EXPORT_CHANNEL_CONCURRENCY", os.getenv("EXPORT_WORKERS", 4))
-    )
+    from sqlalchemy import update
 
-    # Load pending/skipped/failed messages for this job and their channel relations
-    async with SessionLocal() as session:
-        cond = (
-            (Entity.entity_type == "message")
-            & (
-                Entity.status.in_(
-                    [MappingStatus.pending, MappingStatus.skipped, MappingStatus.failed]
-                )
+    async def _set_job(**values):
+        async with ControlSessionLocal() as session:
+            await session.execute(
+                update(ImportJob).where(ImportJob.id == job_id).values(**values)
             )
-            & (Entity.job_id == job_id)
-        )
-        msg_rows = await session.execute(select(Entity).where(cond))
-        messages = list(msg_rows.scalars().all())
-        if not messages:
-            return
+            await session.commit()
 
-        ids = [m.id for m in messages]
-        # posted_in: message -> channel
-        rel_rows = await session.execute(
-            select(EntityRelation.from_entity_id, EntityRelation.to_entity_id).where(
-                (EntityRelation.relation_type == "posted_in")
-                & (EntityRelation.from_entity_id.in_(ids))
+    types = set(entity_types)
+    statuses = [MappingStatus.pending]
+    async with EXPORT_LOCK:
+        try:
+            await _set_job(current_stage="exporting", status=JobStatus.running)
+            mm_user_id = await get_mm_user_id()
+            if not mm_user_id:
+                raise RuntimeError("не удалось получить ID пользователя Mattermost")
+            workers_count = int(os.getenv("EXPORT_WORKERS", 5))
+            backend_logger.info(
+                f"Повторный экспорт job_id={job_id}: {', '.join(t for t, _ in EXPORT_ORDER if t in types)}"
             )
-        )
-        msg_to_channel = {mid: cid for (mid, cid) in rel_rows.all()}
-
-        # Identify replies for sorting
-        reply_rows = await session.execute(
-            select(EntityRelation.from_entity_id).where(
-                (EntityRelation.relation_type == "thread_reply")
-                & (EntityRelation.from_entity_id.in_(ids))
+            for entity_type, exporter_cls in EXPORT_ORDER:
+                if entity_type not in types:
+                    continue
+                eta.set_export_type(entity_type)
+                async with job_stage(job_id, f"export:{entity_type}"):
+                    if entity_type == "message":
+                        await _export_messages_per_channel(
+                            job_id=job_id, mm_user_id=mm_user_id, statuses=statuses
+                        )
+                        continue
+                    workers_for_type = workers_count
+                    if entity_type == "attachment":
+                        workers_for_type = int(
+                            os.getenv("ATTACHMENT_WORKERS", workers_count)
+                        )
+                    await _export_stream(
+                        entity_type,
+                        exporter_cls,
+                        job_id if entity_type in JOB_SCOPED_TYPES else None,
+                        workers_for_type,
+                        mm_user_id,
+                        statuses=statuses,
+                    )
+        except Exception as e:  # noqa: BLE001
+            backend_logger.error(f"Повторный экспорт job_id={job_id} прерван: {e}")
+            # Requeued rows stay pending; POST /export picks them up
+            await _set_job(
+                status=JobStatus.failed,
+                error_message=f"Повторный экспорт прерван: {e}",
             )
-        )
-        reply_set = {row[0] for row in reply_rows.all()}
+            return
+        finally:
+            eta.set_export_type(None)
+        await _set_job(current_stage="done", status=JobStatus.success)
+        backend_logger.info(f"Повторный экспорт job_id={job_id} завершён")
 
-        # Group messages by channel entity id
-        groups: dict[int, list[Entity]] = {}
-        for m in messages:
-            ch = msg_to_channel.get(m.id)
-            if ch is None:
-                # messages without channel relation go to a special group key -1
-                ch = -1
-            groups.setdefault(ch, []).append(m)
 
-        def ts_key(ent: Entity) -> float:
-            return parse_slack_ts(ent.slack_id)
+async def _export_messages_per_channel(
+    job_id: int, mm_user_id: str, statuses=None
+) -> None:
+    """Export messages grouped by channel, processing each channel sequentially
+    while allowing multiple channels to run in parallel. Preserves thread and
+    chronological order within a channel: roots first, then replies, by ts.
+    The order is planned upfront as compact id arrays (see planner.plan_messages);
+    full entities are loaded page by page while a channel is exported.
+    """
+    # Concurrency controls
+    max_channels = int(
+        os.getenv("EXPORT_CHANNEL_CONCURRENCY", os.getenv("EXPORT_WORKERS", 4))
+    )
 
-        # Sort each channel: roots first then ts asc
-        for ch_id, lst in groups.items():
-            lst.sort(key=lambda ent: (0 if ent.id not in reply_set else 1, ts_key(ent)))
+    cond = candidate_condition("message", job_id, statuses)
+    plan = await plan_messages(cond)
+    if not len(plan):
+        return
+    backend_logger.info(
+        f"План экспорта сообщений (job_id={job_id}): {len(plan)} в {len(plan.channels)} каналах"
+    )
 
     sem = asyncio.Semaphore(max_channels)
 
     # shared caches across channels for this job export
-    from .message_exporter import MessageCaches
+    from .message_exporter import MessageCaches, prefetch_mention_names
 
     caches: MessageCaches = {
         "channel_mm_id_by_slack_id": {},
@@ -448,25 +525,56 @@ async def _export_messages_per_channel(job_id: int, mm_user_id: str) -> None:
         "user_mm_id_by_slack_id": {},
         "username_by_slack_id": {},
         "membership_seen": set(),
+        "prerendered": {},
+        "unknown_user_ids": set(),
+        "unknown_channel_ids": set(),
     }
+    page_size = _export_page_size()
 
-    async def _run_channel(ch_id: int, ents: list[Entity]):
-        async with sem:
-            for e in ents:
-                exporter = MessageExporter(e, caches=caches)
-                try:
-                    await exporter.export_entity()
-                except Exception as ex:  # noqa: BLE001
-                    backend_logger.error(
-                        f"Ошибка экспорта сообщения {e.slack_id} в канале {ch_id}: {ex}"
-                    )
-                    try:
-                        await exporter.set_status("failed", error=str(ex))
-                    except Exception:
-                        pass
+    async def _export_page(page: list[Entity], ch_id: int):
+        # One IN query per page for rendering-stage output; exporters pop their entry
+        caches["prerendered"].update(
+            await load_prerendered([int(cast(int, e.id)) for e in page])
+        )
+        # Names for the rest are resolved in bulk (one IN query per type)
+        await prefetch_mention_names(
+            (
+                e.raw_data
+                for e in page
+                if int(cast(int, e.id)) not in caches["prerendered"]
+            ),
+            caches,
+        )
+        for e in page:
+            await _export_one(e, ch_id)
 
-    tasks = [
-        asyncio.create_task(_run_channel(ch_id, ents)) for ch_id, ents in groups.items()
-    ]
-    if tasks:
-        await asyncio.gather(*tasks)
+    async def _export_one(e: Entity, ch_id: int):
+        add_entities()
+        exporter = MessageExporter(e, caches=caches)
+        try:
+            with tracing.trace(
+                "export.message", slack_id=str(e.slack_id), job_id=e.job_id or 0
+            ):
+                await exporter.export_entity()
+        except Exception as ex:  # noqa: BLE001
+            backend_logger.error(
+                f"Ошибка экспорта сообщения {e.slack_id} в канале {ch_id}: {ex}"
+            )
+            try:
+                await exporter.set_status("failed", error=str(ex))
+            except Exception:
+                pass
+
+    async def _run_channel(ch_id: int):
+        async with sem:
+            metrics.export_workers.inc("message")
+            try:
+                async for page in hydrate(plan.channel_ids(ch_id), cond, page_size):
+                    await _export_page(page, ch_id)
+            finally:
+                metrics.export_workers.dec("message")
+
+    # Messages without a posted_in relation form their own group (planner.ORPHAN_CHANNEL)
+    await asyncio.gather(
+        *(asyncio.create_task(_run_channel(ch)) for ch in plan.channels)
+    )
@@ -0,0 +1,95 @@
+"""Message export planner: the whole export order as compact id arrays.
+
+One ordered scan reads only (id, channel entity id, is_reply) of the pending
+messages; the database does the sorting (channel, roots before replies, ts,
+id), so no ORM objects, per-message dicts or Python-side sorts are built.
+Ids are kept in an `array('q')` (8 bytes per message) with one (start, end)
+range per channel; exporters hydrate full entities lazily, a small page at a
+time, by primary key.
+"""
+
+from __future__ import annotations
+
+from array import array
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, Tuple
+
+from sqlalchemy import and_, func, literal, select
+from sqlalchemy.orm import aliased
+
+from app.models.base import SessionLocal
+from app.models.entity import Entity
+from app.models.entity_relation import EntityRelation
+
+from .queries import relation_exists
+
+# Group key of messages without a posted_in relation
+ORPHAN_CHANNEL = -1
+
+
+@dataclass
+class ExportPlan:
+    ids: array = field(default_factory=lambda: array("q"))
+    # channel entity id → [start, end) slice of ids
+    channels: Dict[int, Tuple[int, int]] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def channel_ids(self, channel_id: int) -> array:
+        start, end = self.channels.get(channel_id, (0, 0))
+        return self.ids[start:end]
+
+
+async def plan_messages(cond, fetch_size: int = 10000) -> ExportPlan:
+    """Order candidates matching `cond` per channel: roots then replies, by (ts, id).
+    For messages the Slack ts is the slack_id, so this is the keyset order of
+    iter_entities_to_export.
+    """
+    posted_in = aliased(EntityRelation)
+    channel = func.coalesce(posted_in.to_entity_id, literal(ORPHAN_CHANNEL))
+    is_reply = relation_exists("thread_reply")
+    q = (
+        select(Entity.id, channel)
+        .outerjoin(
+            posted_in,
+            and_(
+                posted_in.from_entity_id == Entity.id,
+                posted_in.relation_type == "posted_in",
+            ),
+        )
+        .where(cond)
+        .order_by(channel, is_reply, Entity.slack_id, Entity.id)
+        .execution_options(yield_per=fetch_size)
+    )
+    plan = ExportPlan()
+    current: int | None = None
+    start = 0
+    async with SessionLocal() as session:
+        result = await session.stream(q)
+        async for part in result.partitions():
+            for entity_id, channel_id in part:
+                if channel_id != current:
+                    if current is not None:
+                        plan.channels[current] = (start, len(plan.ids))
+                    current, start = int(channel_id), len(plan.ids)
+                plan.ids.append(entity_id)
+    if current is not None:
+        plan.channels[current] = (start, len(plan.ids))
+    return plan
+
+
+async def hydrate(ids: array, cond, page_size: int) -> AsyncIterator[list[Entity]]:
+    """Full entities for planned ids, one primary-key IN query per page, in plan
+    order. `cond` is re-applied so messages finished meanwhile are skipped.
+    """
+    for offset in range(0, len(ids), page_size):
+        chunk = ids[offset : offset + page_size].tolist()
+        async with SessionLocal() as session:
+            rows = await session.execute(
+                select(Entity).where(Entity.id.in_(chunk) & cond)
+            )
+            by_id = {e.id: e for e in rows.scalars().all()}
+        page = [by_id[i] for i in chunk if i in by_id]
+        if page:
+            yield page
@@ -0,0 +1,36 @@
+"""Entity conditions shared by the orchestrator, the message planner and bulk import."""
+
+from __future__ import annotations
+
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+
+from app.models.entity import Entity
+from app.models.entity_relation import EntityRelation
+from app.models.status_enum import MappingStatus
+from app.utils.filters import job_scoped_condition
+
+# Statuses that are (re)considered for export
+EXPORT_CANDIDATE_STATUSES = [
+    MappingStatus.pending,
+    MappingStatus.skipped,
+    MappingStatus.failed,
+]
+
+
+def candidate_condition(entity_type: str, job_id=None, statuses=None):
+    """Export candidates of a type; statuses overrides EXPORT_CANDIDATE_STATUSES."""
+    cond = (Entity.entity_type == entity_type) & (
+        Entity.status.in_(statuses or EXPORT_CANDIDATE_STATUSES)
+    )
+    return job_scoped_condition(cond, entity_type, job_id)
+
+
+def relation_exists(relation_type: str):
+    # aliased: the outer query may itself join entity_relations (posted_in)
+    rel = aliased(EntityRelation)
+    return (
+        select(rel.id)
+        .where((rel.from_entity_id == Entity.id) & (rel.relation_type == relation_type))
+        .exists()
+    )
@@ -4,6 +4,7 @@ import math
 from typing import Optional
 
 from app.logging_config import backend_logger
+from app.services.monitoring import tracing
 from app.models.base import SessionLocal
 from app.models.entity import Entity
 from app.models.entity_relation import EntityRelation
@@ -12,6 +13,8 @@ from sqlalchemy import select
 from .base_exporter import ExporterBase, LoggingMixin
 from .mm_api_mixin import MMApiMixin
 from .custom_emoji_exporter import transliterate_cyrillic
+from .id_map import lookup_mm_id
+from app.utils.filters import job_scoped_condition
 
 
 class ReactionExporter(ExporterBase, LoggingMixin, MMApiMixin):
@@ -26,14 +29,16 @@ class ReactionExporter(ExporterBase, LoggingMixin, MMApiMixin):
 
         raw = self.entity.raw_data or {}
 
-        post_id, channel_id = await self._resolve_target_post_and_channel()
+        with tracing.span("resolve_post"):
+            post_id, channel_id = await self._resolve_target_post_and_channel()
         if not post_id:
             await self.set_status(
                 "failed", error="Target post_id not found for reaction"
             )
             return
 
-        user_id = await self._resolve_mm_user_id_for_reaction()
+        with tracing.span("resolve_user"):
+            user_id = await self._resolve_mm_user_id_for_reaction()
         if not user_id:
             await self.set_status("failed", error="Reacting user not resolved")
             return
@@ -46,19 +51,22 @@ class ReactionExporter(ExporterBase, LoggingMixin, MMApiMixin):
         candidates = self._emoji_candidates(emoji_name)
         # Use transliteration ONLY for custom emojis we created; keep standard names as-is
         # If it's a custom emoji, ensure the first candidate is the transliterated name
-        if await self._is_custom_emoji(candidates[0]):
+        with tracing.span("resolve_emoji"):
+            is_custom = await self._is_custom_emoji(candidates[0])
+        if is_custom:
             candidates[0] = transliterate_cyrillic(candidates[0])
 
         # Best-effort membership: add user to channel to avoid AddReaction failure
         if channel_id:
             try:
-                _ = await self.mm_api_post(
-                    "/plugins/mm-importer/api/v1/channel/members",
-                    {"channel_id": channel_id, "user_ids": [user_id]},
-                )
+                with tracing.span("membership"):
+                    _ = await self.mm_api_post(
+                        "/plugins/mm-importer/api/v1/channel/members",
+                        {"channel_id": channel_id, "user_ids": [user_id]},
+                    )
             except Exception as e:  # noqa: BLE001
                 backend_logger.debug(
-                    f"Ensure channel membership for reaction failed (non-fatal): {e}"
+                    "Ensure channel membership for reaction failed (non-fatal): %s", e
                 )
 
         # Timestamp to ms if present
@@ -73,9 +81,10 @@ class ReactionExporter(ExporterBase, LoggingMixin, MMApiMixin):
                 "create_at": create_at,
             }
             try:
-                resp = await self.mm_api_post(
-                    "/plugins/mm-importer/api/v1/reaction", payload
-                )
+                with tracing.span("plugin_reaction", emoji_name=name):
+                    resp = await self.mm_api_post(
+                        "/plugins/mm-importer/api/v1/reaction", payload
+                    )
                 if resp.status_code in (200, 201):
                     await self.set_status("success")
                     return
@@ -123,9 +132,11 @@ class ReactionExporter(ExporterBase, LoggingMixin, MMApiMixin):
             return False
         async with SessionLocal() as session:
             row = await session.execute(
-                select(Entity).where(
+                select(Entity.id)
+                .where(
                     (Entity.entity_type == "custom_emoji") & (Entity.slack_id == name)
                 )
+                .limit(1)
             )
             return row.scalar_one_or_none() is not None
 
@@ -165,21 +176,26 @@ class ReactionExporter(ExporterBase, LoggingMixin, MMApiMixin):
         self,
     ) -> tuple[Optional[str], Optional[str]]:
         """Find the MM post_id and channel_id for the message this reaction targets.
-        Prefer the reacted_to relation to the message entity.
+        Prefer the reacted_to relation to the message entity, fallback to id_map by message ts.
+        Only narrow columns are selected (no raw_data).
         """
+        job_id = getattr(self.entity, "job_id", None)
         async with SessionLocal() as session:
             # Find message entity via reacted_to relation
             row = await session.execute(
-                select(Entity)
+                select(Entity.id, Entity.mattermost_id)
                 .join(EntityRelation, Entity.id == EntityRelation.to_entity_id)
                 .where(
                     (EntityRelation.from_entity_id == self.entity.id)
                     & (EntityRelation.relation_type == "reacted_to")
                     & (Entity.entity_type == "message")
                 )
+                .limit(1)
             )
-            msg_entity = row.scalar_one_or_none()
-            if not msg_entity:
+            msg_row = row.first()
+            msg_entity_id = msg_row[0] if msg_row else None
+            post_id = msg_row[1] if msg_row else None
+            if not msg_row:
                 # Fallback by raw_data.item.ts or raw_data.ts (sanitize) or slack_id prefix
                 raw = self.entity.raw_data or {}
                 ts = None
@@ -197,71 +213,62 @@ class ReactionExporter(ExporterBase, LoggingMixin, MMApiMixin):
                     except Exception:
                         ts = None
                 if ts:
-                    row2 = await session.execute(
-                        select(Entity).where(
-                            (Entity.entity_type == "message") & (Entity.slack_id == ts)
+                    post_id = await lookup_mm_id("message", ts, job_id)
+                    if post_id:
+                        cond = job_scoped_condition(
+                            (Entity.entity_type == "message") & (Entity.slack_id == ts),
+                            "message",
+                            job_id,
                         )
-                    )
-                    msg_entity = row2.scalar_one_or_none()
-            if not msg_entity:
-                return None, None
-
-            post_id = getattr(msg_entity, "mattermost_id", None)
+                        row2 = await session.execute(
+                            select(Entity.id).where(cond).limit(1)
+                        )
+                        msg_entity_id = row2.scalar_one_or_none()
             if not (isinstance(post_id, str) and post_id):
                 return None, None
+            if msg_entity_id is None:
+                return post_id, None
 
             # Resolve channel for membership using posted_in relation
             ch_row = await session.execute(
-                select(Entity)
+                select(Entity.mattermost_id)
                 .join(EntityRelation, Entity.id == EntityRelation.to_entity_id)
                 .where(
-                    (EntityRelation.from_entity_id == msg_entity.id)
+                    (EntityRelation.from_entity_id == msg_entity_id)
                     & (EntityRelation.relation_type == "posted_in")
                     & (Entity.entity_type == "channel")
                 )
+                .limit(1)
             )
-            ch_entity = ch_row.scalar_one_or_none()
-            channel_id = (
-                getattr(ch_entity, "mattermost_id", None) if ch_entity else None
-            )
+            channel_id = ch_row.scalar_one_or_none()
             return post_id, (
                 channel_id if isinstance(channel_id, str) and channel_id else None
             )
 
     async def _resolve_mm_user_id_for_reaction(self) -> Optional[str]:
-        """Find the MM user id who reacted. Prefer reacted_by relation, fallback by raw user in reaction."""
-        # Via reacted_by relation
+        """Find the MM user id who reacted. Prefer id_map by raw user, fallback to reacted_by relation."""
+        raw = self.entity.raw_data or {}
+        slack_uid = raw.get("user")
+        if slack_uid:
+            mmid = await lookup_mm_id("user", slack_uid)
+            if mmid:
+                return mmid
+
+        # Via reacted_by relation (narrow select)
         async with SessionLocal() as session:
             row = await session.execute(
-                select(Entity)
+                select(Entity.mattermost_id)
                 .join(EntityRelation, Entity.id == EntityRelation.from_entity_id)
                 .where(
                     (EntityRelation.to_entity_id == self.entity.id)
                     & (EntityRelation.relation_type == "reacted_by")
                     & (Entity.entity_type == "user")
                 )
+                .limit(1)
             )
-            user_entity = row.scalar_one_or_none()
-            if user_entity:
-                mmid = getattr(user_entity, "mattermost_id", None)
-                if isinstance(mmid, str) and mmid:
-                    return mmid
-
-        # Fallback by raw_data.user
-        raw = self.entity.raw_data or {}
-        slack_uid = raw.get("user")
-        if slack_uid:
-            async with SessionLocal() as session:
-                row2 = await session.execute(
-                    select(Entity).where(
-                        (Entity.entity_type == "user") & (Entity.slack_id == slack_uid)
-                    )
-                )
-                u = row2.scalar_one_or_none()
-                if u:
-                    mmid2 = getattr(u, "mattermost_id", None)
-                    if isinstance(mmid2, str) and mmid2:
-                        return mmid2
+            mmid2 = row.scalar_one_or_none()
+            if isinstance(mmid2, str) and mmid2:
+                return mmid2
         return None
 
     def _parse_ts_ms(self, ts_str: Optional[str]) -> Optional[int]:
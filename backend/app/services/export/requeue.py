@@ -0,0 +1,96 @@
+"""Bulk requeue of failed (optionally skipped) entities of a job for a targeted re-export."""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.orm import aliased
+
+from app.models.entity import Entity
+from app.models.entity_relation import EntityRelation
+from app.models.status_enum import MappingStatus
+from app.utils.filters import job_entities_condition
+
+
+def _channel_condition(channel: str):
+    """Entities of one Slack channel: the channel itself, messages posted_in it,
+    reactions and attachments of those messages."""
+    ch = aliased(Entity)
+    posted = aliased(EntityRelation)
+    via = aliased(EntityRelation)
+    channel_ids = select(ch.id).where(
+        (ch.entity_type == "channel") & (ch.slack_id == channel)
+    )
+    messages = select(posted.from_entity_id).where(
+        (posted.relation_type == "posted_in") & posted.to_entity_id.in_(channel_ids)
+    )
+    children = select(via.from_entity_id).where(
+        via.relation_type.in_(("reacted_to", "attached_to"))
+        & via.to_entity_id.in_(messages)
+    )
+    return or_(
+        (Entity.entity_type == "channel") & (Entity.slack_id == channel),
+        (Entity.entity_type == "message") & Entity.id.in_(messages),
+        Entity.entity_type.in_(("reaction", "attachment")) & Entity.id.in_(children),
+    )
+
+
+def requeue_condition(
+    job_id: int,
+    entity_types: Optional[Iterable[str]] = None,
+    signature: Optional[str] = None,
+    channel: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    include_skipped: bool = False,
+):
+    """
+    Filter for requeue_entities. Failed rows only unless include_skipped: skips
+    (unknown emoji, oversized attachment, invalid DM members) do not go away on
+    retry, so they are requeued only on request, best narrowed by signature.
+    since/until bound updated_at, i.e. when the entity got its current status.
+    """
+    statuses = [MappingStatus.failed]
+    if include_skipped:
+        statuses.append(MappingStatus.skipped)
+    cond = Entity.status.in_(statuses) & job_entities_condition(job_id)
+    if entity_types:
+        cond = cond & Entity.entity_type.in_(list(entity_types))
+    if signature is not None:
+        cond = cond & (Entity.error_signature == signature)
+    if channel:
+        cond = cond & _channel_condition(channel)
+    if since is not None:
+        cond = cond & (Entity.updated_at >= since)
+    if until is not None:
+        cond = cond & (Entity.updated_at < until)
+    return cond
+
+
+async def requeue_entities(session, job_id: int, dry_run: bool = False, **filters):
+    """Reset matching entities to pending in one UPDATE (error fields cleared).
+    Returns counts per entity type; with dry_run only counts are computed.
+    Keyword filters: see requeue_condition.
+    """
+    cond = requeue_condition(job_id, **filters)
+    rows = await session.execute(
+        select(Entity.entity_type, func.count())
+        .where(cond)
+        .group_by(Entity.entity_type)
+    )
+    counts = {etype: int(n) for etype, n in rows.all()}
+    if counts and not dry_run:
+        await session.execute(
+            update(Entity)
+            .where(cond)
+            .values(
+                status=MappingStatus.pending,
+                error_message=None,
+                error_signature=None,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+    return counts
@@ -0,0 +1,289 @@
+"""In-process metrics registry rendered in the Prometheus text format.
+
+No client library and no external service: counters, gauges and histograms
+live in module-level dicts keyed by label values and are rendered on
+`GET /metrics`. Updates happen on the event loop thread, so no locking.
+Gauges may be backed by a callback that is evaluated at scrape time (pool
+usage, queue depths), which keeps the hot path free of bookkeeping.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import math
+import re
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, Optional, Sequence, Tuple, TypeVar
+
+PREFIX = "slackmm_"
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return (
+        repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+    )
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = PREFIX + name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Sequence) -> LabelValues:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name}: expected labels {self.labelnames}")
+        return tuple(str(v) for v in labels)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    @abstractmethod
+    def render(self) -> list[str]:
+        pass
+
+    @abstractmethod
+    def reset(self) -> None:
+        pass
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels, value: float = 1) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + value
+
+    def get(self, *labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> list[str]:
+        return [
+            f"{self.name}{_labels(self.labelnames, k)} {_num(v)}"
+            for k, v in sorted(self._values.items())
+        ]
+
+    def reset(self) -> None:
+        self._values.clear()
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name,
+        help,
+        labelnames=(),
+        collect: Optional[Callable[[], Dict[LabelValues, float]]] = None,
+    ):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._collect = collect
+
+    def set(self, *labels, value: float) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, *labels, value: float = 1) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + value
+
+    def dec(self, *labels, value: float = 1) -> None:
+        self.inc(*labels, value=-value)
+
+    def get(self, *labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> list[str]:
+        values = dict(self._values)
+        if self._collect is not None:
+            try:
+                values.update(
+                    {self._key(k): v for k, v in (self._collect() or {}).items()}
+                )
+            except Exception:  # noqa: BLE001
+                # A failing callback must not break the whole scrape
+                pass
+        return [
+            f"{self.name}{_labels(self.labelnames, k)} {_num(v)}"
+            for k, v in sorted(values.items())
+        ]
+
+    def reset(self) -> None:
+        self._values.clear()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values → [per-bucket counts..., +Inf count], sum
+        self._counts: Dict[LabelValues, list[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, *labels, value: float) -> None:
+        key = self._key(labels)
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+            self._sums[key] = 0.0
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[key] += value
+
+    def count(self, *labels) -> int:
+        return sum(self._counts.get(self._key(labels), ()))
+
+    def render(self) -> list[str]:
+        out = []
+        for key in sorted(self._counts):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), self._counts[key]):
+                cumulative += n
+                le = 'le="' + _num(bound) + '"'
+                out.append(
+                    f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}"
+                )
+            lbl = _labels(self.labelnames, key)
+            out.append(f"{self.name}_sum{lbl} {_num(self._sums[key])}")
+            out.append(f"{self.name}_count{lbl} {cumulative}")
+        return out
+
+    def reset(self) -> None:
+        self._counts.clear()
+        self._sums.clear()
+
+
+_registry: Dict[str, _Metric] = {}
+M = TypeVar("M", bound=_Metric)
+
+
+def _register(metric: M) -> M:
+    _registry[metric.name] = metric
+    return metric
+
+
+def render(metrics: Optional[Iterable[_Metric]] = None) -> str:
+    lines: list[str] = []
+    for m in metrics if metrics is not None else _registry.values():
+        samples = m.render()
+        if samples:
+            lines += m.header() + samples
+    return "\n".join(lines) + "\n"
+
+
+def reset() -> None:
+    for m in _registry.values():
+        m.reset()
+
+
+# Mattermost ids (26 chars) and numeric ids become placeholders; names after
+# /name/ and /username/ too. Keeps the endpoint label cardinality bounded.
+_MM_ID = re.compile(r"^[a-z0-9]{26}$|^\d+$")
+_NAMED = {"name", "username", "email"}
+
+
+def endpoint_label(path: str) -> str:
+    parts = path.split("?", 1)[0].split("/")
+    out = []
+    for i, seg in enumerate(parts):
+        if i and parts[i - 1] in _NAMED and seg:
+            out.append("{name}")
+        elif _MM_ID.match(seg):
+            out.append("{id}")
+        else:
+            out.append(seg)
+    return "/".join(out)
+
+
+def _pool_usage() -> Dict[LabelValues, float]:
+    from app.models.base import pool_stats
+
+    return {
+        (name, key): st[key]
+        for name, st in pool_stats().items()
+        for key in ("size", "checked_out", "overflow")
+        if key in st
+    }
+
+
+# Export queues by entity type, registered while a type is being exported
+export_queues: Dict[str, asyncio.Queue] = {}
+
+
+def _queue_depths() -> Dict[LabelValues, float]:
+    return {(t,): q.qsize() for t, q in export_queues.items()}
+
+
+entities_processed = _register(
+    Counter(
+        "entities_processed_total",
+        "Entities whose export finished, by type and resulting status",
+        ("entity_type", "status"),
+    )
+)
+mm_api_request_seconds = _register(
+    Histogram(
+        "mm_api_request_duration_seconds",
+        "Mattermost API request latency",
+        ("method", "endpoint", "status"),
+    )
+)
+slack_download_seconds = _register(
+    Histogram(
+        "slack_download_duration_seconds",
+        "File download latency (Slack files, emoji images)",
+        ("status",),
+    )
+)
+slack_download_bytes = _register(
+    Counter("slack_download_bytes_total", "Downloaded file bytes", ())
+)
+db_pool_connections = _register(
+    Gauge(
+        "db_pool_connections",
+        "DB pool usage by pool (pipeline/api/control) and kind",
+        ("pool", "kind"),
+        collect=_pool_usage,
+    )
+)
+export_queue_depth = _register(
+    Gauge(
+        "export_queue_depth",
+        "Entities waiting in the export worker queue",
+        ("entity_type",),
+        collect=_queue_depths,
+    )
+)
+export_workers = _register(
+    Gauge(
+        "export_workers",
+        "Running export workers (messages: channels being exported)",
+        ("entity_type",),
+    )
+)
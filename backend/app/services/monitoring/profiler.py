@@ -0,0 +1,202 @@
+"""Sampling profiler with collapsed-stack output.
+
+A daemon thread wakes up every `interval` seconds, reads the stacks of all
+other threads (`sys._current_frames`) and counts them as collapsed stacks
+(`root;outer;...;inner N`), the input format of flamegraph.pl, speedscope and
+inferno. Nothing is hooked into the profiled code (no `sys.setprofile`), so
+the cost is one stack walk per thread per tick, paid by the sampler thread
+under the GIL: at the default 100 Hz it stays around a percent of one core,
+cheap enough for a few minutes on a live migration.
+
+Asyncio coroutines show up in the event loop thread's stack while they run;
+time spent awaiting I/O appears as the loop's selector frame.
+
+One session at a time, bounded by `PROFILER_MAX_SECONDS`. A session may be
+scoped to a job: samples are then taken only while that job is inside a
+`job_stage` block, and the root frame is the job's active stage(s) instead
+of the thread name.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from app.logging_config import backend_logger
+from app.services.monitoring import query_stats
+
+
+def _default_interval() -> float:
+    return float(os.getenv("PROFILER_INTERVAL", "0.01"))
+
+
+def _max_seconds() -> float:
+    return float(os.getenv("PROFILER_MAX_SECONDS", "600"))
+
+
+# Distinct stacks kept per session; further new stacks are counted under one bucket
+_MAX_STACKS = int(os.getenv("PROFILER_MAX_STACKS", "50000"))
+_MAX_DEPTH = 200
+_TRUNCATED = "[truncated]"
+
+# code object → frame label; code objects live as long as their functions
+_labels: Dict[object, str] = {}
+
+
+def _label(code) -> str:
+    lbl = _labels.get(code)
+    if lbl is None:
+        name = getattr(code, "co_qualname", code.co_name)
+        lbl = f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        # ';' separates frames in the collapsed format
+        lbl = _labels[code] = lbl.replace(";", ":")
+    return lbl
+
+
+def collapse(frame, root: str) -> str:
+    """`root;outermost;...;innermost` for a frame (innermost first in the chain)."""
+    parts = []
+    while frame is not None and len(parts) < _MAX_DEPTH:
+        parts.append(_label(frame.f_code))
+        frame = frame.f_back
+    parts.append(root)
+    parts.reverse()
+    return ";".join(parts)
+
+
+def _iso(ts: Optional[float]) -> Optional[str]:
+    if ts is None:
+        return None
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat()
+
+
+class ProfileSession:
+    def __init__(
+        self,
+        duration: float,
+        interval: Optional[float] = None,
+        job_id: Optional[int] = None,
+    ):
+        self.duration = max(0.0, min(float(duration), _max_seconds()))
+        self.interval = max(0.001, interval or _default_interval())
+        self.job_id = int(job_id) if job_id is not None else None
+        self.stacks: Dict[str, int] = {}
+        self.samples = 0
+        self.ticks = 0
+        self.sampler_s = 0.0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        self.started_at = time.time()
+        self._thread = threading.Thread(
+            target=self._run, name="profiler-sampler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        deadline = time.monotonic() + self.duration
+        me = threading.get_ident()
+        try:
+            while not self._stop.is_set() and time.monotonic() < deadline:
+                t0 = time.perf_counter()
+                self.sample(me)
+                self.sampler_s += time.perf_counter() - t0
+                self._stop.wait(self.interval)
+        except Exception as e:  # noqa: BLE001
+            backend_logger.error(f"[PROFILER] Сэмплер остановлен: {e}")
+        finally:
+            self.finished_at = time.time()
+
+    def sample(self, skip_ident: Optional[int] = None) -> None:
+        """Take one sample of every thread except `skip_ident` (the sampler)."""
+        self.ticks += 1
+        root = None
+        if self.job_id is not None:
+            stages = query_stats.active_stages(self.job_id)
+            if not stages:
+                return
+            root = f"job {self.job_id} {'+'.join(stages)}"
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == skip_ident:
+                continue
+            stack = collapse(frame, root or names.get(ident, f"thread-{ident}"))
+            if stack not in self.stacks and len(self.stacks) >= _MAX_STACKS:
+                stack = _TRUNCATED
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        lines = [
+            f"{stack} {n}"
+            for stack, n in sorted(self.stacks.items(), key=lambda kv: -kv[1])
+        ]
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def status(self) -> dict:
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        return {
+            "running": self.running,
+            "job_id": self.job_id,
+            "interval": self.interval,
+            "duration": self.duration,
+            "started_at": _iso(self.started_at),
+            "finished_at": _iso(self.finished_at),
+            "elapsed_s": round(elapsed, 3),
+            "ticks": self.ticks,
+            "samples": self.samples,
+            "stacks": len(self.stacks),
+            # Share of wall time spent walking stacks (sampler thread, holds the GIL)
+            "overhead": round(self.sampler_s / elapsed, 4) if elapsed else 0.0,
+        }
+
+
+_session: Optional[ProfileSession] = None
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+def start(
+    duration: float = 60.0,
+    interval: Optional[float] = None,
+    job_id: Optional[int] = None,
+) -> ProfileSession:
+    """Start a session; the previous (finished) session's result is discarded."""
+    global _session
+    if _session is not None and _session.running:
+        raise ProfilerBusy("profiler is already running")
+    _session = ProfileSession(duration, interval, job_id)
+    _session.start()
+    backend_logger.info(
+        f"[PROFILER] Старт: {_session.duration:.0f} с, шаг {_session.interval} с, job_id={job_id}"
+    )
+    return _session
+
+
+def stop() -> Optional[ProfileSession]:
+    if _session is not None:
+        _session.stop()
+    return _session
+
+
+def current() -> Optional[ProfileSession]:
+    return _session
@@ -0,0 +1,382 @@
+from __future__ import annotations
+
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import event, text
+
+from app.logging_config import backend_logger
+
+# (job_id, stage) of the code currently issuing queries; inherited by child tasks
+_current: ContextVar[tuple[Optional[int], Optional[str]]] = ContextVar(
+    "query_stats_current", default=(None, None)
+)
+
+QUERY_STATS_ENABLED = os.getenv("QUERY_STATS", "1").lower() in ("1", "true", "yes")
+# A fingerprint issued more than K times per processed entity is reported as N+1
+# (once per entity, e.g. the status UPDATE, is expected)
+NPLUS1_K = float(os.getenv("QUERY_NPLUS1_K", "1"))
+# Ignore small stages: N+1 is only reported for fingerprints with at least this many calls
+NPLUS1_MIN_COUNT = int(os.getenv("QUERY_NPLUS1_MIN_COUNT", "50"))
+# Durations kept per fingerprint for p95 (reservoir sampling)
+_RESERVOIR = 512
+# Finished stages kept in memory for the API
+_KEEP_FINISHED = 50
+# Top fingerprints (by total time) stored in ImportJob.meta
+_TOP_N = 20
+
+_RE_IN_LIST = re.compile(
+    r"\(\s*(?:\$\d+|\?|%\(\w+\)s|%s)(?:\s*,\s*(?:\$\d+|\?|%\(\w+\)s|%s))+\s*\)"
+)
+_RE_PARAM = re.compile(r"\$\d+|%\(\w+\)s")
+_RE_STRING = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_SPACE = re.compile(r"\s+")
+
+_fingerprints: "OrderedDict[str, str]" = OrderedDict()
+_FP_CACHE_SIZE = 2048
+
+
+def fingerprint(statement: str) -> str:
+    """Normalize a SQL statement: literals/params → ?, IN-lists of any length → (?+)."""
+    fp = _fingerprints.get(statement)
+    if fp is not None:
+        return fp
+    s = _RE_STRING.sub("?", statement)
+    s = _RE_PARAM.sub("?", s)
+    s = _RE_NUMBER.sub("?", s)
+    s = _RE_IN_LIST.sub("(?+)", s)
+    fp = _RE_SPACE.sub(" ", s).strip()
+    _fingerprints[statement] = fp
+    if len(_fingerprints) > _FP_CACHE_SIZE:
+        _fingerprints.popitem(last=False)
+    return fp
+
+
+class FingerprintStats:
+    __slots__ = ("count", "total_s", "rows", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total_s = 0.0
+        self.rows = 0
+        self.samples: list[float] = []
+
+    def add(self, elapsed: float, rows: int) -> None:
+        self.count += 1
+        self.total_s += elapsed
+        if rows > 0:
+            self.rows += rows
+        if len(self.samples) < _RESERVOIR:
+            self.samples.append(elapsed)
+        else:
+            i = random.randrange(self.count)
+            if i < _RESERVOIR:
+                self.samples[i] = elapsed
+
+    def p95(self) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    def to_dict(self, fp: str) -> dict:
+        return {
+            "fingerprint": fp,
+            "count": self.count,
+            "total_ms": round(self.total_s * 1000, 3),
+            "p95_ms": round(self.p95() * 1000, 3),
+            "rows": self.rows,
+        }
+
+
+class StageStats:
+    def __init__(self, job_id: Optional[int], stage: Optional[str]):
+        self.job_id = job_id
+        self.stage = stage
+        self.entities = 0
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        # Wall time spent inside job_stage blocks (re-entries are summed)
+        self.wall_s = 0.0
+        self.peak_queue_depth: Optional[int] = None
+        self.by_fp: dict[str, FingerprintStats] = {}
+
+    def record(self, fp: str, elapsed: float, rows: int) -> None:
+        st = self.by_fp.get(fp)
+        if st is None:
+            st = self.by_fp[fp] = FingerprintStats()
+        st.add(elapsed, rows)
+
+    def n_plus_one(self) -> list[dict]:
+        if self.entities <= 0:
+            return []
+        out = []
+        for fp, st in self.by_fp.items():
+            per_entity = st.count / self.entities
+            if st.count >= NPLUS1_MIN_COUNT and per_entity > NPLUS1_K:
+                out.append(
+                    {
+                        "fingerprint": fp,
+                        "count": st.count,
+                        "per_entity": round(per_entity, 2),
+                    }
+                )
+        out.sort(key=lambda d: d["count"], reverse=True)
+        return out
+
+    def summary(self, top: Optional[int] = _TOP_N) -> dict:
+        items = sorted(self.by_fp.items(), key=lambda kv: kv[1].total_s, reverse=True)
+        if top is not None:
+            items = items[:top]
+        return {
+            "job_id": self.job_id,
+            "stage": self.stage,
+            "entities": self.entities,
+            "wall_ms": round(self.wall_s * 1000, 3),
+            "queries": sum(st.count for st in self.by_fp.values()),
+            "db_time_ms": round(
+                sum(st.total_s for st in self.by_fp.values()) * 1000, 3
+            ),
+            "fingerprints": len(self.by_fp),
+            "top": [st.to_dict(fp) for fp, st in items],
+            "n_plus_one": self.n_plus_one(),
+        }
+
+    def timeline(self) -> dict:
+        """Ledger entry: when the stage ran, how much it processed and how fast."""
+        return {
+            "started_at": _iso(self.started_at),
+            "finished_at": _iso(self.finished_at),
+            "wall_s": round(self.wall_s, 3),
+            "entities": self.entities,
+            "entities_per_s": (
+                round(self.entities / self.wall_s, 1) if self.wall_s > 0 else None
+            ),
+            "peak_queue_depth": self.peak_queue_depth,
+        }
+
+
+def _iso(ts: Optional[float]) -> Optional[str]:
+    if ts is None:
+        return None
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat()
+
+
+_lock = threading.Lock()
+_active: dict[tuple[Optional[int], Optional[str]], StageStats] = {}
+_finished: "OrderedDict[tuple[Optional[int], Optional[str]], StageStats]" = (
+    OrderedDict()
+)
+
+
+# Queries outside any job_stage block (API, startup): one bucket, never "active"
+_untagged = StageStats(None, None)
+
+
+def _stage_for(key: tuple[Optional[int], Optional[str]]) -> StageStats:
+    st = _active.get(key)
+    if st is None:
+        st = _active[key] = StageStats(*key)
+    return st
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_stats_t0", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stack = conn.info.get("query_stats_t0")
+    if not stack:
+        return
+    elapsed = time.perf_counter() - stack.pop()
+    try:
+        rows = int(getattr(cursor, "rowcount", -1) or 0)
+    except Exception:
+        rows = 0
+    fp = fingerprint(statement)
+    key = _current.get()
+    with _lock:
+        if key == (None, None):
+            _untagged.record(fp, elapsed, rows)
+            return
+        # Tasks may outlive their stage block: attribute late queries to the finished stage
+        st = _active.get(key) or _finished.get(key) or _stage_for(key)
+        st.record(fp, elapsed, rows)
+
+
+def _handle_error(exception_context):
+    # Drop the pending start time so the stack stays balanced
+    conn = exception_context.connection
+    if conn is not None:
+        stack = conn.info.get("query_stats_t0")
+        if stack:
+            stack.pop()
+
+
+_installed: set[int] = set()
+
+
+def install(engines) -> None:
+    """Attach the listeners to each distinct engine (idempotent)."""
+    if not QUERY_STATS_ENABLED:
+        return
+    for eng in engines:
+        sync_engine = getattr(eng, "sync_engine", eng)
+        if id(sync_engine) in _installed:
+            continue
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(sync_engine, "handle_error", _handle_error)
+        _installed.add(id(sync_engine))
+
+
+def add_entities(n: int = 1) -> None:
+    """Count entities processed by the current stage (basis for N+1 detection)."""
+    key = _current.get()
+    if key == (None, None):
+        return
+    with _lock:
+        st = _active.get(key) or _finished.get(key) or _stage_for(key)
+        st.entities += int(n)
+
+
+def note_queue_depth(depth: int) -> None:
+    """Track the peak queue depth of the current stage (export worker queues)."""
+    key = _current.get()
+    if key == (None, None):
+        return
+    with _lock:
+        st = _active.get(key)
+        if st is not None and (st.peak_queue_depth or 0) < depth:
+            st.peak_queue_depth = int(depth)
+
+
+def active_stages(job_id: int) -> list[str]:
+    """Stages of the job currently inside a `job_stage` block (any thread)."""
+    with _lock:
+        return sorted(st for (j, st) in _active if j == job_id and st is not None)
+
+
+def snapshot(job_id: Optional[int] = None, top: Optional[int] = _TOP_N) -> dict:
+    """Live (active) and recently finished stage summaries, optionally for one job."""
+    with _lock:
+        active = [
+            st.summary(top)
+            for st in _active.values()
+            if job_id is None or st.job_id == job_id
+        ]
+        finished = [
+            st.summary(top)
+            for st in _finished.values()
+            if job_id is None or st.job_id == job_id
+        ]
+        untagged = _untagged.summary(top) if job_id is None else None
+    return {
+        "enabled": QUERY_STATS_ENABLED,
+        "active": active,
+        "finished": finished,
+        "untagged": untagged,
+    }
+
+
+def reset() -> None:
+    global _untagged
+    with _lock:
+        _active.clear()
+        _finished.clear()
+        _untagged = StageStats(None, None)
+
+
+async def _store_in_job_meta(job_id: int, section: str, stage: str, payload: dict):
+    from app.models.base import ControlSessionLocal
+
+    async with ControlSessionLocal() as s:
+        # Atomic merge into meta[section][stage]
+        await s.execute(
+            text(
+                """
+                UPDATE import_jobs
+                SET meta = COALESCE(meta, '{}'::jsonb)
+                    || jsonb_build_object(
+                        CAST(:section AS text),
+                        COALESCE(meta->CAST(:section AS text), '{}'::jsonb)
+                            || jsonb_build_object(CAST(:stage AS text), CAST(:payload AS jsonb))
+                    )
+                WHERE id = :job_id
+                """
+            ),
+            {
+                "job_id": int(job_id),
+                "section": section,
+                "stage": stage,
+                "payload": json.dumps(payload, ensure_ascii=False),
+            },
+        )
+        await s.commit()
+
+
+@asynccontextmanager
+async def job_stage(job_id: Optional[int], stage: str, entities: int = 0):
+    """Tag queries issued inside the block (and tasks it spawns) with job/stage.
+    On exit the stage's ledger entry (start/end, entities, entities/s, peak
+    queue depth) is stored in ImportJob.meta["timeline"][stage]; with QUERY_STATS
+    the SQL summary is logged, kept for the API and stored in
+    ImportJob.meta["query_stats"][stage]. A stage re-entered for the same job
+    (e.g. an export type repeated by the barrier loop) is accumulated.
+    """
+    key = (int(job_id) if job_id is not None else None, stage)
+    with _lock:
+        st = _active.get(key) or _finished.pop(key, None) or StageStats(*key)
+        _active[key] = st
+        st.entities += int(entities or 0)
+    token = _current.set(key)
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        _current.reset(token)
+        with _lock:
+            st = _active.pop(key, None)
+            summary = timeline = None
+            if st is not None:
+                st.wall_s += time.perf_counter() - t0
+                st.finished_at = time.time()
+                summary = st.summary()
+                timeline = st.timeline()
+                _finished[key] = st
+                while len(_finished) > _KEEP_FINISHED:
+                    _finished.popitem(last=False)
+        if summary is not None and QUERY_STATS_ENABLED:
+            for item in summary["n_plus_one"]:
+                backend_logger.warning(
+                    f"[QUERY] N+1 в стадии {stage} (job_id={job_id}): {item['count']} запросов, "
+                    f"{item['per_entity']} на сущность: {item['fingerprint'][:200]}"
+                )
+            backend_logger.info(
+                f"[QUERY] Стадия {stage} (job_id={job_id}): {summary['queries']} запросов, "
+                f"{summary['db_time_ms']:.0f} ms в БД"
+            )
+        if summary is not None and job_id is not None:
+            sections = [("timeline", timeline)]
+            if QUERY_STATS_ENABLED:
+                payload = {
+                    k: v for k, v in summary.items() if k not in ("job_id", "stage")
+                }
+                sections.append(("query_stats", payload))
+            for section, payload in sections:
+                try:
+                    await _store_in_job_meta(int(job_id), section, stage, payload)
+                except Exception as e:  # noqa: BLE001
+                    backend_logger.debug(
+                        f"Не удалось сохранить {section} (job_id={job_id}): {e}"
+                    )
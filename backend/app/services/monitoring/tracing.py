@@ -0,0 +1,307 @@
+"""Local tracing: contextvar spans, sampled per root, written as OTLP JSON lines.
+
+A root (`trace("export.message", ...)`) is sampled with probability
+`TRACE_SAMPLE_RATE`; spans opened inside it (`span("resolve_channel")`) and
+in tasks it spawns attach to the current span through a contextvar. Outside
+a sampled root `span()` returns a shared no-op context, so instrumented code
+pays one contextvar lookup when tracing is off.
+
+A finished root is written to `TRACE_FILE` as one line in the OTLP/JSON
+format (`{"resourceSpans": [...]}`, the body of an OTLP/HTTP export request),
+by a background thread, and its spans are aggregated per root name and phase
+for `GET /debug/traces`.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import queue
+import random
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from app.logging_config import backend_logger
+
+SERVICE_NAME = "slack-mm2-sync-backend"
+# Durations kept per phase for p95 (reservoir sampling)
+_RESERVOIR = 512
+
+_sample_rate = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_FILE = os.getenv("TRACE_FILE") or os.path.join(
+    tempfile.gettempdir(), "slackmm-traces.jsonl"
+)
+
+_current: ContextVar[Optional["Span"]] = ContextVar("trace_span", default=None)
+_NOOP = nullcontext()
+
+
+def sample_rate() -> float:
+    return _sample_rate
+
+
+def set_sample_rate(rate: float) -> None:
+    global _sample_rate
+    _sample_rate = min(1.0, max(0.0, float(rate)))
+
+
+class Span:
+    __slots__ = (
+        "trace",
+        "span_id",
+        "parent",
+        "name",
+        "attrs",
+        "start_ns",
+        "end_ns",
+        "error",
+        "_token",
+    )
+
+    def __init__(self, trace: "Trace", name: str, parent: Optional["Span"], attrs):
+        self.trace = trace
+        self.span_id = random.getrandbits(64)
+        self.parent = parent
+        self.name = name
+        self.attrs: Dict[str, Any] = attrs
+        self.start_ns = 0
+        self.end_ns = 0
+        self.error: Optional[str] = None
+        self._token = None
+
+    def set(self, key: str, value: Any) -> None:
+        self.attrs[key] = value
+
+    def __enter__(self) -> "Span":
+        self._token = _current.set(self)
+        self.start_ns = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.end_ns = time.time_ns()
+        _current.reset(self._token)
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        self.trace.spans.append(self)
+        if self.parent is None:
+            _finish(self.trace)
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_otlp(self) -> dict:
+        out = {
+            "traceId": f"{self.trace.trace_id:032x}",
+            "spanId": f"{self.span_id:016x}",
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attr(k, v) for k, v in self.attrs.items()],
+            # STATUS_CODE_OK / STATUS_CODE_ERROR
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent is not None:
+            out["parentSpanId"] = f"{self.parent.span_id:016x}"
+        return out
+
+
+class Trace:
+    __slots__ = ("trace_id", "spans")
+
+    def __init__(self):
+        self.trace_id = random.getrandbits(128)
+        self.spans: list[Span] = []
+
+
+def _otlp_attr(key: str, value: Any) -> dict:
+    if isinstance(value, bool):
+        v = {"boolValue": value}
+    elif isinstance(value, int):
+        v = {"intValue": str(value)}  # int64 is a string in OTLP/JSON
+    elif isinstance(value, float):
+        v = {"doubleValue": value}
+    else:
+        v = {"stringValue": str(value)}
+    return {"key": key, "value": v}
+
+
+def trace(name: str, **attrs):
+    """Root span, sampled with TRACE_SAMPLE_RATE. Inside an active trace it is
+    an ordinary child span."""
+    parent = _current.get()
+    if parent is not None:
+        return Span(parent.trace, name, parent, attrs)
+    if _sample_rate <= 0 or random.random() >= _sample_rate:
+        return _NOOP
+    return Span(Trace(), name, None, attrs)
+
+
+def span(name: str, **attrs):
+    """Child span of the current one; a no-op outside a sampled trace."""
+    parent = _current.get()
+    if parent is None:
+        return _NOOP
+    return Span(parent.trace, name, parent, attrs)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+class PhaseStats:
+    __slots__ = ("count", "total_ms", "max_ms", "errors", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.errors = 0
+        self.samples: list[float] = []
+
+    def add(self, ms: float, error: bool) -> None:
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.errors += int(error)
+        if len(self.samples) < _RESERVOIR:
+            self.samples.append(ms)
+        else:
+            i = random.randrange(self.count)
+            if i < _RESERVOIR:
+                self.samples[i] = ms
+
+    def to_dict(self, root_total_ms: float) -> dict:
+        s = sorted(self.samples)
+        p95 = s[min(len(s) - 1, int(len(s) * 0.95))] if s else 0.0
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p95_ms": round(p95, 3),
+            "max_ms": round(self.max_ms, 3),
+            # Share of the roots' wall time (phases may overlap or nest)
+            "share": (
+                round(self.total_ms / root_total_ms, 4) if root_total_ms else 0.0
+            ),
+        }
+
+
+# root name → phase name → stats; the root itself is kept under "total"
+_stats: Dict[str, Dict[str, PhaseStats]] = {}
+
+
+def _finish(t: Trace) -> None:
+    root = t.spans[-1]
+    phases = _stats.setdefault(root.name, {})
+    for sp in t.spans:
+        key = "total" if sp is root else sp.name
+        st = phases.get(key)
+        if st is None:
+            st = phases[key] = PhaseStats()
+        st.add(sp.duration_ms, sp.error is not None)
+    _writer.put(t)
+
+
+def summary() -> dict:
+    out = {}
+    for root, phases in _stats.items():
+        total = phases.get("total")
+        total_ms = total.total_ms if total else 0.0
+        out[root] = {
+            name: st.to_dict(total_ms)
+            for name, st in sorted(phases.items(), key=lambda kv: -kv[1].total_ms)
+        }
+    return {
+        "sample_rate": _sample_rate,
+        "file": TRACE_FILE,
+        "written": _writer.written,
+        "dropped": _writer.dropped,
+        "roots": out,
+    }
+
+
+def reset() -> None:
+    _stats.clear()
+
+
+def to_otlp(t: Trace) -> dict:
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": [_otlp_attr("service.name", SERVICE_NAME)]},
+                "scopeSpans": [
+                    {
+                        "scope": {"name": __name__},
+                        "spans": [sp.to_otlp() for sp in t.spans],
+                    }
+                ],
+            }
+        ]
+    }
+
+
+class _Writer:
+    """Appends finished traces to TRACE_FILE from a daemon thread; serialization
+    and file I/O stay off the event loop."""
+
+    # Traces waiting for the writer; beyond this new ones are dropped
+    MAX_PENDING = 10000
+
+    def __init__(self):
+        self._queue: "queue.Queue[Trace]" = queue.Queue(self.MAX_PENDING)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+
+    def put(self, t: Trace) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name="trace-writer", daemon=True
+                    )
+                    self._thread.start()
+        try:
+            self._queue.put_nowait(t)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        f = path = None
+        while True:
+            t = self._queue.get()
+            try:
+                if f is None or path != TRACE_FILE:
+                    if f is not None:
+                        f.close()
+                    path = TRACE_FILE
+                    f = open(path, "a", encoding="utf-8")
+                f.write(json.dumps(to_otlp(t), ensure_ascii=False) + "\n")
+                self.written += 1
+                if self._queue.empty():
+                    f.flush()
+            except Exception as e:  # noqa: BLE001
+                self.dropped += 1
+                backend_logger.error(f"[TRACE] Не удалось записать трейс: {e}")
+            finally:
+                self._queue.task_done()
+
+    def flush(self) -> None:
+        """Block until queued traces are written (tests, shutdown)."""
+        if self._thread is not None:
+            self._queue.join()
+
+
+_writer = _Writer()
+
+
+def flush() -> None:
+    _writer.flush()
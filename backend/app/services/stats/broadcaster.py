@@ -0,0 +1,147 @@
+"""Shared producer for the progress SSE stream.
+
+One background task per process computes the snapshot once per tick and fans
+it out to every subscriber through a bounded queue. Subscribers get the full
+snapshot first (`stats` event), then only changed fields (`delta` event). A
+client whose queue is full is dropped instead of blocking the producer; its
+EventSource reconnects and starts again from a full snapshot. With no
+subscribers the task exits, so no DB work is done.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+from app.logging_config import backend_logger
+
+MIN_INTERVAL = 0.25
+
+
+def _queue_size() -> int:
+    return max(1, int(os.getenv("PROGRESS_QUEUE_SIZE", "16")))
+
+
+def _ping_interval() -> float:
+    return float(os.getenv("PROGRESS_PING_INTERVAL", "15"))
+
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def diff(old: dict, new: dict) -> dict:
+    """Changed fields of `new` against `old`; nested dicts are diffed recursively,
+    removed keys are sent as null.
+    """
+    out: dict = {}
+    for k, v in new.items():
+        if k not in old:
+            out[k] = v
+        elif old[k] != v:
+            prev = old[k]
+            out[k] = (
+                diff(prev, v) if isinstance(v, dict) and isinstance(prev, dict) else v
+            )
+    for k in old.keys() - new.keys():
+        out[k] = None
+    return out
+
+
+class _Subscriber:
+    __slots__ = ("queue", "interval")
+
+    def __init__(self, queue: asyncio.Queue, interval: float):
+        self.queue = queue
+        self.interval = interval
+
+
+class ProgressBroadcaster:
+    def __init__(self, snapshot: Callable[[], Awaitable[dict]]):
+        self._snapshot = snapshot
+        self._subs: set[_Subscriber] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._last: Optional[dict] = None
+        self._last_event: Optional[str] = None
+        self.ticks = 0
+        self.dropped = 0
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subs)
+
+    def subscribe(self, interval: float = 2.0) -> _Subscriber:
+        sub = _Subscriber(
+            asyncio.Queue(maxsize=_queue_size()), max(MIN_INTERVAL, float(interval))
+        )
+        self._subs.add(sub)
+        if self._last_event is not None:
+            # Deltas that follow are relative to this snapshot
+            sub.queue.put_nowait(self._last_event)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return sub
+
+    def unsubscribe(self, sub: _Subscriber) -> None:
+        self._subs.discard(sub)
+
+    async def stream(self, interval: float = 2.0) -> AsyncIterator[str]:
+        """SSE chunks for one client; ends when the client is dropped as too slow."""
+        sub = self.subscribe(interval)
+        try:
+            while True:
+                chunk = await sub.queue.get()
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            self.unsubscribe(sub)
+
+    def _publish(self, chunk: str) -> None:
+        for sub in list(self._subs):
+            try:
+                sub.queue.put_nowait(chunk)
+            except asyncio.QueueFull:
+                self._drop(sub)
+
+    def _drop(self, sub: _Subscriber) -> None:
+        self._subs.discard(sub)
+        self.dropped += 1
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+        sub.queue.put_nowait(None)
+        backend_logger.warning("SSE: медленный клиент отключён (очередь переполнена)")
+
+    async def _run(self) -> None:
+        idle = 0.0
+        try:
+            while self._subs:
+                self.ticks += 1
+                try:
+                    snap = await self._snapshot()
+                except Exception as e:  # noqa: BLE001
+                    # Keep streams alive; the next tick retries
+                    self._publish(sse_event("error", {"error": str(e)}))
+                else:
+                    event = sse_event("stats", snap)
+                    if self._last is None:
+                        self._publish(event)
+                    else:
+                        delta = diff(self._last, snap)
+                        if delta:
+                            self._publish(sse_event("delta", delta))
+                            idle = 0.0
+                        elif idle >= _ping_interval():
+                            # Comment line: keeps proxies from closing an idle stream
+                            self._publish(": ping\n\n")
+                            idle = 0.0
+                    self._last, self._last_event = snap, event
+                if not self._subs:
+                    break
+                interval = min(s.interval for s in self._subs)
+                await asyncio.sleep(interval)
+                idle += interval
+        finally:
+            self._last = self._last_event = None
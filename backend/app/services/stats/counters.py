@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+from typing import Iterable
+
+from sqlalchemy import delete, func, select, text
+
+from app.logging_config import backend_logger
+from app.models.base import SessionLocal
+from app.models.entity_counter import EntityCounter
+from app.models.status_enum import MappingStatus
+
+# Fixed order of statuses for tables/matrices in API responses
+STATUSES_ORDER = [
+    s.value
+    for s in (
+        MappingStatus.pending,
+        MappingStatus.skipped,
+        MappingStatus.failed,
+        MappingStatus.success,
+    )
+]
+
+
+def _status_str(status) -> str:
+    return str(status.value if hasattr(status, "value") else status)
+
+
+def summarize_counter_rows(rows: Iterable[tuple]) -> dict:
+    """Build the /stats/mappings payload from (entity_type, status, count) rows.
+    Rows with zero count are ignored (counters keep them after status transitions).
+    """
+    by_type: dict[str, int] = {}
+    by_status: dict[str, int] = {}
+    cells: list[tuple[str, str, int]] = []
+    for etype, status, cnt in rows:
+        cnt = int(cnt or 0)
+        if cnt <= 0:
+            continue
+        st = _status_str(status)
+        by_type[etype] = by_type.get(etype, 0) + cnt
+        by_status[st] = by_status.get(st, 0) + cnt
+        cells.append((etype, st, cnt))
+
+    all_types = sorted(by_type.keys())
+    matrix: dict[str, dict[str, int]] = {
+        t: {st: 0 for st in STATUSES_ORDER} for t in all_types
+    }
+    for etype, st, cnt in cells:
+        matrix[etype][st] = matrix[etype].get(st, 0) + cnt
+
+    totals_row = {st: 0 for st in STATUSES_ORDER}
+    for t in all_types:
+        for st in STATUSES_ORDER:
+            totals_row[st] += matrix[t][st]
+
+    return {
+        "total": sum(by_type.values()),
+        "by_type": by_type,
+        "by_status": by_status,
+        "statuses": STATUSES_ORDER,
+        "types": all_types,
+        "matrix": matrix,
+        "totals_row": totals_row,
+    }
+
+
+async def fetch_mapping_matrix(session) -> dict:
+    """Counts of all entities by type and status, read from entity_counters."""
+    q = await session.execute(
+        select(
+            EntityCounter.entity_type,
+            EntityCounter.status,
+            func.sum(EntityCounter.count),
+        ).group_by(EntityCounter.entity_type, EntityCounter.status)
+    )
+    return summarize_counter_rows(q.all())
+
+
+async def fetch_job_counts(session, job_ids: list[int]) -> dict[int, dict]:
+    """Per-job counts: {job_id: {entity_type: {status: count}}} in a single query."""
+    out: dict[int, dict] = {int(j): {} for j in job_ids}
+    if not job_ids:
+        return out
+    q = await session.execute(
+        select(
+            EntityCounter.job_id,
+            EntityCounter.entity_type,
+            EntityCounter.status,
+            EntityCounter.count,
+        ).where(EntityCounter.job_id.in_([int(j) for j in job_ids]))
+    )
+    for job_id, etype, status, cnt in q.all():
+        per_type = out.setdefault(int(job_id), {}).setdefault(etype, {})
+        per_type[_status_str(status)] = int(cnt or 0)
+    return out
+
+
+async def rebuild_entity_counters(job_id: int | None = None) -> int:
+    """Recompute entity_counters from entities (all rows or a single job; job_id=0 — global rows).
+    Holds an EXCLUSIVE lock on entity_counters for the duration: concurrent writers
+    wait on their trigger upserts and apply their deltas on top of the rebuilt values.
+    Returns the number of counter rows written.
+    """
+    async with SessionLocal() as session:
+        await session.execute(text("LOCK TABLE entity_counters IN EXCLUSIVE MODE"))
+        if job_id is None:
+            await session.execute(delete(EntityCounter))
+            res = await session.execute(
+                text(
+                    """
+                    INSERT INTO entity_counters (job_id, entity_type, status, count)
+                    SELECT COALESCE(job_id, 0), entity_type, status, count(*)
+                    FROM entities
+                    GROUP BY 1, 2, 3
+                    """
+                )
+            )
+        else:
+            await session.execute(
+                delete(EntityCounter).where(EntityCounter.job_id == int(job_id))
+            )
+            res = await session.execute(
+                text(
+                    """
+                    INSERT INTO entity_counters (job_id, entity_type, status, count)
+                    SELECT COALESCE(job_id, 0), entity_type, status, count(*)
+                    FROM entities
+                    WHERE COALESCE(job_id, 0) = :job_id
+                    GROUP BY 1, 2, 3
+                    """
+                ),
+                {"job_id": int(job_id)},
+            )
+        await session.commit()
+    written = int(res.rowcount or 0)
+    backend_logger.info(
+        f"Счётчики сущностей пересчитаны (job_id={job_id if job_id is not None else 'all'}): {written} строк"
+    )
+    return written
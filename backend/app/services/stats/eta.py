@@ -0,0 +1,145 @@
+"""Export ETA from observed throughput.
+
+Exporters report every finished entity (`record`, called from set_status);
+per entity type an exponentially weighted rate is kept, folded every
+`window` seconds with a time-based weight (time constant `tau`), so idle
+periods pull the rate down. The ETA of a job combines the remaining (pending)
+counts from entity_counters with the export order: the current type and every
+type after it. Rates are per process and shared by all jobs, since a type is
+exported for all jobs at once.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import time
+from typing import Callable, Dict, Optional
+
+from app.models.status_enum import MappingStatus
+from app.utils.filters import JOB_SCOPED_TYPES
+
+
+def _tau() -> float:
+    return float(os.getenv("ETA_RATE_TAU", "60"))
+
+
+def _window() -> float:
+    return float(os.getenv("ETA_RATE_WINDOW", "5"))
+
+
+class RateEstimator:
+    def __init__(
+        self,
+        tau: Optional[float] = None,
+        window: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.tau = tau if tau is not None else _tau()
+        self.window = window if window is not None else _window()
+        self._clock = clock
+        self._pending: Dict[str, int] = {}
+        self._since: Dict[str, float] = {}
+        self._rate: Dict[str, float] = {}
+
+    def record(self, entity_type: str, n: int = 1) -> None:
+        now = self._clock()
+        self._since.setdefault(entity_type, now)
+        self._pending[entity_type] = self._pending.get(entity_type, 0) + n
+        self._fold(entity_type, now)
+
+    def _fold(self, entity_type: str, now: float, idle: bool = False) -> None:
+        since = self._since.get(entity_type)
+        if since is None:
+            return
+        dt = now - since
+        if dt < self.window or (not idle and not self._pending.get(entity_type)):
+            return
+        inst = self._pending.pop(entity_type, 0) / dt
+        prev = self._rate.get(entity_type)
+        if prev is None:
+            self._rate[entity_type] = inst
+        else:
+            alpha = 1 - math.exp(-dt / self.tau)
+            self._rate[entity_type] = prev + alpha * (inst - prev)
+        self._since[entity_type] = now
+
+    def rate(self, entity_type: str, idle: bool = False) -> Optional[float]:
+        """Entities per second, None until one window has been observed.
+        With `idle` (the type is being exported now) a window without progress
+        counts as zero throughput; otherwise the last rate is kept as is.
+        """
+        self._fold(entity_type, self._clock(), idle)
+        return self._rate.get(entity_type)
+
+    def rates(self) -> Dict[str, float]:
+        now = self._clock()
+        for t in list(self._since):
+            self._fold(t, now)
+        return {t: round(r, 3) for t, r in self._rate.items()}
+
+    def reset(self) -> None:
+        self._pending.clear()
+        self._since.clear()
+        self._rate.clear()
+
+
+rates = RateEstimator()
+# Type being exported right now (set by the export orchestrator's type barrier)
+_export_type: Optional[str] = None
+
+
+def record(entity_type: str, n: int = 1) -> None:
+    rates.record(entity_type, n)
+
+
+def set_export_type(entity_type: Optional[str]) -> None:
+    global _export_type
+    _export_type = entity_type
+
+
+def export_type() -> Optional[str]:
+    return _export_type
+
+
+def _pending(counts: dict, entity_type: str) -> int:
+    return int((counts.get(entity_type) or {}).get(MappingStatus.pending.value, 0))
+
+
+def estimate(
+    job_counts: dict,
+    global_counts: dict,
+    current_type: Optional[str] = None,
+    estimator: Optional[RateEstimator] = None,
+) -> dict:
+    """ETA of a job's export: remaining = pending of `current_type` and of every
+    later type in EXPORT_ORDER (global types counted from job_id 0 rows).
+    `eta_seconds` is None while some remaining type has no observed rate.
+    """
+    from app.services.export.orchestrator import EXPORT_ORDER
+
+    est = estimator or rates
+    order = [t for t, _ in EXPORT_ORDER]
+    if current_type in order:
+        order = order[order.index(current_type) :]
+    remaining: Dict[str, int] = {}
+    for t in order:
+        # Global types are stored with job_id NULL, counted under job_id 0
+        n = _pending(job_counts if t in JOB_SCOPED_TYPES else global_counts, t)
+        if n:
+            remaining[t] = n
+    eta: Optional[float] = 0.0
+    stage_eta: Optional[float] = None
+    for t, n in remaining.items():
+        r = est.rate(t, idle=t == current_type)
+        part = n / r if r else None
+        if t == current_type:
+            stage_eta = part
+        eta = eta + part if eta is not None and part is not None else None
+    return {
+        "eta_seconds": round(eta) if eta is not None else None,
+        "stage": current_type,
+        "stage_eta_seconds": round(stage_eta) if stage_eta is not None else None,
+        "rate": est.rates().get(current_type) if current_type else None,
+        "remaining": remaining,
+    }
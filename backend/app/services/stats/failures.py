@@ -0,0 +1,66 @@
+"""Failed/skipped entities of a job grouped by normalized error signature."""
+
+from __future__ import annotations
+
+from typing import Iterable
+
+from sqlalchemy import func, select
+
+from app.models.entity import Entity
+from app.models.status_enum import MappingStatus
+from app.utils.filters import job_entities_condition
+
+
+async def fetch_failure_groups(
+    session,
+    job_id: int,
+    statuses: Iterable[MappingStatus] = (MappingStatus.failed,),
+    samples: int = 5,
+) -> list[dict]:
+    """Counts per (entity_type, status, error_signature) with the first `samples`
+    entities of each group, largest groups first. One query over the partial
+    index ix_entities_failures: window count + row_number, no second pass.
+    """
+    group = (Entity.entity_type, Entity.status, Entity.error_signature)
+    ranked = (
+        select(
+            Entity.id,
+            Entity.slack_id,
+            Entity.entity_type,
+            Entity.status,
+            Entity.error_signature,
+            Entity.error_message,
+            func.row_number().over(partition_by=group, order_by=Entity.id).label("rn"),
+            func.count().over(partition_by=group).label("cnt"),
+        )
+        .where(Entity.status.in_(list(statuses)) & job_entities_condition(job_id))
+        .subquery()
+    )
+    q = await session.execute(
+        select(ranked)
+        .where(ranked.c.rn <= max(1, samples))
+        .order_by(
+            ranked.c.cnt.desc(),
+            ranked.c.entity_type,
+            ranked.c.error_signature,
+            ranked.c.rn,
+        )
+    )
+    groups: dict[tuple, dict] = {}
+    for row in q.all():
+        status = getattr(row.status, "value", row.status)
+        key = (row.entity_type, status, row.error_signature)
+        g = groups.get(key)
+        if g is None:
+            g = groups[key] = {
+                "entity_type": row.entity_type,
+                "status": status,
+                "signature": row.error_signature,
+                "count": int(row.cnt),
+                # One raw message of the group, for context the signature drops
+                "example_error": row.error_message,
+                "samples": [],
+            }
+        if len(g["samples"]) < samples:
+            g["samples"].append({"id": int(row.id), "slack_id": row.slack_id})
+    return list(groups.values())
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import re
+from typing import Optional
+
+# Longest signature stored; the tail of long plugin responses adds no grouping value
+SIGNATURE_MAX = 256
+
+_URL = re.compile(r"\b(?:https?|wss?)://[^\s'\"<>]+")
+_EMAIL = re.compile(r"\b[\w.+-]+@[\w-]+(?:\.[\w-]+)+\b")
+_UUID = re.compile(
+    r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"
+)
+# Slack message ts, alone or as the head of composite ids (<ts>_<name>_<user>)
+_SLACK_TS = re.compile(r"\b\d{9,10}\.\d{6}(?:_\S+)?")
+_MM_ID = re.compile(r"\b[a-z0-9]{26}\b")
+# At least one digit: plain upper-case words (FORBIDDEN, CONFLICT) are not ids
+_SLACK_ID = re.compile(r"\b[UWCGDFTBSE](?=[A-Z0-9]*\d)[A-Z0-9]{7,}\b")
+_HEX = re.compile(r"\b[0-9a-fA-F]{16,}\b")
+# HTTP status codes after "failed: " / "HTTP " are kept: they split groups usefully
+_NUMBER = re.compile(r"(?<![\w<])(?<!failed: )(?<!HTTP )-?\d+(?:\.\d+)?")
+_SPACE = re.compile(r"\s+")
+
+
+def error_signature(message: Optional[str]) -> Optional[str]:
+    """
+    Normalize an entity error message into a grouping key:
+    URLs, e-mails, ids (Mattermost, Slack, UUID, hex), Slack timestamps and numbers
+    are replaced with placeholders, whitespace is collapsed.
+    "Plugin import failed: 500 {'id': 'abc…', 'request_id': 'x9…'}" and the same
+    error for another post give the same signature. Returns None for empty input.
+    """
+    if not message:
+        return None
+    s = _URL.sub("<url>", str(message))
+    s = _EMAIL.sub("<email>", s)
+    s = _UUID.sub("<id>", s)
+    s = _SLACK_TS.sub("<ts>", s)
+    s = _MM_ID.sub("<id>", s)
+    s = _SLACK_ID.sub("<id>", s)
+    s = _HEX.sub("<id>", s)
+    s = _NUMBER.sub("<n>", s)
+    s = _SPACE.sub(" ", s).strip()
+    return s[:SIGNATURE_MAX]
@@ -2,6 +2,9 @@ from __future__ import annotations
 from sqlalchemy import and_, or_
 from app.models.entity import Entity
 
+# Types stored per import job; the rest (user, channel, custom_emoji) are global (job_id NULL)
+JOB_SCOPED_TYPES = ("message", "reaction", "attachment")
+
 
 def job_scoped_condition(base_cond, entity_type: str, job_id):
     """
@@ -9,9 +12,17 @@ def job_scoped_condition(base_cond, entity_type: str, job_id):
     - For job-specific types (message, reaction, attachment): restrict to the given job_id (or NULL if not provided).
     - For global types (user, channel, custom_emoji): do not constrain by job_id (to pick up legacy/global rows).
     """
-    if entity_type in ("message", "reaction", "attachment"):
+    if entity_type in JOB_SCOPED_TYPES:
         if job_id is not None:
             return and_(base_cond, Entity.job_id == job_id)
         else:
             return and_(base_cond, Entity.job_id.is_(None))
     return base_cond
+
+
+def job_entities_condition(job_id: int):
+    """Entities belonging to a job's export: its job-scoped rows plus global rows."""
+    return or_(
+        and_(Entity.job_id == job_id, Entity.entity_type.in_(JOB_SCOPED_TYPES)),
+        and_(Entity.job_id.is_(None), Entity.entity_type.notin_(JOB_SCOPED_TYPES)),
+    )
@@ -0,0 +1,180 @@
+"""JSON baselines for benchmarks and regression comparison.
+
+A baseline is any JSON document; numeric leaves are flattened to dotted keys
+(`stages.messages.wall_s`). Whether a metric regresses when it grows or when it
+shrinks is derived from the key suffix (see `_DIRECTIONS`); keys without a known
+suffix are informational and never fail a comparison.
+"""
+
+from __future__ import annotations
+
+import fnmatch
+import json
+import os
+import subprocess
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
+
+# (suffix, +1 — bigger is worse, -1 — smaller is worse)
+_DIRECTIONS: list[tuple[str, int]] = [
+    ("per_s", -1),
+    ("per_entity", 1),
+    ("wall_s", 1),
+    ("wall_ms", 1),
+    ("db_time_ms", 1),
+    ("queries", 1),
+    ("peak_rss_mb", 1),
+    ("us_per_op", 1),
+]
+
+DEFAULT_THRESHOLD = 0.10
+
+
+def direction(key: str) -> int:
+    last = key.rsplit(".", 1)[-1]
+    for suffix, sign in _DIRECTIONS:
+        if last.endswith(suffix):
+            return sign
+    return 0
+
+
+def flatten(doc, prefix: str = "") -> dict[str, float]:
+    out: dict[str, float] = {}
+    if isinstance(doc, dict):
+        for k, v in doc.items():
+            out.update(flatten(v, f"{prefix}{k}."))
+    elif isinstance(doc, (int, float)) and not isinstance(doc, bool):
+        out[prefix[:-1]] = float(doc)
+    return out
+
+
+def metadata() -> dict:
+    """Common header: timestamp, git revision, host."""
+    try:
+        rev = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            timeout=5,
+        ).stdout.strip()
+    except Exception:
+        rev = ""
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_rev": rev or None,
+        "host": os.uname().nodename if hasattr(os, "uname") else None,
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def save(path: str, doc: dict) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(doc, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+def load(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@dataclass
+class Regression:
+    key: str
+    baseline: float
+    current: float
+    change: float  # relative, signed so that > 0 is worse
+    threshold: float
+
+    def __str__(self) -> str:
+        return (
+            f"{self.key}: {self.baseline:g} → {self.current:g} "
+            f"({self.change * 100:+.1f}% хуже, порог {self.threshold * 100:.0f}%)"
+        )
+
+
+def parse_thresholds(items: list[str]) -> dict[str, float]:
+    """`pattern=0.2` pairs (fnmatch patterns over dotted keys)."""
+    out: dict[str, float] = {}
+    for item in items:
+        pattern, _, value = item.partition("=")
+        if not value:
+            raise ValueError(f"ожидается PATTERN=FRACTION, получено {item!r}")
+        out[pattern] = float(value)
+    return out
+
+
+def compare(
+    baseline: dict,
+    current: dict,
+    default_threshold: float = DEFAULT_THRESHOLD,
+    thresholds: Optional[dict[str, float]] = None,
+    min_value: float = 0.0,
+) -> list[Regression]:
+    """Metrics present in both documents that got worse by more than the threshold.
+    The first matching pattern in `thresholds` wins; a negative threshold ignores the key.
+    Baseline values with abs() <= min_value are skipped (noise on tiny numbers).
+    """
+    thresholds = thresholds or {}
+    base, cur = flatten(baseline), flatten(current)
+    out: list[Regression] = []
+    for key in sorted(base.keys() & cur.keys()):
+        sign = direction(key)
+        if sign == 0:
+            continue
+        limit = default_threshold
+        for pattern, value in thresholds.items():
+            if fnmatch.fnmatchcase(key, pattern):
+                limit = value
+                break
+        if limit < 0:
+            continue
+        b, c = base[key], cur[key]
+        if abs(b) <= min_value:
+            continue
+        change = sign * (c - b) / abs(b)
+        if change > limit:
+            out.append(Regression(key, b, c, change, limit))
+    return out
+
+
+def add_compare_args(p) -> None:
+    p.add_argument("baseline")
+    p.add_argument("current")
+    p.add_argument(
+        "--max-regression",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="допустимое ухудшение по умолчанию (доля, 0.1 = 10%%)",
+    )
+    p.add_argument(
+        "--threshold",
+        action="append",
+        default=[],
+        help="порог для ключей по маске, например 'stages.*.wall_s=0.25' (-1 — игнорировать)",
+    )
+    p.add_argument(
+        "--min-value",
+        type=float,
+        default=0.0,
+        help="не сравнивать метрики, у которых в baseline |значение| не больше этого",
+    )
+
+
+def run_compare(args) -> int:
+    """CLI entry: print regressions, return the process exit code."""
+    regressions = compare(
+        load(args.baseline),
+        load(args.current),
+        args.max_regression,
+        parse_thresholds(args.threshold),
+        args.min_value,
+    )
+    if not regressions:
+        print("OK: регрессий нет")
+        return 0
+    print(f"Регрессии ({len(regressions)}):")
+    for r in regressions:
+        print(f"  {r}")
+    return 1
@@ -0,0 +1,500 @@
+"""Micro-benchmarks of per-entity hot paths (message rendering, emoji names, ts parsing).
+
+Standalone timing (no pytest-benchmark dependency): every case is run on a fixed
+corpus, the iteration count is calibrated to `--min-time` and the best of
+`--repeat` rounds is reported as µs per item. Name lookups are served from
+pre-filled MessageExporter caches, so no database is needed.
+
+    python -m bench.micro_bench run --out bench/results/micro.json
+    python -m bench.micro_bench run --filter 'build_message_text/*'
+    python -m bench.micro_bench compare bench/results/micro-base.json bench/results/micro.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import fnmatch
+import inspect
+import sys
+import time
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any, Callable, Optional
+
+from bench import baseline
+
+USERS = {f"U{i:08X}": f"user{i}" for i in range(50)}
+CHANNELS = {f"C{i:08X}": f"channel-{i}" for i in range(20)}
+_U = list(USERS)
+_C = list(CHANNELS)
+
+
+def _plain() -> list[dict]:
+    words = "deploy finished on staging, please check the dashboards before the release"
+    return [
+        {"ts": f"1700000{i:03d}.000100", "text": f"{words} #{i}"} for i in range(50)
+    ]
+
+
+def _mentions() -> list[dict]:
+    out = []
+    for i in range(50):
+        users = " ".join(f"<@{_U[(i + k) % len(_U)]}>" for k in range(6))
+        chans = " ".join(
+            f"<#{_C[(i + k) % len(_C)]}|{CHANNELS[_C[(i + k) % len(_C)]]}>"
+            for k in range(2)
+        )
+        text = (
+            f"<!here> {users} посмотрите {chans}, "
+            f"<https://grafana.example.com/d/{i}|dashboard> и <https://example.com/{i}>"
+        )
+        out.append({"ts": f"1700001{i:03d}.000100", "text": text})
+    return out
+
+
+def _rich_section(i: int) -> dict:
+    return {
+        "type": "rich_text_section",
+        "elements": [
+            {"type": "text", "text": f"Релиз {i}: "},
+            {"type": "user", "user_id": _U[i % len(_U)]},
+            {"type": "text", "text": " собрал ", "style": {"bold": True}},
+            {"type": "channel", "channel_id": _C[i % len(_C)]},
+            {"type": "emoji", "name": "rocket"},
+            {"type": "link", "url": f"https://ci.example.com/{i}", "text": "CI"},
+            {"type": "text", "text": "make test", "style": {"code": True}},
+        ],
+    }
+
+
+def _rich_nested() -> list[dict]:
+    out = []
+    for i in range(30):
+        elements = [
+            _rich_section(i),
+            {
+                "type": "rich_text_list",
+                "style": "bullet",
+                "elements": [_rich_section(i + k) for k in range(4)],
+            },
+            {
+                "type": "rich_text_list",
+                "style": "ordered",
+                "indent": 1,
+                "elements": [_rich_section(i + k) for k in range(3)],
+            },
+            {
+                "type": "rich_text_quote",
+                "elements": _rich_section(i)["elements"]
+                + [{"type": "rich_text_line_break"}]
+                + _rich_section(i + 1)["elements"],
+            },
+            {
+                "type": "rich_text_preformatted",
+                "elements": [{"type": "text", "text": "SELECT * FROM entities;\n"}],
+            },
+        ]
+        out.append(
+            {
+                "ts": f"1700002{i:03d}.000100",
+                "text": "fallback",
+                "blocks": [
+                    {"type": "rich_text", "block_id": "b", "elements": elements}
+                ],
+            }
+        )
+    return out
+
+
+def _alertmanager() -> list[dict]:
+    out = []
+    for i in range(30):
+        out.append(
+            {
+                "ts": f"1700003{i:03d}.000100",
+                "text": "",
+                "subtype": "bot_message",
+                "attachments": [
+                    {
+                        "color": "danger",
+                        "pretext": f"<!channel> alert group {i}",
+                        "title": f"[FIRING:{i % 5 + 1}] HighLatency api-{i}",
+                        "title_link": f"https://alerts.example.com/#/alerts?g={i}",
+                        "text": (
+                            "*Alert:* p99 latency above threshold - `critical`\n"
+                            "*Description:* <https://runbooks.example.com/latency|runbook>\n"
+                            f"*Details:*\n • *alertname:* `HighLatency`\n • *instance:* `api-{i}:9090`"
+                        ),
+                        "fallback": f"[FIRING] HighLatency api-{i}",
+                        "actions": [
+                            {
+                                "text": "Silence",
+                                "url": "https://alerts.example.com/silence",
+                            },
+                            {"text": "Runbook", "url": "https://runbooks.example.com"},
+                        ],
+                    }
+                    for _ in range(2)
+                ],
+            }
+        )
+    return out
+
+
+def _subteam() -> list[dict]:
+    out = []
+    for i in range(50):
+        sid = f"S{i % 5:08X}"
+        text = (
+            f"<!subteam^{sid}|@oncall-{i % 5}> и <!subteam^S{(i + 1) % 5:08X}|@team-{(i + 1) % 5}> "
+            f"<@{_U[i % len(_U)]}> взгляните, @oncall-{i % 5} тоже"
+        )
+        out.append(
+            {
+                "ts": f"1700004{i:03d}.000100",
+                "text": text,
+                "blocks": [
+                    {
+                        "type": "rich_text",
+                        "elements": [
+                            {
+                                "type": "rich_text_section",
+                                "elements": [
+                                    {"type": "usergroup", "usergroup_id": sid},
+                                    {"type": "text", "text": " взгляните "},
+                                    {"type": "user", "user_id": _U[i % len(_U)]},
+                                ],
+                            }
+                        ],
+                    }
+                ],
+            }
+        )
+    return out
+
+
+CORPORA: dict[str, Callable[[], list[dict]]] = {
+    "plain": _plain,
+    "mentions": _mentions,
+    "rich_nested": _rich_nested,
+    "alertmanager": _alertmanager,
+    "subteam": _subteam,
+}
+
+EMOJI_NAMES = [
+    "ёлка",
+    "привет_мир",
+    "щука-2",
+    "party_parrot",
+    "хорошо",
+    "Большой_Палец",
+    "thumbsup_all",
+    "кот_в_сапогах",
+]
+SLACK_IDS = (
+    [f"1700000{i:03d}.{i:06d}" for i in range(40)]
+    + [f"1700000{i:03d}.000100_+1_{_U[i % len(_U)]}" for i in range(40)]
+    + [None, "not-a-ts", 1700000000.5]
+)
+
+
+def _exporter():
+    from app.services.export.message_exporter import MessageExporter
+
+    entity = SimpleNamespace(
+        entity_type="message", slack_id="0", raw_data={}, job_id=None
+    )
+    caches = {
+        "username_by_slack_id": dict(USERS),
+        "channel_name_by_slack_id": dict(CHANNELS),
+    }
+    return MessageExporter(entity, caches=caches)
+
+
+def _log_entities() -> list[SimpleNamespace]:
+    return [
+        SimpleNamespace(
+            entity_type="message",
+            slack_id=f"1700000{i:03d}.000100",
+            mattermost_id=None,
+            status="pending",
+        )
+        for i in range(50)
+    ]
+
+
+def _responses() -> list[SimpleNamespace]:
+    body = '{"id":"abcdefghijklmnopqrstuvwxyz","message":"' + "x" * 20000 + '"}'
+    return [SimpleNamespace(status_code=200, text=body) for _ in range(20)]
+
+
+class _SlowStream:
+    """stdout behind a busy pipe (container log driver): every write waits."""
+
+    def __init__(self, delay: float = 50e-6):
+        self.delay = delay
+
+    def write(self, s: str) -> int:
+        time.sleep(self.delay)
+        return len(s)
+
+    def flush(self) -> None:
+        pass
+
+
+def _bench_loggers():
+    """Loggers over a slow stream: synchronous handler vs the app's queue pipeline."""
+    import logging
+    import logging.handlers
+    import queue
+
+    from app.logging_config import LOG_FORMAT, LazyQueueHandler
+
+    stream = logging.StreamHandler(_SlowStream())
+    stream.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    sync = logging.getLogger("bench.log.sync")
+    sync.handlers = [stream]
+    sync.propagate = False
+    sync.setLevel(logging.INFO)
+
+    # Daemon listener, not stopped: a backlog left at exit is simply dropped
+    q = queue.SimpleQueue()
+    logging.handlers.QueueListener(q, stream).start()
+    queued = logging.getLogger("bench.log.queue")
+    queued.handlers = [LazyQueueHandler(q)]
+    queued.propagate = False
+    queued.setLevel(logging.INFO)
+
+    verbose = logging.getLogger("bench.log.debug")
+    verbose.handlers = [LazyQueueHandler(q)]
+    verbose.propagate = False
+    verbose.setLevel(logging.DEBUG)
+    return sync, queued, verbose
+
+
+def _log_cases() -> list["Case"]:
+    from app.services.export.mm_api_mixin import _body_preview
+
+    sync, queued, verbose = _bench_loggers()
+    entities = _log_entities()
+    responses = _responses()
+
+    def fstring_disabled(e):
+        # Pre-change BaseMapping.__init__: message built even though DEBUG is off
+        queued.debug(
+            f"Инициализация маппинга: {e.entity_type}, slack_id={e.slack_id}, mattermost_id={e.mattermost_id}, status={e.status}"
+        )
+
+    def lazy_disabled(e):
+        queued.debug(
+            "Инициализация маппинга: %s, slack_id=%s, mattermost_id=%s, status=%s",
+            e.entity_type,
+            e.slack_id,
+            e.mattermost_id,
+            e.status,
+        )
+
+    def info(logger):
+        def emit(e):
+            logger.info("Set status %s for %s %s", "success", e.entity_type, e.slack_id)
+
+        return emit
+
+    def body_full(r):
+        verbose.debug(f"MM API GET /api/v4/posts status={r.status_code} resp={r.text}")
+
+    def body_sampled(r):
+        verbose.debug(
+            "MM API GET %s status=%s resp=%s",
+            "/api/v4/posts",
+            r.status_code,
+            _body_preview(r),
+        )
+
+    return [
+        Case("log_debug_disabled/fstring", fstring_disabled, entities),
+        Case("log_debug_disabled/lazy", lazy_disabled, entities),
+        Case("log_info/stream_sync", info(sync), entities),
+        Case("log_info/queue", info(queued), entities),
+        Case("log_response_body/full", body_full, responses),
+        Case("log_response_body/sampled", body_sampled, responses),
+    ]
+
+
+@dataclass
+class Case:
+    name: str
+    fn: Callable[[Any], Any]
+    items: list
+
+
+def build_cases() -> list[Case]:
+    from app.services.export import markdown_renderer as md
+    from app.services.export.custom_emoji_exporter import transliterate_cyrillic
+    from app.utils.time import parse_slack_ts
+
+    exp = _exporter()
+    names = md.NameTable(users=USERS, channels=CHANNELS)
+
+    async def exporter_text(raw):
+        # Full exporter path: mention scan + cache lookups + rendering
+        exp.entity.raw_data = raw
+        return md.build_message_text(raw, await exp._resolve_names(raw))
+
+    cases: list[Case] = []
+    corpora = {name: make() for name, make in CORPORA.items()}
+    for name, items in corpora.items():
+        cases.append(Case(f"build_message_text/{name}", exporter_text, items))
+        cases.append(
+            Case(
+                f"render_message/{name}",
+                lambda raw: md.render_message(raw, names),
+                items,
+            )
+        )
+    # Bot/alert channels: the same few payloads over and over
+    repeated = [
+        dict(m, ts=f"1700005{i:03d}.000100")
+        for i, m in enumerate(corpora["alertmanager"][:3] * 20)
+    ]
+
+    def cached(raw):
+        return md.render_cached(raw, names)
+
+    def uncached(raw):
+        return md.build_post_props(raw, md.render_message(raw, names))
+
+    cases.append(Case("render_uncached/alertmanager_repeated", uncached, repeated))
+    cases.append(Case("render_cached/alertmanager_repeated", cached, repeated))
+    texts = [m["text"] for m in corpora["mentions"] + corpora["subteam"]]
+    cases.append(
+        Case(
+            "slack_text_to_markdown/mentions",
+            lambda t: md.slack_text_to_markdown(t, names),
+            texts,
+        )
+    )
+    blocks = [m["blocks"] for m in corpora["rich_nested"]]
+    cases.append(
+        Case(
+            "blocks_to_markdown/rich_nested",
+            lambda b: md.blocks_to_markdown(b, names),
+            blocks,
+        )
+    )
+    elements = [el for b in blocks for el in b[0]["elements"]]
+    cases.append(
+        Case(
+            "rich_element_to_md/rich_nested",
+            lambda el: md.rich_element_to_md(el, names),
+            elements,
+        )
+    )
+    rendered = [(m, md.render_message(m, names)) for m in corpora["subteam"]]
+    cases.append(
+        Case("build_post_props/subteam", lambda p: md.build_post_props(*p), rendered)
+    )
+    cases.append(
+        Case("transliterate_cyrillic/emoji_names", transliterate_cyrillic, EMOJI_NAMES)
+    )
+    cases.append(Case("parse_slack_ts/ids", parse_slack_ts, SLACK_IDS))
+    cases += _log_cases()
+    return cases
+
+
+def _timer(fn: Callable, items: list) -> Callable[[int], Any]:
+    """Return `rounds(n)` running fn over all items n times; awaitable for async fn."""
+    if inspect.iscoroutinefunction(fn):
+
+        async def rounds_async(n: int) -> float:
+            t0 = time.perf_counter()
+            for _ in range(n):
+                for item in items:
+                    await fn(item)
+            return time.perf_counter() - t0
+
+        return rounds_async
+
+    def rounds(n: int) -> float:
+        t0 = time.perf_counter()
+        for _ in range(n):
+            for item in items:
+                fn(item)
+        return time.perf_counter() - t0
+
+    return rounds
+
+
+async def measure(case: Case, min_time: float, repeat: int) -> dict:
+    run = _timer(case.fn, case.items)
+
+    async def call(n: int) -> float:
+        res = run(n)
+        return await res if inspect.isawaitable(res) else res
+
+    await call(1)  # warm-up (imports, regex compilation, caches)
+    n = 1
+    while True:
+        elapsed = await call(n)
+        if elapsed >= min_time or n >= 1 << 20:
+            break
+        n *= 2 if elapsed < min_time / 4 else max(2, int(min_time / max(elapsed, 1e-9)))
+    best = min([elapsed] + [await call(n) for _ in range(repeat - 1)])
+    per_item = best / (n * len(case.items))
+    return {
+        "items": len(case.items),
+        "iterations": n,
+        "us_per_op": round(per_item * 1e6, 3),
+        "ops_per_s": round(1 / per_item, 1) if per_item > 0 else None,
+    }
+
+
+async def run_cases(
+    patterns: Optional[list[str]] = None, min_time: float = 0.2, repeat: int = 5
+) -> dict[str, dict]:
+    out: dict[str, dict] = {}
+    for case in build_cases():
+        if patterns and not any(fnmatch.fnmatchcase(case.name, p) for p in patterns):
+            continue
+        out[case.name] = await measure(case, min_time, max(1, repeat))
+    return out
+
+
+def cmd_run(args) -> int:
+    results = asyncio.run(run_cases(args.filter, args.min_time, args.repeat))
+    for name, r in results.items():
+        print(
+            f"  {name:<40} {r['us_per_op']:>10.2f} µs/op {r['ops_per_s']:>12.0f} op/s"
+        )
+    if args.out:
+        doc = {
+            "kind": "micro",
+            "label": args.label,
+            "meta": baseline.metadata(),
+            "config": {"min_time": args.min_time, "repeat": args.repeat},
+            "cases": results,
+        }
+        baseline.save(args.out, doc)
+        print(f"Результат записан в {args.out}")
+    return 0
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = p.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("run", help="прогнать микробенчмарки")
+    r.add_argument("--filter", action="append", help="fnmatch-маска имени кейса")
+    r.add_argument("--min-time", type=float, default=0.2, help="секунд на раунд")
+    r.add_argument("--repeat", type=int, default=5)
+    r.add_argument("--label")
+    r.add_argument("--out", help="записать JSON-baseline")
+    c = sub.add_parser("compare", help="сравнить два baseline")
+    baseline.add_compare_args(c)
+    args = p.parse_args(argv)
+    sys.exit(cmd_run(args) if args.cmd == "run" else baseline.run_compare(args))
+
+
+if __name__ == "__main__":
+    main()
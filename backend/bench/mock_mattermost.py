@@ -0,0 +1,415 @@
+"""Mock Mattermost + mm-importer plugin for local load testing.
+
+Implements the endpoints the exporters call with configurable latency, error/429
+injection and per-route request accounting. Run:
+
+    python -m bench.mock_mattermost --port 8065 --latency lognormal:2.5:0.5 --error-rate 0.01
+
+and point the backend at it with MM_URL=http://localhost:8065 MM_TOKEN=any.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+PLUGIN = "/plugins/mm-importer/api/v1"
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Latency distribution in milliseconds:
+    fixed:MS | uniform:LO:HI | exp:MEAN | lognormal:MU:SIGMA (of ln(ms)) | none.
+    """
+    kind, _, rest = (spec or "none").partition(":")
+    args = [float(x) for x in rest.split(":") if x]
+    if kind in ("none", "0", ""):
+        return lambda rng: 0.0
+    if kind == "fixed":
+        return lambda rng: args[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(args[0], args[1])
+    if kind == "exp":
+        return lambda rng: rng.expovariate(1.0 / args[0]) if args[0] > 0 else 0.0
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(args[0], args[1])
+    raise ValueError(f"unknown latency spec: {spec}")
+
+
+@dataclass
+class MockConfig:
+    latency: str = "none"
+    # Per-route overrides by short name (import, reaction, attachment, channel, users, ...)
+    route_latency: Dict[str, str] = field(default_factory=dict)
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after: float = 1.0
+    seed: int = 0
+    team_name: str = "test"
+    plugin_version: Optional[str] = None
+
+
+@dataclass
+class RouteStats:
+    count: int = 0
+    errors: int = 0
+    rate_limited: int = 0
+    latency_ms_total: float = 0.0
+    latency_ms_max: float = 0.0
+    by_status: Dict[int, int] = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "rate_limited": self.rate_limited,
+            "latency_ms_avg": (
+                round(self.latency_ms_total / self.count, 3) if self.count else 0.0
+            ),
+            "latency_ms_max": round(self.latency_ms_max, 3),
+            "by_status": {str(k): v for k, v in sorted(self.by_status.items())},
+        }
+
+
+class MockState:
+    def __init__(self, config: MockConfig):
+        self.lock = threading.Lock()
+        self.configure(config)
+
+    def configure(self, config: MockConfig) -> None:
+        with self.lock:
+            self.config = config
+            self.rng = random.Random(config.seed)
+            self.default_latency = parse_latency(config.latency)
+            self.route_latency = {
+                k: parse_latency(v) for k, v in config.route_latency.items()
+            }
+            self.reset()
+
+    def reset(self) -> None:
+        self.started = time.monotonic()
+        self.routes: Dict[str, RouteStats] = {}
+        self.users_by_username: Dict[str, str] = {}
+        self.users_by_email: Dict[str, str] = {}
+        self.emoji: Dict[str, str] = {}
+        self.channels: Dict[str, str] = {}
+        self.posts = 0
+        self.files = 0
+        self.reactions = 0
+        self.me_id = uuid.uuid4().hex[:26]
+        self.team_id = uuid.uuid4().hex[:26]
+
+    def decide(self, short: str) -> tuple[float, Optional[int]]:
+        """Latency (ms) and an injected status (429/500) or None, from the seeded RNG."""
+        with self.lock:
+            dist = self.route_latency.get(short, self.default_latency)
+            delay = max(0.0, dist(self.rng))
+            roll = self.rng.random()
+        cfg = self.config
+        if roll < cfg.rate_limit_rate:
+            return delay, 429
+        if roll < cfg.rate_limit_rate + cfg.error_rate:
+            return delay, 500
+        return delay, None
+
+    def account(self, route: str, status: int, latency_ms: float) -> None:
+        with self.lock:
+            st = self.routes.get(route)
+            if st is None:
+                st = self.routes[route] = RouteStats()
+            st.count += 1
+            st.latency_ms_total += latency_ms
+            st.latency_ms_max = max(st.latency_ms_max, latency_ms)
+            st.by_status[status] = st.by_status.get(status, 0) + 1
+            if status == 429:
+                st.rate_limited += 1
+            elif status >= 500:
+                st.errors += 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            total = sum(st.count for st in self.routes.values())
+            elapsed = time.monotonic() - self.started
+            return {
+                "elapsed_s": round(elapsed, 3),
+                "requests": total,
+                "rps": round(total / elapsed, 2) if elapsed > 0 else 0.0,
+                "created": {
+                    "users": len(self.users_by_username),
+                    "channels": len(self.channels),
+                    "emoji": len(self.emoji),
+                    "posts": self.posts,
+                    "files": self.files,
+                    "reactions": self.reactions,
+                },
+                "routes": {k: v.to_dict() for k, v in sorted(self.routes.items())},
+            }
+
+
+def _new_id() -> str:
+    return uuid.uuid4().hex[:26]
+
+
+def _short_name(path: str) -> str:
+    if path.startswith(PLUGIN):
+        return path[len(PLUGIN) + 1 :].replace("/", "_") or "plugin"
+    parts = [p for p in path.split("/") if p and not p.startswith("{")]
+    return parts[2] if len(parts) > 2 else (parts[-1] if parts else "root")
+
+
+def create_app(config: Optional[MockConfig] = None) -> FastAPI:
+    state = MockState(config or MockConfig())
+    app = FastAPI(title="Mock Mattermost")
+    app.state.mock = state
+
+    @app.middleware("http")
+    async def inject(request: Request, call_next):
+        path = request.url.path
+        if path.startswith("/__"):
+            return await call_next(request)
+        t0 = time.perf_counter()
+        delay_ms, injected = state.decide(_short_name(path))
+        if delay_ms:
+            await asyncio.sleep(delay_ms / 1000.0)
+        if injected == 429:
+            resp = JSONResponse(
+                {"id": "api.context.rate_limit", "message": "Too many requests"},
+                status_code=429,
+                headers={"Retry-After": str(state.config.retry_after)},
+            )
+        elif injected is not None:
+            resp = JSONResponse(
+                {"id": "mock.injected_error", "message": "Injected error"},
+                status_code=injected,
+            )
+        else:
+            resp = await call_next(request)
+        route = request.scope.get("route")
+        template = getattr(route, "path", path) if injected is None else path
+        state.account(
+            f"{request.method} {template}",
+            resp.status_code,
+            (time.perf_counter() - t0) * 1000.0,
+        )
+        return resp
+
+    # --- control -------------------------------------------------------
+    @app.get("/__stats")
+    async def mock_stats():
+        return state.stats()
+
+    @app.post("/__reset")
+    async def mock_reset():
+        with state.lock:
+            state.reset()
+        return {"status": "ok"}
+
+    @app.post("/__config")
+    async def mock_config(body: dict):
+        cfg = MockConfig(**{**state.config.__dict__, **body})
+        state.configure(cfg)
+        return {"status": "ok", "config": cfg.__dict__}
+
+    # --- Mattermost REST -----------------------------------------------
+    @app.get("/api/v4/users/me")
+    async def users_me():
+        return {"id": state.me_id, "username": "admin"}
+
+    @app.post("/api/v4/users")
+    async def create_user(body: dict):
+        username, email = body.get("username"), body.get("email")
+        with state.lock:
+            if email in state.users_by_email:
+                return JSONResponse(
+                    {
+                        "id": "app.user.save.email_exists.app_error",
+                        "message": "An account with that email already exists.",
+                    },
+                    status_code=400,
+                )
+            if username in state.users_by_username:
+                return JSONResponse(
+                    {
+                        "id": "app.user.save.username_exists.app_error",
+                        "message": "An account with that username already exists.",
+                    },
+                    status_code=400,
+                )
+            uid = _new_id()
+            state.users_by_username[username] = uid
+            state.users_by_email[email] = uid
+        return JSONResponse({"id": uid, "username": username}, status_code=201)
+
+    @app.get("/api/v4/users/email/{email}")
+    async def user_by_email(email: str):
+        uid = state.users_by_email.get(email)
+        if not uid:
+            return JSONResponse({"message": "not found"}, status_code=404)
+        return {"id": uid}
+
+    @app.get("/api/v4/users/username/{username}")
+    async def user_by_username(username: str):
+        uid = state.users_by_username.get(username)
+        if not uid:
+            return JSONResponse({"message": "not found"}, status_code=404)
+        return {"id": uid}
+
+    @app.post("/api/v4/users/{user_id}/image")
+    async def user_image(user_id: str, request: Request):
+        await request.body()
+        return {"status": "OK"}
+
+    @app.get("/api/v4/teams/name/{name}")
+    async def team_by_name(name: str):
+        return {"id": state.team_id, "name": name}
+
+    @app.post("/api/v4/teams/{team_id}/members")
+    async def team_member(team_id: str, body: dict):
+        return JSONResponse(
+            {"team_id": team_id, "user_id": body.get("user_id")}, status_code=201
+        )
+
+    @app.post("/api/v4/emoji")
+    async def create_emoji(request: Request):
+        form = await request.form()
+        meta = json.loads(str(form.get("emoji") or "{}"))
+        name = meta.get("name") or _new_id()
+        with state.lock:
+            if name in state.emoji:
+                return JSONResponse(
+                    {"id": "api.emoji.create.duplicate.app_error"}, status_code=400
+                )
+            state.emoji[name] = _new_id()
+        return JSONResponse({"id": state.emoji[name], "name": name}, status_code=201)
+
+    @app.get("/api/v4/emoji/name/{name}")
+    async def emoji_by_name(name: str):
+        eid = state.emoji.get(name)
+        if not eid:
+            return JSONResponse({"message": "not found"}, status_code=404)
+        return {"id": eid, "name": name}
+
+    @app.get("/api/v4/plugins")
+    async def plugins():
+        return {
+            "active": [
+                {"id": "mm-importer", "version": state.config.plugin_version or ""}
+            ],
+            "inactive": [],
+        }
+
+    # --- mm-importer plugin ----------------------------------------------
+    @app.post(f"{PLUGIN}/import")
+    async def plugin_import(body: dict):
+        if not body.get("channel_id") or not body.get("user_id"):
+            return JSONResponse({"error": "channel_id and user_id required"}, 400)
+        with state.lock:
+            state.posts += 1
+        return {"post_id": _new_id()}
+
+    @app.post(f"{PLUGIN}/reaction")
+    async def plugin_reaction(body: dict):
+        if not body.get("post_id") or not body.get("emoji_name"):
+            return JSONResponse({"error": "post_id and emoji_name required"}, 400)
+        with state.lock:
+            state.reactions += 1
+        return {"status": "ok"}
+
+    @app.post(f"{PLUGIN}/attachment")
+    async def plugin_attachment(body: dict):
+        if not body.get("content_base64"):
+            return JSONResponse({"error": "content_base64 required"}, 400)
+        with state.lock:
+            state.files += 1
+        return {"file_id": _new_id()}
+
+    @app.post(f"{PLUGIN}/attachment_multipart")
+    async def plugin_attachment_multipart(request: Request):
+        form = await request.form()
+        f = form.get("file")
+        if f is not None and hasattr(f, "read"):
+            await f.read()
+        with state.lock:
+            state.files += 1
+        return {"file_id": _new_id()}
+
+    @app.post(f"{PLUGIN}/channel")
+    async def plugin_channel(body: dict):
+        name = body.get("name") or _new_id()
+        with state.lock:
+            cid = state.channels.setdefault(name, _new_id())
+        return {"channel_id": cid}
+
+    @app.post(f"{PLUGIN}/channel/members")
+    async def plugin_channel_members(body: dict):
+        return {"added": len(body.get("user_ids") or [])}
+
+    @app.post(f"{PLUGIN}/channel/archive")
+    async def plugin_channel_archive(body: dict):
+        return {"status": "ok"}
+
+    @app.post(f"{PLUGIN}/dm")
+    async def plugin_dm(body: dict):
+        key = "dm:" + ",".join(sorted(body.get("user_ids") or []))
+        with state.lock:
+            cid = state.channels.setdefault(key, _new_id())
+        return {"channel_id": cid}
+
+    @app.post(f"{PLUGIN}/gdm")
+    async def plugin_gdm(body: dict):
+        key = "gdm:" + ",".join(sorted(body.get("user_ids") or []))
+        with state.lock:
+            cid = state.channels.setdefault(key, _new_id())
+        return {"channel_id": cid}
+
+    return app
+
+
+def _parse_route_latency(items: list[str]) -> Dict[str, str]:
+    out: Dict[str, str] = {}
+    for item in items or []:
+        name, _, spec = item.partition("=")
+        out[name] = spec
+    return out
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    import uvicorn
+
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8065)
+    p.add_argument("--latency", default="none", help="e.g. fixed:5, lognormal:2.5:0.5")
+    p.add_argument(
+        "--route-latency",
+        action="append",
+        default=[],
+        help="per-route override, e.g. import=uniform:10:40 (repeatable)",
+    )
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.add_argument("--rate-limit-rate", type=float, default=0.0)
+    p.add_argument("--retry-after", type=float, default=1.0)
+    p.add_argument("--seed", type=int, default=0)
+    args = p.parse_args(argv)
+    cfg = MockConfig(
+        latency=args.latency,
+        route_latency=_parse_route_latency(args.route_latency),
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(cfg), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
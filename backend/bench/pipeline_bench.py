@@ -0,0 +1,333 @@
+"""End-to-end pipeline benchmark: Slack archive → DB → (mock) Mattermost.
+
+Runs `orchestrate_slack_import` (which ends with `orchestrate_mm_export`) in this
+process against a generated or given archive and writes a JSON baseline with
+per-stage wall time, entities/s, DB query counts, HTTP calls per entity and
+peak RSS. `compare` fails (exit code 1) when a metric regressed past a threshold.
+
+    python -m bench.pipeline_bench run --database-url postgresql+asyncpg://... \
+        --migrate --truncate --scale small --out bench/results/small.json
+    python -m bench.pipeline_bench compare bench/results/base.json bench/results/small.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, replace
+from typing import Optional
+
+from bench import baseline
+from bench.slack_export_generator import GeneratorConfig, generate
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCALES = {
+    "tiny": GeneratorConfig(
+        users=20, channels=3, private_channels=1, dms=2, mpims=1, days=2
+    ),
+    "small": GeneratorConfig(),
+    "medium": GeneratorConfig(
+        users=300, channels=40, private_channels=5, dms=40, mpims=10, days=30
+    ),
+    "large": GeneratorConfig(
+        users=2000,
+        channels=200,
+        private_channels=20,
+        dms=200,
+        mpims=50,
+        days=90,
+        messages_per_day=100,
+    ),
+}
+
+# Import stage (job_stage name) → entity type it produces
+IMPORT_STAGES = {
+    "users": "user",
+    "channels": "channel",
+    "messages": "message",
+    "emojis": "custom_emoji",
+    "reactions": "reaction",
+    "attachments": "attachment",
+}
+GLOBAL_TYPES = ("user", "channel", "custom_emoji")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_mock(args) -> tuple[str, Optional[subprocess.Popen]]:
+    """Use --mm-url if given, otherwise spawn bench.mock_mattermost in a subprocess
+    (a separate process, so the mock does not compete with the pipeline's event loop).
+    """
+    if args.mm_url:
+        return args.mm_url.rstrip("/"), None
+    import httpx
+
+    port = _free_port()
+    cmd = [
+        sys.executable,
+        "-m",
+        "bench.mock_mattermost",
+        "--port",
+        str(port),
+        "--latency",
+        args.mock_latency,
+        "--error-rate",
+        str(args.mock_error_rate),
+        "--rate-limit-rate",
+        str(args.mock_rate_limit_rate),
+        "--seed",
+        str(args.seed),
+    ]
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{url}/__stats", timeout=1).status_code == 200:
+                return url, proc
+        except httpx.HTTPError:
+            pass
+        if proc.poll() is not None:
+            break
+        time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("mock Mattermost не запустился")
+
+
+def _migrate() -> None:
+    ini = os.getenv("ALEMBIC_INI") or os.path.join(
+        os.path.dirname(BACKEND_DIR), "alembic.ini"
+    )
+    subprocess.run(
+        ["alembic", "-c", ini, "upgrade", "head"],
+        check=True,
+        cwd=os.path.dirname(ini),
+    )
+
+
+async def _truncate() -> None:
+    from sqlalchemy import text
+
+    from app.models.base import SessionLocal
+
+    # TRUNCATE fires no INSERT/UPDATE/DELETE triggers: entity_counters is cleared explicitly;
+    # rendered_messages references entities/import_jobs and must go in the same statement
+    async with SessionLocal() as s:
+        await s.execute(
+            text(
+                "TRUNCATE rendered_messages, entity_relations, entities, id_map, "
+                "entity_counters, import_jobs RESTART IDENTITY"
+            )
+        )
+        await s.commit()
+
+
+async def _entity_counts(job_id: int) -> dict[str, dict[str, int]]:
+    from sqlalchemy import func, or_, select
+
+    from app.models.base import SessionLocal
+    from app.models.entity import Entity
+
+    async with SessionLocal() as s:
+        rows = await s.execute(
+            select(Entity.entity_type, Entity.status, func.count())
+            .where(or_(Entity.job_id == job_id, Entity.entity_type.in_(GLOBAL_TYPES)))
+            .group_by(Entity.entity_type, Entity.status)
+        )
+        out: dict[str, dict[str, int]] = {}
+        for etype, status, n in rows.all():
+            status = getattr(status, "value", status)
+            out.setdefault(str(etype), {})[str(status)] = int(n)
+    return out
+
+
+async def _latest_job_id() -> int:
+    from sqlalchemy import select
+
+    from app.models.base import ControlSessionLocal
+    from app.models.import_job import ImportJob
+
+    async with ControlSessionLocal() as s:
+        res = await s.execute(select(ImportJob.id).order_by(ImportJob.id.desc()))
+        return int(res.scalars().first())
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _stage_report(stage: dict, entities: int) -> dict:
+    wall_s = stage["wall_ms"] / 1000
+    return {
+        "wall_s": round(wall_s, 3),
+        "entities": entities,
+        "entities_per_s": round(entities / wall_s, 1) if wall_s > 0 else None,
+        "queries": stage["queries"],
+        "queries_per_entity": (
+            round(stage["queries"] / entities, 2) if entities else None
+        ),
+        "db_time_ms": stage["db_time_ms"],
+        "n_plus_one": len(stage["n_plus_one"]),
+    }
+
+
+async def _run(args, archive: str, mm_url: str) -> dict:
+    # App modules read DATABASE_URL / MM_URL at import time
+    from app.models.base import ENGINES
+    from app.services.backup.orchestrator import orchestrate_slack_import
+    from app.services.monitoring import query_stats
+    import httpx
+
+    if args.truncate:
+        await _truncate()
+    query_stats.install(ENGINES.values())
+    query_stats.reset()
+    httpx.post(f"{mm_url}/__reset", timeout=5)
+
+    t0 = time.perf_counter()
+    await orchestrate_slack_import(archive)
+    wall_s = time.perf_counter() - t0
+
+    job_id = await _latest_job_id()
+    counts = await _entity_counts(job_id)
+    snap = query_stats.snapshot(job_id=job_id, top=None)
+    mock = httpx.get(f"{mm_url}/__stats", timeout=5).json()
+
+    stages: dict[str, dict] = {}
+    for st in snap["finished"]:
+        name = st["stage"]
+        if name in IMPORT_STAGES:
+            n = sum(counts.get(IMPORT_STAGES[name], {}).values())
+        elif name and name.startswith("export:"):
+            n = counts.get(name.split(":", 1)[1], {}).get("success", 0)
+        else:
+            n = st["entities"]
+        stages[name] = _stage_report(st, n)
+
+    exported = sum(c.get("success", 0) for c in counts.values())
+    requests = int(mock.get("requests", 0))
+    return {
+        "job_id": job_id,
+        "wall_s": round(wall_s, 3),
+        "peak_rss_mb": _peak_rss_mb(),
+        "stages": stages,
+        "entities": counts,
+        "http": {
+            "requests": requests,
+            "requests_per_entity": round(requests / exported, 3) if exported else None,
+            "routes": {
+                name: r.get("count", 0) for name, r in mock.get("routes", {}).items()
+            },
+        },
+    }
+
+
+def cmd_run(args) -> int:
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    if not os.getenv("DATABASE_URL", "").startswith("postgresql"):
+        print(
+            "Нужен PostgreSQL (--database-url / DATABASE_URL): пайплайн обновляет "
+            "ImportJob.meta jsonb-выражениями",
+            file=sys.stderr,
+        )
+        return 2
+    if args.migrate:
+        _migrate()
+
+    cfg = replace(SCALES[args.scale], seed=args.seed)
+    tmp_dir = None
+    archive = args.archive
+    if not archive:
+        tmp_dir = tempfile.mkdtemp(prefix="bench-corpus-")
+        archive = os.path.join(tmp_dir, "corpus.zip")
+        t0 = time.perf_counter()
+        generated = generate(archive, cfg)
+        print(
+            f"Сгенерирован корпус {args.scale}: {generated['messages']} сообщений "
+            f"за {time.perf_counter() - t0:.1f}s"
+        )
+
+    mm_url, mock_proc = _start_mock(args)
+    os.environ["MM_URL"] = mm_url
+    os.environ.setdefault("MM_TOKEN", "bench")
+    try:
+        result = asyncio.run(_run(args, archive, mm_url))
+    finally:
+        if mock_proc is not None:
+            mock_proc.terminate()
+            mock_proc.wait(timeout=10)
+        if tmp_dir:
+            import shutil
+
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    doc = {
+        "kind": "pipeline",
+        "label": args.label or args.scale,
+        "meta": baseline.metadata(),
+        "config": {
+            "scale": None if args.archive else args.scale,
+            "archive": args.archive,
+            "generator": None if args.archive else asdict(cfg),
+            "mock_latency": None if args.mm_url else args.mock_latency,
+            "export_workers": os.getenv("EXPORT_WORKERS", "5"),
+        },
+        **result,
+    }
+    baseline.save(args.out, doc)
+    print(f"Результат записан в {args.out}: {result['wall_s']}s")
+    for name, st in result["stages"].items():
+        print(
+            f"  {name:<22} {st['wall_s']:>9.3f}s {st['entities']:>9} "
+            f"{st['entities_per_s'] or 0:>10.1f}/s {st['queries']:>8} запросов"
+        )
+    return 0
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = p.add_subparsers(dest="cmd", required=True)
+
+    r = sub.add_parser("run", help="прогнать пайплайн и записать baseline")
+    r.add_argument("--database-url", help="по умолчанию DATABASE_URL")
+    r.add_argument("--migrate", action="store_true", help="alembic upgrade head")
+    r.add_argument(
+        "--truncate",
+        action="store_true",
+        help="очистить entities/entity_relations/id_map/import_jobs перед прогоном",
+    )
+    r.add_argument("--archive", help="готовый архив вместо сгенерированного")
+    r.add_argument("--scale", choices=sorted(SCALES), default="small")
+    r.add_argument("--seed", type=int, default=42)
+    r.add_argument("--mm-url", help="уже запущенный Mattermost/mock вместо встроенного")
+    r.add_argument("--mock-latency", default="none")
+    r.add_argument("--mock-error-rate", type=float, default=0.0)
+    r.add_argument("--mock-rate-limit-rate", type=float, default=0.0)
+    r.add_argument("--label")
+    r.add_argument("--out", default="bench/results/pipeline.json")
+
+    c = sub.add_parser("compare", help="сравнить два baseline")
+    baseline.add_compare_args(c)
+
+    args = p.parse_args(argv)
+    code = cmd_run(args) if args.cmd == "run" else baseline.run_compare(args)
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,451 @@
+"""Synthetic Slack export generator for benchmark corpora.
+
+Writes a Slack-format archive (zip or directory): users.json, channels.json,
+groups.json, dms.json, mpims.json and per-channel daily JSON files. Messages are
+generated and written one by one, so memory does not grow with the corpus size
+(only open threads of the current channel are kept). Same seed + config → same
+archive contents.
+
+    python -m bench.slack_export_generator --out /tmp/corpus.zip --users 500 \
+        --channels 50 --days 30 --messages-per-day 200 --seed 42
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import io
+import json
+import math
+import os
+import random
+import zipfile
+from collections import deque
+from dataclasses import asdict, dataclass, fields
+from datetime import datetime, timezone
+from typing import IO, Iterator, Optional
+
+WORDS = (
+    "deploy release build alert metrics latency queue worker cache index shard "
+    "replica migration rollback incident review ticket sprint backlog merge branch "
+    "pipeline docker kubernetes node pod service ingress config secret token "
+    "database postgres query plan vacuum lock timeout retry backoff throughput "
+    "привет спасибо коллеги релиз сборка проверка готово завтра сегодня"
+).split()
+
+STANDARD_EMOJI = [
+    "+1",
+    "-1",
+    "heart",
+    "tada",
+    "eyes",
+    "white_check_mark",
+    "fire",
+    "rocket",
+    "joy",
+    "thinking_face",
+    "pray",
+    "+1::skin-tone-3",
+]
+
+MAX_MESSAGES_PER_DAY = 86400 - 1
+
+
+@dataclass
+class GeneratorConfig:
+    users: int = 50
+    channels: int = 10
+    private_channels: int = 2
+    dms: int = 10
+    mpims: int = 3
+    members_per_channel: int = 20
+    days: int = 7
+    messages_per_day: int = 50
+    thread_ratio: float = 0.1
+    thread_depth: int = 5
+    reactions_per_message: float = 0.5
+    file_ratio: float = 0.02
+    file_size: int = 2048
+    inline_files: bool = True
+    custom_emoji: int = 10
+    custom_emoji_ratio: float = 0.05
+    rich_text_ratio: float = 0.3
+    mention_ratio: float = 0.2
+    attachment_ratio: float = 0.02
+    subteams: int = 3
+    start_ts: int = 1_700_000_000
+    seed: int = 42
+
+    def __post_init__(self):
+        # ts are whole seconds within the day (microseconds hold the channel
+        # index), so a day fits at most MAX_MESSAGES_PER_DAY distinct ts
+        if not 0 <= self.messages_per_day <= MAX_MESSAGES_PER_DAY:
+            raise ValueError(
+                f"messages_per_day must be in 0..{MAX_MESSAGES_PER_DAY}, "
+                f"got {self.messages_per_day}"
+            )
+
+
+def user_id(i: int) -> str:
+    return f"U{i:08X}"
+
+
+def _channel_defs(cfg: GeneratorConfig, rng: random.Random) -> dict[str, list[dict]]:
+    users = [user_id(i) for i in range(cfg.users)]
+
+    def members(k: int) -> list[str]:
+        return sorted(rng.sample(users, min(k, len(users))))
+
+    out: dict[str, list[dict]] = {
+        "channels.json": [],
+        "groups.json": [],
+        "dms.json": [],
+        "mpims.json": [],
+    }
+    created = cfg.start_ts - 86400
+    for i in range(cfg.channels):
+        m = members(cfg.members_per_channel)
+        out["channels.json"].append(
+            {
+                "id": f"C{i:08X}",
+                "name": f"channel-{i}",
+                "created": created,
+                "creator": m[0],
+                "is_archived": i % 17 == 16,
+                "is_general": i == 0,
+                "members": m,
+                "topic": {"value": f"Topic {i}", "creator": m[0], "last_set": 0},
+                "purpose": {"value": f"Purpose {i}", "creator": m[0], "last_set": 0},
+            }
+        )
+    for i in range(cfg.private_channels):
+        m = members(cfg.members_per_channel)
+        out["groups.json"].append(
+            {
+                "id": f"G{i:08X}",
+                "name": f"private-{i}",
+                "created": created,
+                "creator": m[0],
+                "is_archived": False,
+                "members": m,
+                "topic": {"value": ""},
+                "purpose": {"value": ""},
+            }
+        )
+    for i in range(cfg.dms):
+        out["dms.json"].append(
+            {"id": f"D{i:08X}", "created": created, "members": members(2)}
+        )
+    for i in range(cfg.mpims):
+        m = members(3)
+        out["mpims.json"].append(
+            {
+                "id": f"G{(1 << 24) + i:08X}",
+                "name": "mpdm-" + "--".join(m) + "-1",
+                "created": created,
+                "creator": m[0],
+                "is_mpim": True,
+                "members": m,
+            }
+        )
+    return out
+
+
+def _user_obj(i: int, rng: random.Random) -> dict:
+    name = f"user{i}"
+    return {
+        "id": user_id(i),
+        "team_id": "T00000001",
+        "name": name,
+        "deleted": False,
+        "real_name": f"User {i}",
+        "tz": "Europe/Moscow",
+        "is_bot": False,
+        "profile": {
+            "first_name": "User",
+            "last_name": str(i),
+            "real_name": f"User {i}",
+            "display_name": name,
+            "email": f"{name}@example.com",
+            "title": rng.choice(["", "Engineer", "SRE", "Manager"]),
+        },
+    }
+
+
+class _ChannelStream:
+    """Generates one channel's messages in ts order with bounded thread state."""
+
+    def __init__(self, cfg: GeneratorConfig, ch: dict, ch_index: int):
+        self.cfg = cfg
+        self.ch = ch
+        self.rng = random.Random(f"{cfg.seed}:{ch['id']}")
+        self.members = ch.get("members") or [user_id(0)]
+        self.ch_index = ch_index
+        # (root_ts, replies_left)
+        self.open_threads: deque = deque()
+        self.channel_ids: list[tuple[str, str]] = []
+        self.file_seq = 0
+
+    def _ts(self, day: int, slot: int) -> str:
+        spacing = max(1, 86400 // (self.cfg.messages_per_day + 1))
+        sec = self.cfg.start_ts + day * 86400 + (slot + 1) * spacing
+        # microseconds carry the channel index: ts stay unique across channels
+        return f"{sec}.{self.ch_index % 1_000_000:06d}"
+
+    def _text(self) -> str:
+        rng, cfg = self.rng, self.cfg
+        words = rng.choices(WORDS, k=rng.randint(3, 25))
+        if rng.random() < cfg.mention_ratio:
+            words.insert(
+                rng.randrange(len(words) + 1), f"<@{rng.choice(self.members)}>"
+            )
+        if rng.random() < cfg.mention_ratio / 2 and self.channel_ids:
+            cid, cname = rng.choice(self.channel_ids)
+            words.insert(rng.randrange(len(words) + 1), f"<#{cid}|{cname}>")
+        if rng.random() < cfg.mention_ratio / 4 and cfg.subteams:
+            k = rng.randrange(cfg.subteams)
+            words.append(f"<!subteam^S{k:08X}|@team-{k}>")
+        if rng.random() < 0.05:
+            words.insert(0, "<!here>")
+        if rng.random() < 0.1:
+            words.append("<https://example.com/docs|docs>")
+        if cfg.custom_emoji and rng.random() < cfg.custom_emoji_ratio:
+            words.append(f":custom-{rng.randrange(cfg.custom_emoji)}:")
+        return " ".join(words)
+
+    def _blocks(self, text_words: list[str]) -> list[dict]:
+        rng = self.rng
+        section = [{"type": "text", "text": " ".join(text_words[:5]) + " "}]
+        section.append({"type": "user", "user_id": rng.choice(self.members)})
+        section.append({"type": "text", "text": " bold", "style": {"bold": True}})
+        section.append({"type": "emoji", "name": rng.choice(STANDARD_EMOJI)})
+        section.append({"type": "link", "url": "https://example.com", "text": "link"})
+        elements: list[dict] = [{"type": "rich_text_section", "elements": section}]
+        if rng.random() < 0.5:
+            elements.append(
+                {
+                    "type": "rich_text_list",
+                    "style": rng.choice(["bullet", "ordered"]),
+                    "elements": [
+                        {
+                            "type": "rich_text_section",
+                            "elements": [{"type": "text", "text": w}],
+                        }
+                        for w in text_words[:3]
+                    ],
+                }
+            )
+        if rng.random() < 0.3:
+            elements.append(
+                {
+                    "type": "rich_text_quote",
+                    "elements": [{"type": "text", "text": " ".join(text_words[-4:])}],
+                }
+            )
+        if rng.random() < 0.2:
+            elements.append(
+                {
+                    "type": "rich_text_preformatted",
+                    "elements": [{"type": "text", "text": "SELECT 1;"}],
+                }
+            )
+        return [{"type": "rich_text", "block_id": "b1", "elements": elements}]
+
+    def _file(self, ts: str) -> dict:
+        self.file_seq += 1
+        fid = f"F{self.ch_index:06X}{self.file_seq:06X}"
+        name = f"file-{self.file_seq}.txt"
+        obj = {
+            "id": fid,
+            "created": int(float(ts)),
+            "name": name,
+            "title": name,
+            "mimetype": "text/plain",
+            "filetype": "text",
+            "size": self.cfg.file_size,
+            "url_private": f"https://files.slack.com/files-pri/T00000001-{fid}/{name}",
+        }
+        if self.cfg.inline_files:
+            payload = (fid.encode() * (self.cfg.file_size // len(fid) + 1))[
+                : self.cfg.file_size
+            ]
+            obj["content_base64"] = base64.b64encode(payload).decode("ascii")
+        return obj
+
+    def _reactions(self) -> list[dict]:
+        rng, cfg = self.rng, self.cfg
+        # Poisson-distributed count with the configured mean (Knuth), capped at 10
+        n, p, limit = 0, rng.random(), math.exp(-cfg.reactions_per_message)
+        while p > limit and n < 10:
+            n += 1
+            p *= rng.random()
+        out = []
+        names: set[str] = set()
+        for _ in range(n):
+            if cfg.custom_emoji and rng.random() < cfg.custom_emoji_ratio * 4:
+                name = f"custom-{rng.randrange(cfg.custom_emoji)}"
+            else:
+                name = rng.choice(STANDARD_EMOJI)
+            if name in names:
+                continue
+            names.add(name)
+            users = sorted(
+                rng.sample(self.members, min(len(self.members), rng.randint(1, 3)))
+            )
+            out.append({"name": name, "users": users, "count": len(users)})
+        return out
+
+    def message(self, day: int, slot: int) -> dict:
+        rng, cfg = self.rng, self.cfg
+        ts = self._ts(day, slot)
+        msg: dict = {"type": "message", "user": rng.choice(self.members), "ts": ts}
+        text = self._text()
+        msg["text"] = text
+        if rng.random() < cfg.rich_text_ratio:
+            msg["blocks"] = self._blocks(text.split())
+        if rng.random() < cfg.attachment_ratio:
+            msg["subtype"] = "bot_message"
+            msg["bot_id"] = "B00000001"
+            msg["attachments"] = [
+                {
+                    "color": "danger",
+                    "title": "[FIRING:1] HighLatency",
+                    "title_link": "https://alerts.example.com/#/alerts",
+                    "text": "*Alert:* p99 latency above threshold\n*Severity:* critical",
+                    "fallback": "[FIRING:1] HighLatency",
+                    "actions": [
+                        {"text": "Silence", "url": "https://alerts.example.com/silence"}
+                    ],
+                }
+            ]
+        if rng.random() < cfg.file_ratio:
+            msg["files"] = [self._file(ts)]
+        reactions = self._reactions()
+        if reactions:
+            msg["reactions"] = reactions
+
+        # Thread placement: reply to an open thread or start a new one
+        if self.open_threads and rng.random() < 0.5:
+            root_ts, left = self.open_threads.popleft()
+            msg["thread_ts"] = root_ts
+            msg["parent_user_id"] = self.members[0]
+            if left > 1:
+                self.open_threads.append((root_ts, left - 1))
+        elif cfg.thread_ratio and rng.random() < cfg.thread_ratio:
+            depth = rng.randint(1, max(1, cfg.thread_depth))
+            msg["thread_ts"] = ts
+            msg["reply_count"] = depth
+            self.open_threads.append((ts, depth))
+        return msg
+
+    def days(self) -> Iterator[tuple[int, Iterator[dict]]]:
+        for day in range(self.cfg.days):
+            yield day, (
+                self.message(day, slot) for slot in range(self.cfg.messages_per_day)
+            )
+
+
+def _write_json_array(fh: IO[str], items) -> int:
+    """Stream a JSON array item by item."""
+    n = 0
+    fh.write("[")
+    for item in items:
+        fh.write(",\n" if n else "\n")
+        fh.write(json.dumps(item, ensure_ascii=False))
+        n += 1
+    fh.write("\n]")
+    return n
+
+
+class _Sink:
+    """Writes files either into a zip (one member at a time) or into a directory."""
+
+    def __init__(self, out: str):
+        self.is_zip = out.endswith(".zip")
+        self.out = out
+        if self.is_zip:
+            os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+            self.zf: Optional[zipfile.ZipFile] = zipfile.ZipFile(
+                out, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=1
+            )
+        else:
+            os.makedirs(out, exist_ok=True)
+            self.zf = None
+
+    def open(self, name: str) -> IO[str]:
+        if self.zf is not None:
+            return io.TextIOWrapper(self.zf.open(name, "w"), encoding="utf-8")
+        path = os.path.join(self.out, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return open(path, "w", encoding="utf-8")
+
+    def close(self) -> None:
+        if self.zf is not None:
+            self.zf.close()
+
+
+def generate(out: str, cfg: Optional[GeneratorConfig] = None) -> dict:
+    """Generate the archive at `out` (*.zip → zip, otherwise a directory). Returns counts."""
+    cfg = cfg or GeneratorConfig()
+    rng = random.Random(cfg.seed)
+    sink = _Sink(out)
+    counts = {"users": cfg.users, "channels": 0, "messages": 0, "files": 0}
+    try:
+        with sink.open("users.json") as fh:
+            _write_json_array(fh, (_user_obj(i, rng) for i in range(cfg.users)))
+        defs = _channel_defs(cfg, rng)
+        for fname, items in defs.items():
+            with sink.open(fname) as fh:
+                _write_json_array(fh, items)
+        named = [
+            (c["id"], c["name"]) for c in defs["channels.json"] + defs["groups.json"]
+        ]
+        all_channels = [(fname, c) for fname, items in defs.items() for c in items]
+        for idx, (fname, ch) in enumerate(all_channels):
+            folder = ch["id"] if fname == "dms.json" else ch["name"]
+            stream = _ChannelStream(cfg, ch, idx)
+            stream.channel_ids = named
+            for day, msgs in stream.days():
+                date = _date_str(cfg.start_ts + day * 86400)
+                with sink.open(f"{folder}/{date}.json") as fh:
+                    counts["messages"] += _write_json_array(fh, msgs)
+            counts["files"] += stream.file_seq
+            counts["channels"] += 1
+    finally:
+        sink.close()
+    return counts
+
+
+def _date_str(ts: int) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def _parse_args(argv: Optional[list[str]] = None) -> tuple[str, GeneratorConfig]:
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--out", required=True, help="*.zip or a directory")
+    defaults = GeneratorConfig()
+    for f in fields(GeneratorConfig):
+        default = getattr(defaults, f.name)
+        flag = "--" + f.name.replace("_", "-")
+        if isinstance(default, bool):
+            p.add_argument(
+                flag, type=lambda v: v.lower() in ("1", "true", "yes"), default=default
+            )
+        else:
+            p.add_argument(flag, type=type(default), default=default)
+    args = vars(p.parse_args(argv))
+    out = args.pop("out")
+    try:
+        return out, GeneratorConfig(**args)
+    except ValueError as e:
+        p.error(str(e))
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    out, cfg = _parse_args(argv)
+    counts = generate(out, cfg)
+    print(json.dumps({"out": out, "config": asdict(cfg), **counts}, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+from bench.baseline import compare, direction, parse_thresholds
+
+
+def test_compare_uses_metric_direction_and_thresholds():
+    base = {
+        "wall_s": 10.0,
+        "stages": {
+            "messages": {"wall_s": 4.0, "entities_per_s": 1000.0, "entities": 4000},
+            "reactions": {"wall_s": 1.0, "queries": 100},
+        },
+    }
+    cur = {
+        "wall_s": 10.5,
+        "stages": {
+            "messages": {"wall_s": 4.1, "entities_per_s": 800.0, "entities": 9},
+            "reactions": {"wall_s": 2.0, "queries": 100},
+        },
+    }
+    assert direction("stages.messages.entities_per_s") == -1
+    assert direction("stages.messages.entities") == 0
+
+    keys = {r.key for r in compare(base, cur, 0.1)}
+    assert keys == {"stages.messages.entities_per_s", "stages.reactions.wall_s"}
+
+    relaxed = parse_thresholds(["stages.reactions.*=-1", "*.entities_per_s=0.25"])
+    assert compare(base, cur, 0.1, relaxed) == []
@@ -0,0 +1,209 @@
+import json
+import zipfile
+
+import pytest
+
+from app.models.base import Base, SessionLocal, engine
+from app.models.entity import Entity
+from app.models.entity_relation import EntityRelation
+from app.models.status_enum import MappingStatus
+from app.services.export.bulk_import import build_bulk_import, emoji_extension
+
+
+@pytest.mark.asyncio
+async def test_build_bulk_import_nests_replies_and_reactions(tmp_path):
+    async with engine.begin() as conn:
+        await conn.run_sync(
+            Base.metadata.create_all,
+            tables=[Entity.__table__, EntityRelation.__table__],
+        )
+    async with SessionLocal() as session:
+        session.add_all(
+            [
+                Entity(
+                    id=1, entity_type="user", slack_id="U1", raw_data={"name": "alice"}
+                ),
+                Entity(
+                    id=2, entity_type="user", slack_id="U2", raw_data={"name": "bob"}
+                ),
+                Entity(
+                    id=3,
+                    entity_type="channel",
+                    slack_id="C1",
+                    raw_data={"id": "C1", "name": "General", "members": ["U1", "U2"]},
+                ),
+                Entity(
+                    id=10,
+                    entity_type="message",
+                    slack_id="1700000001.000100",
+                    job_id=5,
+                    raw_data={
+                        "ts": "1700000001.000100",
+                        "user": "U1",
+                        "text": "hi <@U2>",
+                    },
+                ),
+                Entity(
+                    id=11,
+                    entity_type="message",
+                    slack_id="1700000002.000100",
+                    job_id=5,
+                    raw_data={
+                        "ts": "1700000002.000100",
+                        "thread_ts": "1700000001.000100",
+                        "user": "U2",
+                        "text": "reply",
+                    },
+                ),
+                Entity(
+                    id=20,
+                    entity_type="reaction",
+                    slack_id="1700000001.000100_U2_+1",
+                    job_id=5,
+                    raw_data={"user": "U2", "name": "+1"},
+                ),
+            ]
+        )
+        rels = [
+            (10, 3, "posted_in"),
+            (11, 3, "posted_in"),
+            (11, 10, "thread_reply"),
+            (20, 10, "reacted_to"),
+        ]
+        session.add_all(
+            [
+                EntityRelation(id=i, from_entity_id=f, to_entity_id=t, relation_type=r)
+                for i, (f, t, r) in enumerate(rels, start=1)
+            ]
+        )
+        await session.commit()
+
+    try:
+        out = tmp_path / "bulk.zip"
+        res = await build_bulk_import(str(out), job_id=5, include_files=False)
+        assert res["posts"] == 1 and res["replies"] == 1 and res["reactions"] == 1
+        with zipfile.ZipFile(out) as zf:
+            lines = [json.loads(ln) for ln in zf.read("import.jsonl").splitlines()]
+        types = [ln["type"] for ln in lines]
+        assert types == ["version", "team", "channel", "user", "user", "post"]
+        assert lines[2]["channel"]["name"] == "general"
+        alice = lines[3]["user"]
+        assert alice["teams"][0]["channels"] == [
+            {"name": "general", "roles": "channel_user"}
+        ]
+        post = lines[5]["post"]
+        assert post["channel"] == "general" and post["message"] == "hi @bob"
+        assert post["create_at"] == 1700000001000
+        assert [r["message"] for r in post["replies"]] == ["reply"]
+        assert post["reactions"] == [
+            {"user": "bob", "emoji_name": "+1", "create_at": 1700000001000}
+        ]
+    finally:
+        async with engine.begin() as conn:
+            await conn.run_sync(
+                Base.metadata.drop_all,
+                tables=[EntityRelation.__table__, Entity.__table__],
+            )
+
+
+def _msg(id_, ts, user, text, thread_ts=None, status=MappingStatus.pending):
+    raw = {"ts": ts, "user": user, "text": text}
+    if thread_ts:
+        raw["thread_ts"] = thread_ts
+    return Entity(
+        id=id_,
+        entity_type="message",
+        slack_id=ts,
+        job_id=5,
+        status=status,
+        raw_data=raw,
+    )
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_keeps_replies_without_root_and_drops_missing_emoji(
+    tmp_path,
+):
+    tables = [Entity.__table__, EntityRelation.__table__]
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=tables)
+    async with SessionLocal() as session:
+        session.add_all(
+            [
+                Entity(
+                    id=1, entity_type="user", slack_id="U1", raw_data={"name": "alice"}
+                ),
+                Entity(
+                    id=2,
+                    entity_type="channel",
+                    slack_id="C1",
+                    raw_data={"id": "C1", "name": "general", "members": ["U1"]},
+                ),
+                Entity(id=3, entity_type="custom_emoji", slack_id="party", raw_data={}),
+                # root by an unknown user: its reply becomes a top-level post
+                _msg(10, "1700000001.000100", "U9", "root"),
+                _msg(
+                    11,
+                    "1700000002.000100",
+                    "U1",
+                    "r1 <!subteam^S1|@oncall>",
+                    "1700000001.000100",
+                ),
+                # root not exported: the reply is written on its own
+                _msg(
+                    12,
+                    "1700000003.000100",
+                    "U1",
+                    "gone",
+                    status=MappingStatus.skipped,
+                ),
+                _msg(13, "1700000004.000100", "U1", "r2", "1700000003.000100"),
+                Entity(
+                    id=20,
+                    entity_type="reaction",
+                    slack_id="1700000004.000100_U1_party",
+                    job_id=5,
+                    raw_data={"user": "U1", "name": "party"},
+                ),
+            ]
+        )
+        rels = [
+            (10, 2, "posted_in"),
+            (11, 2, "posted_in"),
+            (12, 2, "posted_in"),
+            (13, 2, "posted_in"),
+            (11, 10, "thread_reply"),
+            (13, 12, "thread_reply"),
+            (20, 13, "reacted_to"),
+        ]
+        session.add_all(
+            [
+                EntityRelation(id=i, from_entity_id=f, to_entity_id=t, relation_type=r)
+                for i, (f, t, r) in enumerate(rels, start=1)
+            ]
+        )
+        await session.commit()
+
+    try:
+        out = tmp_path / "bulk.zip"
+        res = await build_bulk_import(str(out), job_id=5, include_files=False)
+        assert res["skipped_no_user"] == 1
+        assert res["posts"] == 2 and res["replies_standalone"] == 2
+        # custom emoji has no `emoji` line without files
+        assert res["reactions"] == 0 and res["reactions_missing_emoji"] == 1
+        with zipfile.ZipFile(out) as zf:
+            lines = [json.loads(ln) for ln in zf.read("import.jsonl").splitlines()]
+        posts = [ln["post"] for ln in lines if ln["type"] == "post"]
+        assert [p["message"] for p in posts] == ["r1 @oncall", "r2"]
+        # rendered props travel with the post
+        assert posts[0]["props"]["subteams"] == [{"id": "S1", "handle": "@oncall"}]
+        assert "reactions" not in posts[1]
+    finally:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all, tables=tables[::-1])
+
+
+def test_emoji_extension_from_content_then_url():
+    assert emoji_extension("https://x/e.png", b"GIF89a...") == "gif"
+    assert emoji_extension("https://x/e.JPEG?t=1", b"????") == "jpeg"
+    assert emoji_extension("https://x/e", b"????") == "png"
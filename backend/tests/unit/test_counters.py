@@ -0,0 +1,24 @@
+from app.models.status_enum import MappingStatus
+from app.services.stats.counters import summarize_counter_rows
+
+
+def test_summarize_counter_rows_builds_matrix_and_totals():
+    rows = [
+        ("message", MappingStatus.pending, 5),
+        ("message", MappingStatus.success, 3),
+        ("user", "success", 2),
+        # zero rows remain after status transitions and must be ignored
+        ("reaction", MappingStatus.failed, 0),
+    ]
+    out = summarize_counter_rows(rows)
+    assert out["total"] == 10
+    assert out["by_type"] == {"message": 8, "user": 2}
+    assert out["by_status"] == {"pending": 5, "success": 5}
+    assert out["types"] == ["message", "user"]
+    assert out["matrix"]["message"] == {
+        "pending": 5,
+        "skipped": 0,
+        "failed": 0,
+        "success": 3,
+    }
+    assert out["totals_row"]["success"] == 5
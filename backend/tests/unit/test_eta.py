@@ -0,0 +1,71 @@
+from app.services.stats.eta import RateEstimator, estimate
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_rate_is_none_until_first_window():
+    clock = FakeClock()
+    est = RateEstimator(tau=60, window=5, clock=clock)
+    est.record("message", 10)
+    clock.now += 2
+    est.record("message", 10)
+    assert est.rate("message") is None
+    clock.now += 3
+    est.record("message", 30)
+    assert est.rate("message") == 10.0
+
+
+def test_rate_smoothing_and_idle_decay():
+    clock = FakeClock()
+    est = RateEstimator(tau=60, window=5, clock=clock)
+    est.record("message", 0)
+    clock.now += 10
+    est.record("message", 100)  # 10/s
+    assert est.rate("message") == 10.0
+
+    # A burst moves the rate only partially toward the new value
+    clock.now += 10
+    est.record("message", 400)  # 40/s
+    r = est.rate("message")
+    assert 10 < r < 40
+
+    # No progress: kept as is for a finished type, decays for the current one
+    clock.now += 60
+    assert est.rate("message") == r
+    assert est.rate("message", idle=True) < r / 2
+
+
+def test_estimate_sums_current_and_later_types():
+    clock = FakeClock()
+    est = RateEstimator(tau=60, window=5, clock=clock)
+    for t in ("attachment", "message", "reaction"):
+        est.record(t, 0)
+    clock.now += 10
+    est.record("attachment", 20)  # 2/s
+    est.record("message", 100)  # 10/s
+    est.record("reaction", 500)  # 50/s
+
+    job = {
+        "attachment": {"pending": 10, "success": 20},
+        "message": {"pending": 1000},
+        "reaction": {"pending": 500},
+    }
+    glob = {"user": {"pending": 7}}
+    out = estimate(job, glob, "attachment", est)
+    # user is exported before attachments and no longer counts
+    assert out["remaining"] == {"attachment": 10, "message": 1000, "reaction": 500}
+    assert out["stage"] == "attachment"
+    assert out["stage_eta_seconds"] == 5
+    assert out["eta_seconds"] == 5 + 100 + 10
+    assert out["rate"] == 2.0
+
+    # A remaining type without an observed rate makes the total unknown
+    out = estimate(job, glob, None, est)
+    assert out["remaining"]["user"] == 7
+    assert out["eta_seconds"] is None
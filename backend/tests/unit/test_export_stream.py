@@ -0,0 +1,169 @@
+import pytest
+
+from app.models.base import Base, SessionLocal, engine
+from app.models.entity import Entity
+from app.models.entity_relation import EntityRelation
+from app.models.status_enum import MappingStatus
+from app.services.export.orchestrator import iter_entities_to_export
+
+
+@pytest.mark.asyncio
+async def test_iter_entities_to_export_pages_roots_before_replies():
+    async with engine.begin() as conn:
+        await conn.run_sync(
+            Base.metadata.create_all,
+            tables=[Entity.__table__, EntityRelation.__table__],
+        )
+    async with SessionLocal() as session:
+        session.add_all(
+            [
+                Entity(id=1, entity_type="channel", slack_id="C1"),
+                Entity(id=2, entity_type="channel", slack_id="C2"),
+                # channel C1: two roots and a reply that sorts before the second root
+                Entity(
+                    id=10, entity_type="message", slack_id="1700000003.000000", job_id=7
+                ),
+                Entity(
+                    id=11, entity_type="message", slack_id="1700000001.000000", job_id=7
+                ),
+                Entity(
+                    id=12, entity_type="message", slack_id="1700000002.000000", job_id=7
+                ),
+                Entity(
+                    id=13,
+                    entity_type="message",
+                    slack_id="1700000004.000000",
+                    job_id=7,
+                    status=MappingStatus.success,
+                ),
+                # channel C2 and another job
+                Entity(
+                    id=20, entity_type="message", slack_id="1700000000.000000", job_id=7
+                ),
+                Entity(
+                    id=30, entity_type="message", slack_id="1700000000.500000", job_id=8
+                ),
+            ]
+        )
+        rels = [(10, 1), (11, 1), (12, 1), (13, 1), (20, 2), (30, 1)]
+        session.add_all(
+            [
+                EntityRelation(
+                    id=i, from_entity_id=m, to_entity_id=c, relation_type="posted_in"
+                )
+                for i, (m, c) in enumerate(rels, start=1)
+            ]
+        )
+        session.add(
+            EntityRelation(
+                id=100, from_entity_id=12, to_entity_id=11, relation_type="thread_reply"
+            )
+        )
+        await session.commit()
+
+    try:
+        all_ids = [
+            e.id
+            async for e in iter_entities_to_export("message", job_id=7, page_size=2)
+        ]
+        assert all_ids == [20, 11, 10, 12]
+
+        c1_ids = [
+            e.id
+            async for e in iter_entities_to_export(
+                "message", job_id=7, page_size=1, channel_id=1
+            )
+        ]
+        assert c1_ids == [11, 10, 12]
+    finally:
+        async with engine.begin() as conn:
+            await conn.run_sync(
+                Base.metadata.drop_all,
+                tables=[EntityRelation.__table__, Entity.__table__],
+            )
+
+
+@pytest.mark.asyncio
+async def test_plan_messages_matches_keyset_order_per_channel():
+    from app.services.export.queries import candidate_condition
+    from app.services.export.planner import ORPHAN_CHANNEL, hydrate, plan_messages
+
+    async with engine.begin() as conn:
+        await conn.run_sync(
+            Base.metadata.create_all,
+            tables=[Entity.__table__, EntityRelation.__table__],
+        )
+    async with SessionLocal() as session:
+        session.add_all(
+            [Entity(id=1, entity_type="channel", slack_id="C1")]
+            + [
+                Entity(id=i, entity_type="message", slack_id=ts, job_id=7)
+                for i, ts in [
+                    (10, "1700000003.000000"),
+                    (11, "1700000001.000000"),
+                    (12, "1700000002.000000"),
+                    (13, "1700000000.000000"),
+                    (14, "1700000001.000000"),
+                ]
+            ]
+            + [
+                Entity(
+                    id=15,
+                    entity_type="message",
+                    slack_id="1700000000.500000",
+                    job_id=7,
+                    status=MappingStatus.success,
+                )
+            ]
+        )
+        session.add_all(
+            [
+                EntityRelation(
+                    id=i, from_entity_id=m, to_entity_id=1, relation_type="posted_in"
+                )
+                for i, m in enumerate([10, 11, 12, 15], start=1)
+            ]
+            + [
+                EntityRelation(
+                    id=100,
+                    from_entity_id=12,
+                    to_entity_id=11,
+                    relation_type="thread_reply",
+                ),
+                EntityRelation(
+                    id=101,
+                    from_entity_id=13,
+                    to_entity_id=14,
+                    relation_type="thread_reply",
+                ),
+            ]
+        )
+        await session.commit()
+
+    try:
+        cond = candidate_condition("message", 7)
+        plan = await plan_messages(cond, fetch_size=2)
+        assert len(plan) == 5
+        # Roots by ts, then replies; orphans (no posted_in) form their own group
+        assert plan.channel_ids(1).tolist() == [11, 10, 12]
+        assert plan.channel_ids(ORPHAN_CHANNEL).tolist() == [14, 13]
+        assert plan.channel_ids(1).tolist() == [
+            e.id
+            async for e in iter_entities_to_export("message", job_id=7, channel_id=1)
+        ]
+
+        async with SessionLocal() as session:
+            msg = await session.get(Entity, 10)
+            msg.status = MappingStatus.success
+            await session.commit()
+        pages = [
+            [e.id for e in page]
+            async for page in hydrate(plan.channel_ids(1), cond, page_size=2)
+        ]
+        assert pages == [[11], [12]]
+    finally:
+        async with engine.begin() as conn:
+            await conn.run_sync(
+                Base.metadata.drop_all,
+                tables=[EntityRelation.__table__, Entity.__table__],
+            )
@@ -0,0 +1,137 @@
+import pytest
+
+from app.models.base import Base, SessionLocal, engine
+from app.models.entity import Entity
+from app.models.status_enum import MappingStatus
+from app.services.stats.failures import fetch_failure_groups
+from app.utils.errors import error_signature
+
+
+def test_error_signature_strips_ids_numbers_and_urls():
+    a = error_signature(
+        "Plugin import failed: 500 {'id': 'app.post.create', "
+        "'request_id': 'ab12cd34ef56gh78ij90kl12mn', 'status_code': 500}"
+    )
+    b = error_signature(
+        "Plugin import failed: 500 {'id': 'app.post.create', "
+        "'request_id': 'zz99yy88xx77ww66vv55uu44tt', 'status_code': 500}"
+    )
+    assert a == b
+    assert "failed: 500 " in a and "<id>" in a and "'status_code': <n>" in a
+    # HTTP status codes stay distinct
+    assert error_signature("Plugin import failed: 403 forbidden") != a
+    assert error_signature(
+        "Failed to download from Slack: Client error '404 Not Found' "
+        "for url 'https://files.slack.com/files-pri/T01-F02/x.png'"
+    ) == ("Failed to download from Slack: Client error '<n> Not Found' for url '<url>'")
+    assert error_signature("Attachment a.pdf 12.3MB exceeds cap 10.0MB") == (
+        "Attachment a.pdf <n>MB exceeds cap <n>MB"
+    )
+    assert error_signature(
+        "Plugin reaction failed: 400 reaction 1700000001.000100_thumbsup_U01ABCDEF"
+    ) == ("Plugin reaction failed: 400 reaction <ts>")
+    assert error_signature("user U0123ABCD  not\nfound") == "user <id> not found"
+    # upper-case words are not Slack ids
+    assert error_signature("HTTP 403 FORBIDDEN") == "HTTP 403 FORBIDDEN"
+    assert error_signature("Failed: CONFLICT on C01ABCDEF") == (
+        "Failed: CONFLICT on <id>"
+    )
+    assert error_signature(None) is None and error_signature("") is None
+
+
+def _failed(id_, etype, slack_id, error, job_id=None, status=MappingStatus.failed):
+    return Entity(
+        id=id_,
+        entity_type=etype,
+        slack_id=slack_id,
+        job_id=job_id,
+        status=status,
+        error_message=error,
+        error_signature=error_signature(error),
+    )
+
+
+@pytest.mark.asyncio
+async def test_failure_groups_by_type_and_signature():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=[Entity.__table__])
+    try:
+        async with SessionLocal() as session:
+            session.add_all(
+                [
+                    _failed(
+                        i,
+                        "message",
+                        f"17000000{i:02d}.000100",
+                        f"Plugin import failed: 500 post {i}",
+                        job_id=1,
+                    )
+                    for i in range(1, 5)
+                ]
+                + [
+                    _failed(
+                        10,
+                        "reaction",
+                        "r1",
+                        "Target post_id not found for reaction",
+                        job_id=1,
+                    ),
+                    _failed(
+                        11,
+                        "reaction",
+                        "r2",
+                        "Emoji missing",
+                        job_id=1,
+                        status=MappingStatus.skipped,
+                    ),
+                    # Other job and a success: not counted
+                    _failed(
+                        12,
+                        "message",
+                        "m12",
+                        "Plugin import failed: 500 post 12",
+                        job_id=2,
+                    ),
+                    Entity(
+                        id=13,
+                        entity_type="message",
+                        slack_id="m13",
+                        job_id=1,
+                        status=MappingStatus.success,
+                    ),
+                    # Global rows belong to every job's export
+                    _failed(
+                        14, "user", "U1", "Create user failed: 400 email U0123ABCD@x.io"
+                    ),
+                ]
+            )
+            await session.commit()
+
+        async with SessionLocal() as session:
+            groups = await fetch_failure_groups(session, 1, samples=2)
+            with_skipped = await fetch_failure_groups(
+                session, 1, (MappingStatus.failed, MappingStatus.skipped)
+            )
+        assert [(g["entity_type"], g["count"]) for g in groups] == [
+            ("message", 4),
+            ("reaction", 1),
+            ("user", 1),
+        ]
+        top = groups[0]
+        assert top["signature"] == "Plugin import failed: 500 post <n>"
+        assert top["status"] == "failed"
+        assert top["example_error"] == "Plugin import failed: 500 post 1"
+        assert top["samples"] == [
+            {"id": 1, "slack_id": "1700000001.000100"},
+            {"id": 2, "slack_id": "1700000002.000100"},
+        ]
+        assert groups[2]["signature"] == "Create user failed: 400 email <email>"
+        assert {(g["entity_type"], g["status"]) for g in with_skipped} == {
+            ("message", "failed"),
+            ("reaction", "failed"),
+            ("reaction", "skipped"),
+            ("user", "failed"),
+        }
+    finally:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all, tables=[Entity.__table__])
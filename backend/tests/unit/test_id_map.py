@@ -0,0 +1,65 @@
+import pytest
+
+from app.models.base import Base, SessionLocal, engine
+from app.models.id_map import IdMap
+from app.services.export import id_map
+from app.services.export.id_map import IdMapCache, job_key
+
+
+def test_cache_evicts_least_recently_used_and_counts_hits():
+    cache = IdMapCache(2)
+    a, b, c = ("user", 0, "U1"), ("user", 0, "U2"), ("user", 0, "U3")
+    cache.put(a, "mm1")
+    cache.put(b, "mm2")
+    assert cache.get(a) == "mm1"  # a is now the most recent
+    cache.put(c, "mm3")  # evicts b
+    assert cache.get(b) is None
+    assert cache.get(c) == "mm3" and cache.get(a) == "mm1"
+    assert cache.stats() == {"size": 2, "maxsize": 2, "hits": 3, "misses": 1}
+
+    disabled = IdMapCache(0)
+    disabled.put(a, "mm1")
+    disabled.put(b, "")
+    assert disabled.stats()["size"] == 0
+
+
+def test_job_key_scopes_only_job_types():
+    assert job_key("message", 7) == 7
+    assert job_key("attachment", "7") == 7
+    # global types and rows without a job share job_id 0
+    assert job_key("user", 7) == job_key("channel", 7) == 0
+    assert job_key("reaction", None) == 0
+
+
+@pytest.mark.asyncio
+async def test_lookup_miss_then_fill(monkeypatch):
+    cache = IdMapCache(100)
+    monkeypatch.setattr(id_map, "id_map_cache", cache)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=[IdMap.__table__])
+    try:
+        assert await id_map.lookup_mm_id("user", "U1") is None
+        async with SessionLocal() as session:
+            await id_map.record_mm_id(session, "user", "U1", "mmU1", job_id=7)
+            await id_map.record_mm_id(session, "message", "1.0", "mmP7", job_id=7)
+            await id_map.record_mm_id(session, "message", "1.0", "mmP8", job_id=8)
+            await session.commit()
+        # the miss was not cached: the row is found once it exists
+        assert await id_map.lookup_mm_id("user", "U1") == "mmU1"
+        assert cache.stats()["size"] == 1
+
+        got = await id_map.lookup_mm_ids("message", ["1.0", "2.0", "1.0"], job_id=8)
+        assert got == {"1.0": "mmP8"}
+        # served from the LRU now, per job
+        misses = cache.misses
+        assert await id_map.lookup_mm_ids("message", ["1.0"], job_id=8) == {
+            "1.0": "mmP8"
+        }
+        assert cache.misses == misses
+        assert await id_map.lookup_mm_id("message", "1.0", job_id=7) == "mmP7"
+
+        id_map.remember_mm_id("channel", "C1", "mmC1", job_id=7)
+        assert cache.get(("channel", 0, "C1")) == "mmC1"
+    finally:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all, tables=[IdMap.__table__])
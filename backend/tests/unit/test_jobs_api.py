@@ -0,0 +1,72 @@
+import asyncio
+import zipfile
+
+from fastapi.testclient import TestClient
+
+from app.api import jobs
+from app.main import app
+from app.services.backup.zip_utils import count_json_files
+
+
+def test_jobs_etag_and_not_modified(monkeypatch):
+    calls = 0
+    state = {"status": "running"}
+
+    async def summaries(limit):
+        nonlocal calls
+        calls += 1
+        return [{"id": 1, "status": state["status"], "meta": {}}]
+
+    monkeypatch.setattr(jobs, "_job_summaries", summaries)
+    monkeypatch.setattr(jobs, "_cache_ttl", lambda: 0)
+    jobs._cache.clear()
+    client = TestClient(app)
+
+    r = client.get("/jobs")
+    assert r.status_code == 200
+    assert r.json() == {"jobs": [{"id": 1, "status": "running", "meta": {}}]}
+    etag = r.headers["etag"]
+
+    r = client.get("/jobs", headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.content == b""
+
+    state["status"] = "success"
+    r = client.get("/jobs", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["etag"] != etag
+
+    # Within the TTL polls reuse the last computed body
+    monkeypatch.setattr(jobs, "_cache_ttl", lambda: 60)
+    before = calls
+    client.get("/jobs")
+    client.get("/jobs", headers={"If-None-Match": etag})
+    assert calls == before
+    jobs._cache.clear()
+
+
+def test_count_json_files_from_zip_directory(tmp_path):
+    path = tmp_path / "export.zip"
+    with zipfile.ZipFile(path, "w") as zf:
+        for name in (
+            "users.json",
+            "channels.json",
+            "integration_logs.json",
+            "general/",
+            "general/2024-01-01.json",
+            "general/2024-01-02.json",
+            "D123/2024-01-01.json",
+            "general/readme.txt",
+        ):
+            zf.writestr(name, "" if name.endswith("/") else "[]")
+    assert asyncio.run(count_json_files(str(path))) == 5
+
+
+def test_public_meta_drops_detail_sections():
+    meta = {
+        "totals": {"messages": 3},
+        "query_stats": {"users": {"top": []}},
+        "timeline": {"users": {"wall_s": 1.0}},
+    }
+    assert jobs.public_meta(meta) == {"totals": {"messages": 3}}
+    assert jobs.public_meta(None) == {}
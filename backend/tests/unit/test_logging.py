@@ -0,0 +1,45 @@
+import logging
+import queue
+from types import SimpleNamespace
+
+from app.logging_config import LazyQueueHandler
+from app.services.export import mm_api_mixin
+
+
+def test_queue_handler_merges_args_and_renders_traceback():
+    q = queue.SimpleQueue()
+    log = logging.getLogger("test.lazy_queue")
+    log.handlers = [LazyQueueHandler(q)]
+    log.propagate = False
+    log.setLevel(logging.INFO)
+
+    args = ["a"]
+    log.info("value=%s", args)
+    args.append("b")  # mutated after the call: the record must not change
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        log.exception("failed %d", 1)
+    log.debug("not emitted %s", object())
+
+    first, second = q.get_nowait(), q.get_nowait()
+    assert q.empty()
+    assert (first.msg, first.args) == ("value=['a']", None)
+    assert second.msg == "failed 1" and second.exc_info is None
+    assert "ValueError: boom" in second.exc_text
+    out = logging.Formatter("%(message)s").format(second)
+    assert out.startswith("failed 1\nTraceback")
+
+
+def test_body_preview_truncates_and_samples(monkeypatch):
+    monkeypatch.setattr(mm_api_mixin, "LOG_BODY_MAX", 10)
+    monkeypatch.setattr(mm_api_mixin, "LOG_BODY_SAMPLE", 3)
+    monkeypatch.setattr(mm_api_mixin, "_body_seq", iter(range(100)))
+    resp = SimpleNamespace(text="x" * 25)
+
+    previews = [mm_api_mixin._body_preview(resp) for _ in range(6)]
+    assert previews.count("(not sampled)") == 4
+    assert previews[0] == previews[3] == "xxxxxxxxxx… (25 chars)"
+    # Errors are always logged, still truncated
+    assert mm_api_mixin._body_preview(resp, force=True) == "xxxxxxxxxx… (25 chars)"
+    assert mm_api_mixin._body_preview(SimpleNamespace(text="ok"), force=True) == "ok"
@@ -0,0 +1,95 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from app.services.export.markdown_renderer import (
+    NameTable,
+    RenderCache,
+    build_post_props,
+    collect_mentions,
+    render_cached,
+    render_key,
+    render_message,
+)
+from app.services.export import markdown_renderer
+
+GOLDEN = json.loads(
+    (Path(__file__).parent / "data" / "markdown_golden.json").read_text("utf-8")
+)
+NAMES = NameTable(users=GOLDEN["users"], channels=GOLDEN["channels"])
+
+
+@pytest.mark.parametrize("case", GOLDEN["cases"], ids=lambda c: c["name"])
+def test_renderer_matches_golden_output(case):
+    # Golden outputs were recorded from the former async renderer in MessageExporter
+    text = render_message(case["raw"], NAMES)
+    assert text == case["text"]
+    props = build_post_props(case["raw"], text)
+    if "mentions_subteams" in props:
+        props["mentions_subteams"] = sorted(props["mentions_subteams"])
+    assert props == case["props"]
+
+
+def test_collect_mentions_covers_text_blocks_and_attachments():
+    raw = {
+        "text": "<@U1> <#C1|general>",
+        "blocks": [
+            {"type": "section", "text": {"type": "mrkdwn", "text": "<@U2>"}},
+            {
+                "type": "rich_text",
+                "elements": [
+                    {
+                        "type": "rich_text_list",
+                        "elements": [
+                            {
+                                "type": "rich_text_section",
+                                "elements": [
+                                    {"type": "user", "user_id": "U3"},
+                                    {"type": "channel", "channel_id": "C2"},
+                                ],
+                            }
+                        ],
+                    }
+                ],
+            },
+        ],
+        "attachments": [{"pretext": "<@U4>", "fallback": "<#C3>"}],
+    }
+    assert collect_mentions(raw) == ({"U1", "U2", "U3", "U4"}, {"C1", "C2", "C3"})
+
+
+def test_render_cache_hits_and_keys_on_names(monkeypatch):
+    monkeypatch.setattr(markdown_renderer, "render_cache", RenderCache(2))
+    raw = {"ts": "1.0", "text": "<!subteam^S1|@oncall> <@U1> упал <#C1>"}
+    names = NameTable(users={"U1": "alice"}, channels={"C1": "alerts"})
+    first = render_cached(raw, names)
+    # Another message with the same content: served from cache, same output
+    second = render_cached(dict(raw, ts="2.0"), names)
+    assert first == second
+    assert first == (
+        render_message(raw, names),
+        build_post_props(raw, render_message(raw, names)),
+    )
+    assert markdown_renderer.render_cache.stats()["hits"] == 1
+    # Returned props are deep copies: nested lists are not shared with the cache
+    second[1]["x"] = 1
+    second[1]["subteams"].append({"id": "S2", "handle": "@x"})
+    third = render_cached(raw, names)[1]
+    assert "x" not in third and third["subteams"] == first[1]["subteams"]
+    assert len(third["subteams"]) == 1
+
+    renamed = NameTable(users={"U1": "bob"}, channels={"C1": "alerts"})
+    assert render_key(raw, names) != render_key(raw, renamed)
+    assert "@bob" in render_cached(raw, renamed)[0]
+
+
+def test_render_cache_is_bounded():
+    cache = RenderCache(2)
+    for i in range(3):
+        cache.put(render_key({"text": str(i)}), (str(i), {}))
+    assert cache.get(render_key({"text": "0"})) is None
+    assert cache.get(render_key({"text": "2"})) == ("2", {})
+    st = cache.stats()
+    assert (st["size"], st["evictions"], st["hits"], st["misses"]) == (2, 1, 1, 1)
+    assert st["hit_rate"] == 0.5
@@ -0,0 +1,72 @@
+import pytest
+
+from app.models.base import Base, SessionLocal, engine
+from app.models.entity import Entity
+from app.services.export import message_exporter
+from app.services.export.message_exporter import (
+    MessageCaches,
+    MessageExporter,
+    prefetch_mention_names,
+)
+
+
+@pytest.mark.asyncio
+async def test_prefetch_resolves_mentions_in_bulk_and_caches_unknown(monkeypatch):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=[Entity.__table__])
+    try:
+        async with SessionLocal() as session:
+            session.add_all(
+                [
+                    Entity(
+                        id=1, entity_type="user", slack_id="U1", raw_data={"name": "al"}
+                    ),
+                    Entity(id=2, entity_type="user", slack_id="U2", raw_data={}),
+                    Entity(
+                        id=3,
+                        entity_type="channel",
+                        slack_id="C1",
+                        raw_data={"name": "general"},
+                    ),
+                ]
+            )
+            await session.commit()
+
+        raws = [
+            {"text": "<@U1> <@U404> <#C1> <#C404>"},
+            {
+                "blocks": [
+                    {
+                        "type": "rich_text",
+                        "elements": [
+                            {
+                                "type": "rich_text_section",
+                                "elements": [{"type": "user", "user_id": "U2"}],
+                            }
+                        ],
+                    }
+                ]
+            },
+            None,
+        ]
+        caches: MessageCaches = {}
+        await prefetch_mention_names(raws, caches)
+        assert caches["username_by_slack_id"] == {"U1": "al", "U2": "U2"}
+        assert caches["channel_name_by_slack_id"] == {"C1": "general"}
+        assert caches["unknown_user_ids"] == {"U404"}
+        assert caches["unknown_channel_ids"] == {"C404"}
+
+        # Everything is cached now, including misses: rendering needs no queries
+        def no_db():
+            raise AssertionError("unexpected DB query")
+
+        monkeypatch.setattr(message_exporter, "SessionLocal", no_db)
+        await prefetch_mention_names(raws, caches)
+        exporter = MessageExporter(None, caches=caches)
+        assert await exporter._resolve_username_by_slack_id("U404") is None
+        assert await exporter._resolve_channel_name_by_slack_id("C404") is None
+        text, _ = await exporter._render(raws[0])
+        assert text == "@al @U404 ~general ~C404"
+    finally:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all, tables=[Entity.__table__])
@@ -0,0 +1,70 @@
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.monitoring import metrics
+from app.services.monitoring.metrics import (
+    Counter,
+    Gauge,
+    Histogram,
+    endpoint_label,
+    render,
+)
+
+
+def test_render_prometheus_text_format():
+    c = Counter("t_total", "test counter", ("entity_type", "status"))
+    c.inc("message", "success")
+    c.inc("message", "success", value=2)
+    h = Histogram("t_seconds", "test histogram", ("endpoint",), buckets=(0.1, 1))
+    h.observe("/api/v4/posts", value=0.05)
+    h.observe("/api/v4/posts", value=0.1)
+    h.observe("/api/v4/posts", value=3)
+    g = Gauge("t_depth", "test gauge", ("q",), collect=lambda: {("message",): 7})
+    empty = Counter("t_unused_total", "never incremented")
+
+    text = render([c, h, g, empty])
+    assert text.splitlines() == [
+        "# HELP slackmm_t_total test counter",
+        "# TYPE slackmm_t_total counter",
+        'slackmm_t_total{entity_type="message",status="success"} 3',
+        "# HELP slackmm_t_seconds test histogram",
+        "# TYPE slackmm_t_seconds histogram",
+        'slackmm_t_seconds_bucket{endpoint="/api/v4/posts",le="0.1"} 2',
+        'slackmm_t_seconds_bucket{endpoint="/api/v4/posts",le="1"} 2',
+        'slackmm_t_seconds_bucket{endpoint="/api/v4/posts",le="+Inf"} 3',
+        'slackmm_t_seconds_sum{endpoint="/api/v4/posts"} 3.15',
+        'slackmm_t_seconds_count{endpoint="/api/v4/posts"} 3',
+        "# HELP slackmm_t_depth test gauge",
+        "# TYPE slackmm_t_depth gauge",
+        'slackmm_t_depth{q="message"} 7',
+    ]
+
+
+def test_endpoint_label_collapses_ids_and_names():
+    mm_id = "abcdefghijklmnopqrstuvwxyz"
+    assert endpoint_label(f"/api/v4/users/{mm_id}/image") == "/api/v4/users/{id}/image"
+    assert endpoint_label("/api/v4/teams/name/acme?x=1") == "/api/v4/teams/name/{name}"
+    assert endpoint_label("/plugins/mm-importer/api/v1/dm") == (
+        "/plugins/mm-importer/api/v1/dm"
+    )
+
+
+def test_metrics_endpoint(monkeypatch):
+    # StaticPool (tests) reports no usage; emulate a QueuePool
+    monkeypatch.setattr(
+        metrics.db_pool_connections,
+        "_collect",
+        lambda: {("pipeline", "checked_out"): 3},
+    )
+    metrics.entities_processed.inc("message", "failed")
+    try:
+        r = TestClient(app).get("/metrics")
+    finally:
+        metrics.reset()
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'slackmm_db_pool_connections{pool="pipeline",kind="checked_out"} 3' in r.text
+    assert (
+        'slackmm_entities_processed_total{entity_type="message",status="failed"} 1'
+        in r.text
+    )
@@ -0,0 +1,11 @@
+import pytest
+
+from bench.micro_bench import build_cases, run_cases
+
+
+@pytest.mark.asyncio
+async def test_micro_bench_cases_run_without_database():
+    # Smoke: every case renders its corpus from caches only and reports throughput
+    results = await run_cases(min_time=0.0, repeat=1)
+    assert set(results) == {c.name for c in build_cases()}
+    assert all(r["us_per_op"] > 0 for r in results.values())
@@ -0,0 +1,25 @@
+from fastapi.testclient import TestClient
+
+from bench.mock_mattermost import MockConfig, create_app
+
+
+def test_mock_accounts_requests_and_injects_rate_limits():
+    client = TestClient(create_app(MockConfig(seed=1)))
+    r = client.post("/api/v4/users", json={"username": "a", "email": "a@x"})
+    assert r.status_code == 201
+    dup = client.post("/api/v4/users", json={"username": "b", "email": "a@x"})
+    assert dup.json()["id"] == "app.user.save.email_exists.app_error"
+    post = client.post(
+        "/plugins/mm-importer/api/v1/import",
+        json={"channel_id": "c", "user_id": r.json()["id"], "message": "hi"},
+    )
+    assert post.json()["post_id"]
+
+    client.post("/__config", json={"rate_limit_rate": 1.0})
+    limited = client.post("/plugins/mm-importer/api/v1/reaction", json={})
+    assert limited.status_code == 429 and limited.headers["Retry-After"]
+
+    stats = client.get("/__stats").json()
+    assert stats["requests"] == 1  # counters are reset by /__config
+    (route,) = stats["routes"].values()
+    assert route["rate_limited"] == 1
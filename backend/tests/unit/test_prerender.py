@@ -0,0 +1,60 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from app.services.backup.prerender import _init_worker, render_rows
+
+
+def test_render_rows_in_worker_process_uses_shipped_name_table():
+    rows = [
+        (1, {"text": "<@U1> see <#C1>"}),
+        (2, {"text": "<!subteam^S1|@oncall> ping @S1"}),
+        (3, None),
+    ]
+    with ProcessPoolExecutor(
+        max_workers=1,
+        initializer=_init_worker,
+        initargs=({"U1": "alice"}, {"C1": "general"}),
+    ) as pool:
+        out = pool.submit(render_rows, rows).result()
+    assert out == [
+        (1, "@alice see ~general", {"mentions_subteams": ["alice"]}),
+        (
+            2,
+            "@oncall ping @oncall",
+            {
+                "subteams": [{"id": "S1", "handle": "@oncall"}],
+                # (prefix, handle) pairs are distinct: line start and after a space
+                "mentions_subteams": ["oncall", "oncall"],
+            },
+        ),
+        (3, "", {}),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_prerender_failure_is_logged_not_raised(monkeypatch):
+    from app.services.backup import prerender
+    from app.services.export import markdown_renderer
+
+    async def _names():
+        return markdown_renderer.EMPTY_NAMES
+
+    async def _pages(job_id, page_size):
+        yield [(1, {"text": "a"})]
+        yield [(2, {"text": "b"})]
+
+    stored = []
+
+    async def _store(rows, job_id):
+        if stored:
+            raise RuntimeError("db gone")
+        stored.extend(rows)
+
+    monkeypatch.setenv("PRERENDER_WORKERS", "1")
+    monkeypatch.setattr(prerender, "load_name_table", _names)
+    monkeypatch.setattr(prerender, "_pages", _pages)
+    monkeypatch.setattr(prerender, "_store", _store)
+    assert await prerender.prerender_job_messages(5) == 1
+    # pages render concurrently: either one may be the stored one
+    assert len(stored) == 1 and stored[0][0] in (1, 2)
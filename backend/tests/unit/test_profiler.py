@@ -0,0 +1,80 @@
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.monitoring import profiler, query_stats
+from app.services.monitoring.profiler import ProfileSession
+
+
+def _busy_leaf(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(100))
+
+
+def _busy_root(stop: threading.Event):
+    _busy_leaf(stop)
+
+
+def _run_worker():
+    stop = threading.Event()
+    t = threading.Thread(target=_busy_root, args=(stop,), name="worker", daemon=True)
+    t.start()
+    return stop, t
+
+
+def test_sample_collapses_stacks_by_thread():
+    stop, t = _run_worker()
+    try:
+        session = ProfileSession(duration=1)
+        for _ in range(5):
+            session.sample()
+    finally:
+        stop.set()
+        t.join()
+    worker = [s for s in session.stacks if s.startswith("worker;")]
+    assert worker
+    frames = [f.split(" (")[0] for f in worker[0].split(";")]
+    assert frames.index("_busy_root") < frames.index("_busy_leaf")
+    assert "(test_profiler.py:" in worker[0]
+    assert sum(session.stacks[s] for s in worker) == 5
+    line = session.collapsed().splitlines()[0]
+    stack, n = line.rsplit(" ", 1)
+    assert stack in session.stacks and int(n) == session.stacks[stack]
+
+
+def test_job_scoped_session_samples_only_inside_stages(monkeypatch):
+    stages = []
+    monkeypatch.setattr(query_stats, "active_stages", lambda job_id: list(stages))
+    session = ProfileSession(duration=1, job_id=7)
+    session.sample()
+    assert session.samples == 0 and session.ticks == 1
+
+    stages.append("export:message")
+    session.sample()
+    assert session.samples > 0
+    assert all(s.startswith("job 7 export:message;") for s in session.stacks)
+
+
+def test_profiler_api_start_conflict_and_download():
+    client = TestClient(app)
+    stop, t = _run_worker()
+    try:
+        r = client.post("/debug/profiler/start?duration=30&interval=0.005")
+        assert r.status_code == 200 and r.json()["running"] is True
+        assert client.post("/debug/profiler/start").status_code == 409
+        deadline = time.monotonic() + 5
+        while profiler.current().samples == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        r = client.post("/debug/profiler/stop")
+        assert r.json()["running"] is False and r.json()["samples"] > 0
+    finally:
+        profiler.stop()
+        stop.set()
+        t.join()
+
+    r = client.get("/debug/profiler/collapsed")
+    assert r.status_code == 200
+    assert "attachment" in r.headers["content-disposition"]
+    assert "_busy_leaf" in r.text
@@ -0,0 +1,86 @@
+import asyncio
+import json
+
+import pytest
+
+from app.services.stats import broadcaster as bc
+from app.services.stats.broadcaster import ProgressBroadcaster, diff
+
+
+def _parse(chunk: str):
+    event, data = chunk.strip().split("\n")
+    return event.removeprefix("event: "), json.loads(data.removeprefix("data: "))
+
+
+def test_diff_nested_and_removed_fields():
+    old = {"by_type": {"message": 1, "user": 2}, "job": {"id": 1}, "x": 1}
+    new = {"by_type": {"message": 5, "user": 2}, "job": {"id": 1}, "y": 2}
+    assert diff(old, new) == {"by_type": {"message": 5}, "x": None, "y": 2}
+    assert diff(new, new) == {}
+
+
+@pytest.mark.asyncio
+async def test_one_snapshot_per_tick_fanned_out_as_deltas():
+    calls = 0
+
+    async def snapshot():
+        nonlocal calls
+        calls += 1
+        return {"total": calls // 2, "static": "same"}
+
+    b = ProgressBroadcaster(snapshot)
+    a_sub = b.subscribe(interval=0.25)
+    c_sub = b.subscribe(interval=0.25)
+    first = [_parse(await s.queue.get()) for s in (a_sub, c_sub)]
+    assert first == [("stats", {"total": 0, "static": "same"})] * 2
+    assert calls == 1  # shared producer, not one query per client
+
+    # A late subscriber starts from the latest full snapshot
+    late = b.subscribe(interval=0.25)
+    assert _parse(late.queue.get_nowait()) == ("stats", {"total": 0, "static": "same"})
+
+    # tick 2 is unchanged (1 // 2 == 0), tick 3 sends only the changed field
+    assert _parse(await asyncio.wait_for(a_sub.queue.get(), 2)) == (
+        "delta",
+        {"total": 1},
+    )
+    for sub in (a_sub, c_sub, late):
+        b.unsubscribe(sub)
+    await asyncio.wait_for(b._task, 2)
+    assert b.subscribers == 0
+    # No subscribers: the producer stopped, no more snapshots
+    stopped_at = calls
+    await asyncio.sleep(0.3)
+    assert calls == stopped_at
+
+
+@pytest.mark.asyncio
+async def test_slow_client_is_dropped(monkeypatch):
+    monkeypatch.setattr(bc, "_queue_size", lambda: 2)
+    n = 0
+
+    async def snapshot():
+        nonlocal n
+        n += 1
+        return {"n": n}
+
+    b = ProgressBroadcaster(snapshot)
+    fast_chunks = []
+
+    async def fast():
+        stream = b.stream(interval=0.25)
+        try:
+            async for chunk in stream:
+                fast_chunks.append(chunk)
+                if len(fast_chunks) == 4:
+                    return
+        finally:
+            await stream.aclose()
+
+    slow = b.subscribe(interval=0.25)  # never reads
+    await asyncio.wait_for(fast(), 5)
+    assert b.dropped == 1
+    assert slow not in b._subs
+    # The dropped client's stream ends with the sentinel
+    assert slow.queue.get_nowait() is None
+    await asyncio.wait_for(b._task, 2)
@@ -0,0 +1,76 @@
+import pytest
+from sqlalchemy import text
+
+from app.models.base import engine
+from app.services.monitoring import query_stats
+
+
+def test_fingerprint_collapses_literals_and_in_lists():
+    a = query_stats.fingerprint("SELECT * FROM e WHERE id IN ($1, $2, $3) AND t = 'x'")
+    b = query_stats.fingerprint("SELECT *  FROM e\nWHERE id IN ($1, $2) AND t = 'y'")
+    assert a == b == "SELECT * FROM e WHERE id IN (?+) AND t = ?"
+
+
+@pytest.mark.asyncio
+async def test_job_stage_records_fingerprints_and_flags_n_plus_one():
+    query_stats.install([engine])
+    query_stats.reset()
+    async with query_stats.job_stage(None, "test", entities=50):
+        async with engine.connect() as conn:
+            for i in range(60):
+                await conn.execute(text(f"SELECT {i}"))
+            await conn.execute(text("SELECT 'once', 1"))
+    snap = query_stats.snapshot()
+    (stage,) = [s for s in snap["finished"] if s["stage"] == "test"]
+    assert stage["queries"] == 61
+    top = {t["fingerprint"]: t for t in stage["top"]}
+    assert top["SELECT ?"]["count"] == 60
+    assert [n["fingerprint"] for n in stage["n_plus_one"]] == ["SELECT ?"]
+    query_stats.reset()
+
+
+@pytest.mark.asyncio
+async def test_once_per_entity_is_not_n_plus_one_and_untagged_is_not_active():
+    query_stats.install([engine])
+    query_stats.reset()
+    async with query_stats.job_stage(None, "once", entities=60):
+        async with engine.connect() as conn:
+            for i in range(60):
+                await conn.execute(text(f"SELECT {i}"))
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+    snap = query_stats.snapshot()
+    (stage,) = [s for s in snap["finished"] if s["stage"] == "once"]
+    assert stage["queries"] == 60 and stage["n_plus_one"] == []
+    assert snap["active"] == []
+    assert snap["untagged"]["queries"] == 1
+    query_stats.reset()
+
+
+@pytest.mark.asyncio
+async def test_job_stage_stores_timeline_entry(monkeypatch):
+    stored = []
+
+    async def store(job_id, section, stage, payload):
+        stored.append((job_id, section, stage, payload))
+
+    monkeypatch.setattr(query_stats, "_store_in_job_meta", store)
+    query_stats.reset()
+    for depth in (3, 7, 2):
+        async with query_stats.job_stage(5, "export:reaction", entities=10):
+            query_stats.add_entities(5)
+            query_stats.note_queue_depth(depth)
+
+    timeline = [p for _, section, _, p in stored if section == "timeline"]
+    assert len(timeline) == 3
+    last = timeline[-1]
+    # Re-entries accumulate into one ledger entry
+    assert last["entities"] == 45
+    assert last["peak_queue_depth"] == 7
+    assert last["started_at"] <= last["finished_at"]
+    assert last["wall_s"] >= 0
+    assert {(j, sec, st) for j, sec, st, _ in stored} == {
+        (5, "timeline", "export:reaction"),
+        (5, "query_stats", "export:reaction"),
+    }
+    query_stats.reset()
@@ -0,0 +1,153 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select
+
+from app.models.base import Base, SessionLocal, engine
+from app.models.entity import Entity
+from app.models.entity_relation import EntityRelation
+from app.models.status_enum import MappingStatus
+from app.services.export.orchestrator import iter_entities_to_export
+from app.services.export.requeue import requeue_entities
+from app.utils.errors import error_signature
+
+FAILED, SKIPPED = MappingStatus.failed, MappingStatus.skipped
+PLUGIN_500 = "Plugin import failed: 500 post"
+CAP = "Attachment a.pdf 12.3MB exceeds cap 10.0MB"
+
+
+def _row(id_, etype, status, error=None, job_id=None, slack_id=None):
+    return Entity(
+        id=id_,
+        entity_type=etype,
+        slack_id=slack_id or f"s{id_}",
+        job_id=job_id,
+        status=status,
+        error_message=error,
+        error_signature=error_signature(error),
+    )
+
+
+async def _statuses() -> dict:
+    async with SessionLocal() as session:
+        rows = await session.execute(select(Entity.id, Entity.status))
+        return {i: getattr(s, "value", s) for i, s in rows.all()}
+
+
+@pytest.mark.asyncio
+async def test_requeue_filters_and_targeted_candidates():
+    tables = [Entity.__table__, EntityRelation.__table__]
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=tables)
+    async with SessionLocal() as session:
+        session.add_all(
+            [
+                _row(1, "channel", MappingStatus.success, slack_id="C1"),
+                _row(2, "channel", FAILED, "Failed: 500", slack_id="C2"),
+                _row(10, "message", FAILED, f"{PLUGIN_500} 1", job_id=7),
+                _row(11, "message", FAILED, f"{PLUGIN_500} 2", job_id=7),
+                _row(12, "message", FAILED, "Plugin import failed: 403", job_id=7),
+                _row(20, "message", FAILED, f"{PLUGIN_500} 3", job_id=8),
+                _row(30, "attachment", SKIPPED, CAP, job_id=7),
+                _row(31, "reaction", FAILED, "emoji 503", job_id=7),
+            ]
+        )
+        session.add_all(
+            [
+                EntityRelation(
+                    id=1, from_entity_id=10, to_entity_id=1, relation_type="posted_in"
+                ),
+                EntityRelation(
+                    id=2, from_entity_id=11, to_entity_id=2, relation_type="posted_in"
+                ),
+                EntityRelation(
+                    id=3, from_entity_id=31, to_entity_id=10, relation_type="reacted_to"
+                ),
+            ]
+        )
+        await session.commit()
+
+    try:
+        async with SessionLocal() as session:
+            # dry run counts failed only: the skipped attachment is left out
+            counts = await requeue_entities(session, 7, dry_run=True)
+            assert counts == {"channel": 1, "message": 3, "reaction": 1}
+            assert (await _statuses())[10] == "failed"
+
+            # channel filter: the message posted in it and its reaction
+            counts = await requeue_entities(
+                session, 7, dry_run=True, channel="C1", entity_types=["message"]
+            )
+            assert counts == {"message": 1}
+            counts = await requeue_entities(session, 7, dry_run=True, channel="C1")
+            assert counts == {"message": 1, "reaction": 1}
+
+            future = datetime.now(timezone.utc) + timedelta(hours=1)
+            assert await requeue_entities(session, 7, dry_run=True, since=future) == {}
+
+            counts = await requeue_entities(
+                session,
+                7,
+                entity_types=["message"],
+                signature=error_signature(f"{PLUGIN_500} 1"),
+            )
+            assert counts == {"message": 2}
+
+        st = await _statuses()
+        assert st[10] == st[11] == "pending"
+        # other signature, other job and other types are untouched
+        assert st[12] == st[20] == st[2] == "failed" and st[30] == "skipped"
+        async with SessionLocal() as session:
+            e = await session.get(Entity, 10)
+            assert e.error_message is None and e.error_signature is None
+
+        # targeted re-export reads pending rows only
+        ids = [
+            e.id
+            async for e in iter_entities_to_export(
+                "message", job_id=7, statuses=[MappingStatus.pending]
+            )
+        ]
+        assert ids == [10, 11]
+
+        async with SessionLocal() as session:
+            counts = await requeue_entities(
+                session, 7, include_skipped=True, signature=error_signature(CAP)
+            )
+            assert counts == {"attachment": 1}
+        assert (await _statuses())[30] == "pending"
+    finally:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all, tables=tables[::-1])
+
+
+@pytest.mark.asyncio
+async def test_export_requeued_marks_job_failed_when_mm_unreachable(monkeypatch):
+    from app.models.job_status_enum import JobStatus
+    from app.services.export import orchestrator
+
+    updates = []
+
+    class _Session:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def execute(self, stmt):
+            updates.append(stmt.compile().params)
+
+        async def commit(self):
+            pass
+
+    async def _no_user():
+        return None
+
+    monkeypatch.setattr(orchestrator, "ControlSessionLocal", _Session)
+    monkeypatch.setattr(orchestrator, "get_mm_user_id", _no_user)
+    await orchestrator.export_requeued(7, ["message"])
+
+    assert updates[0]["status"] == JobStatus.running
+    assert updates[-1]["status"] == JobStatus.failed
+    assert "Mattermost" in updates[-1]["error_message"]
@@ -0,0 +1,64 @@
+import hashlib
+import json
+import zipfile
+
+import pytest
+
+from bench.slack_export_generator import (
+    MAX_MESSAGES_PER_DAY,
+    GeneratorConfig,
+    generate,
+)
+
+
+def _digest(path):
+    with zipfile.ZipFile(path) as zf:
+        h = hashlib.sha256()
+        for name in sorted(zf.namelist()):
+            h.update(name.encode())
+            h.update(zf.read(name))
+        return h.hexdigest(), zf.namelist()
+
+
+def test_generator_is_reproducible_and_threads_are_consistent(tmp_path):
+    cfg = GeneratorConfig(
+        users=8,
+        channels=2,
+        private_channels=1,
+        dms=1,
+        mpims=1,
+        days=2,
+        messages_per_day=40,
+        thread_ratio=0.3,
+        seed=7,
+    )
+    counts = generate(str(tmp_path / "a.zip"), cfg)
+    generate(str(tmp_path / "b.zip"), cfg)
+    digest_a, names = _digest(tmp_path / "a.zip")
+    assert digest_a == _digest(tmp_path / "b.zip")[0]
+    assert counts["messages"] == 5 * 2 * 40
+    for meta in (
+        "users.json",
+        "channels.json",
+        "groups.json",
+        "dms.json",
+        "mpims.json",
+    ):
+        assert meta in names
+
+    with zipfile.ZipFile(tmp_path / "a.zip") as zf:
+        channels = json.loads(zf.read("channels.json"))
+        folder = channels[0]["name"]
+        msgs = []
+        for name in sorted(n for n in names if n.startswith(folder + "/")):
+            msgs.extend(json.loads(zf.read(name)))
+    roots = {m["ts"] for m in msgs if m.get("thread_ts", m["ts"]) == m["ts"]}
+    replies = [m for m in msgs if m.get("thread_ts") not in (None, m["ts"])]
+    assert replies and all(m["thread_ts"] in roots for m in replies)
+    assert len({m["ts"] for m in msgs}) == len(msgs)
+
+
+def test_messages_per_day_must_fit_distinct_ts_in_a_day():
+    GeneratorConfig(messages_per_day=MAX_MESSAGES_PER_DAY)
+    with pytest.raises(ValueError):
+        GeneratorConfig(messages_per_day=86400)
@@ -0,0 +1,92 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.monitoring import tracing
+
+
+@pytest.fixture
+def traced(tmp_path, monkeypatch):
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(tracing, "TRACE_FILE", str(path))
+    tracing.set_sample_rate(1)
+    tracing.reset()
+    yield path
+    tracing.set_sample_rate(0)
+    tracing.reset()
+
+
+@pytest.mark.asyncio
+async def test_spans_are_nested_and_written_as_otlp(traced):
+    async def child():
+        with tracing.span("mm POST /plugins/mm-importer/api/v1/import"):
+            await asyncio.sleep(0)
+
+    with tracing.trace("export.message", slack_id="1.2", job_id=3):
+        with tracing.span("resolve_channel"):
+            pass
+        with tracing.span("plugin_import"):
+            # Tasks spawned inside a span inherit it through the contextvar
+            await asyncio.create_task(child())
+        with pytest.raises(ValueError):
+            with tracing.span("render"):
+                raise ValueError("bad blocks")
+    tracing.flush()
+
+    lines = traced.read_text().splitlines()
+    assert len(lines) == 1
+    rs = json.loads(lines[0])["resourceSpans"][0]
+    assert rs["resource"]["attributes"][0]["key"] == "service.name"
+    spans = {s["name"]: s for s in rs["scopeSpans"][0]["spans"]}
+    root = spans["export.message"]
+    assert "parentSpanId" not in root
+    assert {a["key"]: a["value"] for a in root["attributes"]} == {
+        "slack_id": {"stringValue": "1.2"},
+        "job_id": {"intValue": "3"},
+    }
+    assert len({s["traceId"] for s in spans.values()}) == 1
+    assert spans["resolve_channel"]["parentSpanId"] == root["spanId"]
+    http = spans["mm POST /plugins/mm-importer/api/v1/import"]
+    assert http["parentSpanId"] == spans["plugin_import"]["spanId"]
+    assert spans["render"]["status"] == {"code": 2, "message": "ValueError: bad blocks"}
+    assert int(root["endTimeUnixNano"]) >= int(http["endTimeUnixNano"])
+
+    summary = tracing.summary()["roots"]["export.message"]
+    assert summary["total"]["count"] == 1
+    assert summary["render"]["errors"] == 1
+    assert set(summary) == {
+        "total",
+        "resolve_channel",
+        "plugin_import",
+        "mm POST /plugins/mm-importer/api/v1/import",
+        "render",
+    }
+
+
+def test_unsampled_roots_are_noops(traced):
+    tracing.set_sample_rate(0)
+    with tracing.trace("export.reaction") as root:
+        assert root is None
+        with tracing.span("resolve_post") as sp:
+            assert sp is None
+    assert tracing.current_span() is None
+    assert tracing.summary()["roots"] == {}
+
+
+def test_trace_api(traced):
+    client = TestClient(app)
+    assert client.post("/debug/traces/sample-rate?rate=2").json() == {
+        "sample_rate": 1.0
+    }
+    with tracing.trace("import.message"):
+        with tracing.span("save"):
+            pass
+    tracing.flush()
+    body = client.get("/debug/traces").json()
+    assert body["roots"]["import.message"]["save"]["count"] == 1
+    assert body["written"] >= 1
+    client.post("/debug/traces/reset")
+    assert client.get("/debug/traces").json()["roots"] == {}
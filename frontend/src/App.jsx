@@ -3,6 +3,31 @@ import './App.css';
 import { Header, Sidebar, Main, Card, Button, StatusBadge, Modal, FileButton } from './components/UI';
 import './components/ui.css';
 
+// Apply a `delta` SSE event: nested objects are merged, other values replaced,
+// null (removed or emptied key) deletes the key
+function mergeDelta(base, delta) {
+  const out = { ...base };
+  for (const [k, v] of Object.entries(delta)) {
+    if (v === null) {
+      delete out[k];
+      continue;
+    }
+    const prev = out[k];
+    const isObj = (x) => x && typeof x === 'object' && !Array.isArray(x);
+    out[k] = isObj(v) && isObj(prev) ? mergeDelta(prev, v) : v;
+  }
+  return out;
+}
+
+function formatEta(seconds) {
+  const h = Math.floor(seconds / 3600);
+  const m = Math.floor((seconds % 3600) / 60);
+  const s = seconds % 60;
+  if (h) return `${h}h ${m}m`;
+  if (m) return `${m}m ${s}s`;
+  return `${s}s`;
+}
+
 function App() {
   const [status, setStatus] = useState('pending');
   const [error, setError] = useState(null);
@@ -140,9 +165,16 @@ function App() {
   // Subscribe to live progress via SSE
   useEffect(() => {
   const es = new EventSource('/api/progress/stream');
+    // Full snapshot first (and after every reconnect), then only changed fields
     es.addEventListener('stats', (e) => {
       try { setLiveStats(JSON.parse(e.data)); } catch { /* ignore parse error */ }
     });
+    es.addEventListener('delta', (e) => {
+      try {
+        const delta = JSON.parse(e.data);
+        setLiveStats((s) => (s ? mergeDelta(s, delta) : s));
+      } catch { /* ignore parse error */ }
+    });
     es.onerror = () => { /* ignore; browser will retry due to retry header */ };
     return () => es.close();
   }, []);
@@ -296,7 +328,7 @@ function App() {
                         // Import-stage file-based progress
                         const jsonTotal = Number(meta.json_files_total) || 0;
                         const jsonDone = Number(meta.json_files_processed) || 0;
-                        const importStages = ['extracting','users','channels','messages','emojis','reactions','attachments'];
+                        const importStages = ['extracting','users','channels','messages','emojis','reactions','attachments','rendering'];
                         const inImport = importStages.includes(j.current_stage);
 
                         // Per-element weighting across all mapping items for exporting/done
@@ -344,6 +376,9 @@ function App() {
                                       ? (<span>import msgs {processed.messages}/{totals.messages || 0}</span>)
                                       : (<span>import scanning…</span>)))
                                 : (<span>files {processed.attachments}/{totals.attachments || 0}, msgs {processed.messages}/{totals.messages || 0}, reactions {processed.reactions}/{totals.reactions || 0}</span>)}
+                              {j.eta && j.eta.eta_seconds != null && (
+                                <span> • ETA {formatEta(j.eta.eta_seconds)}{j.eta.rate ? ` (${j.eta.stage} ${j.eta.rate}/s)` : ''}</span>
+                              )}
                             </div>
                           </div>
                         );